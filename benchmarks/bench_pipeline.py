@@ -0,0 +1,259 @@
+"""
+End-to-end benchmark of the trajectory pipeline: plan -> encode -> send -> firmware.
+Every workload is fixed, so the JSON output of two commits can be compared directly:
+
+    python benchmarks/bench_pipeline.py --out before.json
+    (change something)
+    python benchmarks/bench_pipeline.py --out after.json --compare before.json
+
+Stages (timed separately, best of --repeat runs):
+- slice: patches -> joint samples with their analytic derivatives (planner.stream_samples,
+  includes the per-patch limit check)
+- stitch: the chunks of the whole job copied into one preallocated Trajectory (lib/trajectory.py)
+- validate: planner.validate_trajectory on the whole job
+- encode: setpoint packing and packet framing (--mode single/batch/compact/timed; timed includes
+  the adaptive sampling that picks the keyframes)
+- serial_write: frames written to the virtual firmware (lib/firmware_sim.py) over a pty,
+  until it has parsed every point (skipped with --no-serial)
+Also reported: points/s, setpoints and bytes sent (timed setpoints cover several control periods),
+time to the first encoded packet of the streamed pipeline and its peak memory.
+"""
+
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import io
+import json
+import math
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+import contextlib
+import numpy as np
+
+import planner
+from lib import char_gen
+from lib import binary_protocol as bp
+from lib.trajectory import Trajectory
+from config import SETTINGS, ADAPTIVE_SAMPLING
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+STAGES = ('slice', 'stitch', 'validate', 'encode', 'serial_write')
+
+# --- Workloads ---
+
+def text_workload() -> list:
+    """Three lines of text through the stick font (every glyph, pen-up moves included)"""
+    text = "THE QUICK BROWN FOX\nJUMPS OVER 13 LAZY\nDOGS 0123456789 XYZ"
+    return char_gen.text_to_traj(text, (-0.12, 0.22), 0.012, 0.0024)
+
+def long_text_workload(patches: int = 2000) -> list:
+    """The first `patches` patches of four lines of text: the stitching regression job"""
+    text = "THE QUICK BROWN FOX\nJUMPS OVER 13 LAZY\nDOGS 0123456789 XYZ\nPACK MY BOX WITH FIVE"
+    return char_gen.text_to_traj(text, (-0.12, 0.24), 0.012, 0.0024)[:patches]
+
+def circles_workload(rows: int = 6, cols: int = 8, radius: float = 0.008) -> list:
+    """A grid of small circles (four quarter arcs each), joined by pen-up moves"""
+    patches = []
+    last = None
+    for i in range(rows):
+        for j in range(cols):
+            c = (-0.10 + j*0.028, 0.12 + i*0.022)
+            arc = [(c[0] + radius*math.cos(k*math.pi/2), c[1] + radius*math.sin(k*math.pi/2)) for k in range(5)]
+            if last is not None:
+                patches.append({'type': 'line', 'points': [last, arc[0]], 'data': {'penup': True}})
+            for (a, b) in zip(arc, arc[1:]):
+                patches.append({'type': 'circle', 'points': [a, b], 'data': {'penup': False, 'center': c}})
+            last = arc[-1]
+    return patches
+
+def template_workloads(directory: str = TEMPLATE_DIR) -> dict:
+    """Saved templates (lists of patches, as sent by the GUI)"""
+    workloads = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename)) as f:
+                workloads['template:' + filename[:-5]] = json.load(f)
+    return workloads
+
+def default_workloads(template_dir: str = TEMPLATE_DIR) -> dict:
+    workloads = {'text': text_workload(), 'text2000': long_text_workload(), 'circles': circles_workload()}
+    workloads.update(template_workloads(template_dir))
+    return workloads
+
+# --- Stages ---
+
+def encode_frames(chunks, mode: str) -> list:
+    """Frames the planned chunks (q, dq, ddq, setpoints) like the serial manager does"""
+    frames = []
+    if mode == 'timed':
+        keyframes = planner.stream_keyframes(chunks, ADAPTIVE_SAMPLING['tolerance'], ADAPTIVE_SAMPLING['max_ticks'])
+        for (*_, (q0, q1, pen_up, ticks)) in keyframes:
+            for k in range(0, len(q0), bp.MAX_BATCH_POINTS):
+                s = slice(k, k + bp.MAX_BATCH_POINTS)
+                frames.append(bp.encode_trajectory_timed(q0[s], q1[s], ticks[s], pen_up[s]))
+        return frames
+    for (q, _, _, setpoints) in chunks:
+        match mode:
+            case 'compact':
+                for k in range(0, len(q[0]), bp.COMPACT_MAX_POINTS):
+                    s = slice(k, k + bp.COMPACT_MAX_POINTS)
+                    frames.append(bp.encode_trajectory_compact(q[0][s], q[1][s], q[2][s]))
+            case 'batch':
+                step = bp.MAX_BATCH_POINTS * bp.SETPOINT_SIZE
+                view = memoryview(setpoints)
+                frames += [bp.encode_trajectory_batch(view[k:k+step]) for k in range(0, len(view), step)]
+            case _:
+                view = memoryview(setpoints)
+                frames += [bp.encode_trajectory_payload(view[k:k+bp.SETPOINT_SIZE])
+                           for k in range(0, len(view), bp.SETPOINT_SIZE)]
+    return frames
+
+def frame_setpoints(frame: bytes) -> int:
+    """Setpoints carried by a trajectory frame"""
+    if frame[2] in (bp.CMD_TRAJECTORY_BATCH, bp.CMD_TRAJECTORY_COMPACT, bp.CMD_TRAJECTORY_TIMED):
+        return frame[3]
+    return 1
+
+def serial_write(frames: list, points: int, timeout: float = 30.0) -> float:
+    """Seconds to write the frames to the virtual firmware until it has received every point"""
+    import serial
+    from lib.firmware_sim import VirtualFirmware
+    fw = VirtualFirmware(Tc=3600.0, buffer_size=points) # no consumption, no overflow: pure transfer
+    port = serial.Serial(fw.start(), timeout=0)
+    try:
+        start = time.perf_counter()
+        for frame in frames:
+            port.write(frame)
+        while fw.stats['points'] < points:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Firmware received {fw.stats['points']}/{points} points")
+            time.sleep(0.0005)
+        return time.perf_counter() - start
+    finally:
+        port.close()
+        fw.stop()
+
+def run_stages(patches: list, mode: str, serial: bool) -> tuple:
+    """One timed run of every stage: ({stage: seconds}, points, frames)"""
+    times = {}
+    t = time.perf_counter()
+    chunks = list(planner.stream_samples(patches))
+    times['slice'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    trj = Trajectory.from_chunks(chunks, SETTINGS['Tc'], int(planner.sample_counts(patches).sum()))
+    times['stitch'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        planner.validate_trajectory(trj.q, trj.dq, trj.ddq)
+    times['validate'] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    frames = encode_frames(planner.stream_packets(chunks), mode)
+    times['encode'] = time.perf_counter() - t
+
+    if serial:
+        times['serial_write'] = serial_write(frames, len(trj))
+    return (times, len(trj), frames)
+
+def time_to_first_packet(patches: list, mode: str) -> float:
+    """Seconds from the start of the streamed pipeline to the first encoded frame"""
+    t = time.perf_counter()
+    first = next(planner.plan_stream(patches))
+    encode_frames([first], mode)[0]
+    return time.perf_counter() - t
+
+def peak_memory(patches: list, mode: str) -> int:
+    """Peak traced allocation (bytes) while streaming the whole job through planning and encoding"""
+    tracemalloc.start()
+    try:
+        for chunk in planner.plan_stream(patches):
+            encode_frames([chunk], mode)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_workload(patches: list, mode: str = 'batch', repeat: int = 3, serial: bool = True) -> dict:
+    runs = [run_stages(patches, mode, serial) for _ in range(repeat)]
+    points = runs[0][1]
+    stages = {}
+    for name in STAGES:
+        if name in runs[0][0]:
+            seconds = min(run[0][name] for run in runs)
+            stages[name] = {'seconds': seconds, 'points_per_s': points/seconds if seconds > 0 else None}
+    total = sum(stage['seconds'] for stage in stages.values())
+    frames = runs[0][2]
+    return {
+        'patches': len(patches),
+        'points': points,
+        'setpoints': sum(frame_setpoints(frame) for frame in frames),
+        'wire_bytes': sum(len(frame) for frame in frames),
+        'stages': stages,
+        'total_seconds': total,
+        'points_per_s': points/total if total > 0 else None,
+        'time_to_first_packet': min(time_to_first_packet(patches, mode) for _ in range(repeat)),
+        'peak_memory_bytes': peak_memory(patches, mode),
+    }
+
+# --- Report ---
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(workloads: dict, mode: str = 'batch', repeat: int = 3, serial: bool = True) -> dict:
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'mode': mode,
+        'repeat': repeat,
+        'settings': {'Tc': SETTINGS['Tc'], 'max_acc': SETTINGS['max_acc'], 'adaptive_sampling': ADAPTIVE_SAMPLING},
+        'workloads': {name: bench_workload(patches, mode, repeat, serial) for (name, patches) in workloads.items()},
+    }
+
+def print_report(results: dict, baseline: dict = None):
+    for (name, w) in results['workloads'].items():
+        print(f"\n{name}: {w['patches']} patches, {w['points']} points, {w['setpoints']} setpoints "
+              f"({w['wire_bytes']/1e3:.1f} kB), "
+              f"first packet {w['time_to_first_packet']*1e3:.2f} ms, peak {w['peak_memory_bytes']/1e6:.2f} MB")
+        base = (baseline or {}).get('workloads', {}).get(name, {}).get('stages', {})
+        for (stage, s) in w['stages'].items():
+            line = f"  {stage:<13}{s['seconds']*1e3:10.2f} ms {s['points_per_s'] or 0:14.0f} pts/s"
+            if stage in base:
+                line += f"   x{base[stage]['seconds']/s['seconds']:.2f} vs {baseline.get('commit')}"
+            print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trajectory pipeline benchmark")
+    parser.add_argument('--out', help="JSON file for the results")
+    parser.add_argument('--compare', help="JSON results of a previous run, to print the speedups")
+    parser.add_argument('--mode', choices=('single', 'batch', 'compact', 'timed'), default='batch')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--templates', default=TEMPLATE_DIR, help="directory of saved templates")
+    parser.add_argument('--no-serial', action='store_true', help="skip the pty serial stage")
+    args = parser.parse_args()
+
+    # The planner warns about every unreachable sample: keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = run_benchmarks(default_workloads(args.templates), args.mode, args.repeat, not args.no_serial)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults saved to {args.out}")
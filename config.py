@@ -1,3 +1,4 @@
+import os
 from lib import trajpy as tpy
 
 # General Settings
@@ -7,11 +8,31 @@ SETTINGS = {
     'max_acc': 0.35,  # rad/s**2
     'ser_started': False,
     'line_tl': lambda t, tf: tpy.cycloidal([0, 1], 2, tf)[0][0](t),  # timing laws for line
-    'circle_tl': lambda t, tf: tpy.cycloidal([0, 1], 2, tf)[0][0](t)  # timing laws for circle
+    'circle_tl': lambda t, tf: tpy.cycloidal([0, 1], 2, tf)[0][0](t),  # timing laws for circle
+    'line_tl_d': lambda t, tf: [f(t) for f in tpy.cycloidal([0, 1], 2, tf)[0][1:]],  # [ds, dds] of the line timing law
+    'circle_tl_d': lambda t, tf: [f(t) for f in tpy.cycloidal([0, 1], 2, tf)[0][1:]]  # [ds, dds] of the circle timing law
 }
 
 # Serial Configuration
 SERIAL_PORT = None # Auto-detect
+COMPACT_SETPOINTS = False # send fixed-point position deltas (CMD_TRAJECTORY_COMPACT) when the firmware supports them
+
+# Adaptive sampling (CMD_TRAJECTORY_TIMED, when the firmware supports it): only the samples needed to keep the
+# joint-space linear interpolation of the firmware within tolerance are sent, each with the control periods it spans
+ADAPTIVE_SAMPLING = {
+    'enabled': False,
+    'tolerance': 5e-5, # m, Cartesian error allowed at every control period
+    'max_ticks': 20 # control periods per setpoint (at most FLOW_CONTROL['high_water'])
+}
+
+# Firmware Flow Control (credit based, driven by the reported buffer_level)
+FLOW_CONTROL = {
+    'buffer_size': 50, # setpoints the firmware queue can hold
+    'high_water': 40, # queue level the sender tries to keep
+    'report_latency': 0.03, # s, buffer reports younger than this may not count the points just written
+    'min_batch': 5, # points to accumulate as credit before writing (amortizes packet framing)
+    'max_wait': 0.05 # s, longest the sender waits for a buffer report before re-estimating its credit
+}
 
 # Robot Physical Dimensions
 SIZES = {
@@ -29,5 +50,59 @@ WEB_OPTIONS = {
 MAX_SPEED_RAD = 10.0
 MAX_ACC_TOLERANCE_FACTOR = 15.0
 
+# Time-Optimal Parameterization of the pen-down patches (joint limits: MAX_SPEED_RAD, max_acc*MAX_ACC_TOLERANCE_FACTOR)
+TIME_OPTIMAL = {
+    'enabled': True, # False: fixed cycloidal duration (line_tl/circle_tl)
+    'path_step': 5e-4, # m, resolution of the path grid used by the optimization
+    # Consecutive pen-down patches are drawn as one continuous stroke: the arm stops only at pen lifts and sharp corners
+    'blend_tolerance': 2e-4, # m, maximum deviation of a rounded corner from the drawn one
+    'max_blend_angle': 60 # deg, sharper direction changes stop the arm on the corner instead
+}
+
+# Pen-up travel optimization: the strokes of a job are reordered (and reversed) to minimize the time spent on pen-up moves
+TRAVEL_OPTIMIZATION = {
+    'enabled': True,
+    'time_budget': 0.2 # s, nearest neighbour tour improved by 2-opt until the budget runs out
+}
+
+# Plan cache: jobs planned before (same patches, settings and planner) are replayed from disk instead of re-planned
+PLAN_CACHE = {
+    'enabled': True,
+    'directory': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plan_cache'),
+    'max_mb': 64 # least recently used plans are evicted beyond this size
+}
+
+# Trace preview pushed to the frontend when a job is sent (decimated Float32 polylines, see lib/preview.py)
+PREVIEW = {
+    'tolerance': 2e-4, # m, Douglas-Peucker tolerance of the preview (and chord tolerance of its arcs)
+}
+
+# Pose telemetry to the GUI: latest pose only, one update in flight, interval adapted to the browser round trip
+TELEMETRY = {
+    'min_interval': 0.02, # s, fastest publishing rate (50 Hz)
+    'max_interval': 0.5, # s, slowest rate for a browser that falls behind
+    'ack_timeout': 1.0, # s, an unacknowledged update is given up after this (page reloaded, lost message)
+    'keepalive': 1.0 # s, an unchanged pose is sent again after this
+}
+
+# Telemetry recording (state.rec_data / state.log_data): fixed-size rings, the oldest samples are overwritten
+RECORDING = {
+    'capacity': 2**17, # samples of the executed trajectory (~22 min at 100 Hz, 3 MB)
+    'log_capacity': 2**15 # samples of the 17-field log (~5 min at 100 Hz, 4.5 MB)
+}
+
+# Binary run logs: every execution streams its desired setpoints and actual feedback to one file (lib/run_log.py)
+RUN_LOG = {
+    'enabled': True,
+    'directory': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runs')
+}
+
+# Post-run and debug plots (plotting.py): rendered by a worker process so executions never wait for matplotlib
+PLOTTING = {
+    'background': True, # False: plot in the calling thread
+    'workers': 1,
+    'max_pending': 8 # plots queued beyond this are skipped (DEBUG_MODE queues 7 per job)
+}
+
 # Debug Mode (set to True for development, False for production)
 DEBUG_MODE = False
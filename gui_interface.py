@@ -4,16 +4,23 @@ import traceback
 from time import sleep
 
 from lib import trajpy as tpy
-from config import SETTINGS, SIZES, MAX_SPEED_RAD, MAX_ACC_TOLERANCE_FACTOR, SERIAL_PORT, DEBUG_MODE
+from config import SETTINGS, SIZES, SERIAL_PORT, DEBUG_MODE, PLAN_CACHE, PREVIEW
 from state import state
 from serial_manager import serial_manager
 from lib import serial_com as scm
 from lib import binary_protocol as bp
 from lib import char_gen
 from lib import transform
+from lib import workspace
+from lib.trajectory import Trajectory
+from lib.plan_cache import PlanCache
+from lib import preview
 import plotting
+import planner
 import math
 
+plan_cache = PlanCache(PLAN_CACHE['directory'], PLAN_CACHE['max_mb']*10**6) if PLAN_CACHE['enabled'] else None
+
 def read_position_cartesian() -> list[float]:
     q_actual = state.last_known_q[:]
     if SETTINGS['ser_started']:
@@ -32,65 +39,50 @@ def read_position_cartesian() -> list[float]:
     points = tpy.dk(np.array(q_actual), SIZES)
     return [points[0,0], points[1,0]]
 
-def validate_trajectory(q, dq, ddq):
+# Id of the last traced job: the frontend replaces its preview when it changes
+_trace = {'job': 0}
+
+def trace_patches(patches: list):
     """
-    Validate trajectory against speed/acceleration limits.
-    Returns: (is_valid, scale_factor)
-    - is_valid: True if within limits (possibly after scaling)
-    - scale_factor: Factor to multiply time intervals by (1.0 if already valid, >1.0 if needs slowing)
+    Pushes the preview of a new job to the frontend, built from the geometry of its patches (lib/preview.py):
+    nothing is planned for it, so it appears as soon as the job is sent, however long the job is.
     """
-    print("\n--- TRAJECTORY VALIDATION ---")
-    MAX_ACC_RAD = SETTINGS['max_acc'] * MAX_ACC_TOLERANCE_FACTOR
-    
-    # Find maximum velocity and acceleration
-    max_v = 0.0
-    max_a = 0.0
-    
-    for i in range(len(dq[0])):
-        v0 = abs(dq[0][i])
-        v1 = abs(dq[1][i])
-        a0 = abs(ddq[0][i])
-        a1 = abs(ddq[1][i])
-        
-        max_v = max(max_v, v0, v1)
-        max_a = max(max_a, a0, a1)
-    
-    print(f"Stats: Max Vel={max_v:.2f} rad/s (limit: {MAX_SPEED_RAD}), Max Acc={max_a:.2f} rad/s^2 (limit: {MAX_ACC_RAD:.2f})")
-    
-    # Calculate required scale factor
-    # For velocity: v' = v / scale -> need scale >= v / v_max
-    # For acceleration: a' = a / scale^2 -> need scale >= sqrt(a / a_max)
-    scale_v = max_v / MAX_SPEED_RAD if max_v > MAX_SPEED_RAD else 1.0
-    scale_a = (max_a / MAX_ACC_RAD) ** 0.5 if max_a > MAX_ACC_RAD else 1.0
-    
-    scale_factor = max(scale_v, scale_a)
-    
-    if scale_factor > 1.0:
-        print(f"[!] Trajectory exceeds limits. Auto-scaling by factor {scale_factor:.2f}x (slower)")
-        print(f"    New max vel: {max_v/scale_factor:.2f} rad/s, New max acc: {max_a/(scale_factor**2):.2f} rad/s^2")
-        return (True, scale_factor)
-    else:
-        print("Trajectory Dynamics: OK")
-        return (True, 1.0)
-
-def trace_trajectory(q:tuple[list,list]):
-    q1 = q[0][:]
-    q2 = q[1][:]
+    _trace['job'] += 1
+    (x, y, pen) = preview.sample_patches(patches, PREVIEW['tolerance'])
     
     # Guard against empty trajectories
-    if not q1 or not q2:
+    if len(x) == 0:
         print("Warning: Empty trajectory, nothing to trace")
         return
         
-    eel.js_draw_traces([q1, q2])
-    eel.js_draw_pose([q1[-1], q2[-1]])
+    keep = preview.decimate(x, y, pen, PREVIEW['tolerance'])
+    eel.js_draw_preview({'job': _trace['job'], 'points': preview.pack(x[keep], y[keep], pen[keep])})
 
-    # DEBUG
-    if DEBUG_MODE:
-        x = [] 
-        for i in range(len(q1)):
-            x.append(tpy.dk(np.array([q1[i], q2[i]]).T))
-        plotting.debug_plotXY([xt[0] for xt in x], [yt[1] for yt in x], "xy")
+def _debug_stream(chunks, capacity: int):
+    """
+    Forwards the planned chunks unchanged and, once they have all been executed, validates and plots the
+    whole job (DEBUG_MODE), kept in one columnar Trajectory allocated for `capacity` samples.
+    """
+    trj = Trajectory(SETTINGS['Tc'], capacity)
+    for chunk in chunks:
+        trj.append(*chunk[:3])
+        yield chunk
+
+    # DEBUG PLOTS
+    if len(trj):
+        try:
+            (q, dq, ddq) = (trj.q, trj.dq, trj.ddq)
+            planner.validate_trajectory(q, dq, ddq)
+            (x, y, _) = tpy.dk_batch(q[0], q[1], SIZES)
+            plotting.submit(plotting.debug_plotXY, x, y, "xy")
+            plotting.submit(plotting.debug_plot, q[0], 'q1')
+            plotting.submit(plotting.debug_plot, dq[0], 'dq1')
+            plotting.submit(plotting.debug_plot, ddq[0], 'ddq1')
+            plotting.submit(plotting.debug_plot, q[1], 'q2')
+            plotting.submit(plotting.debug_plot, dq[1], 'dq2')
+            plotting.submit(plotting.debug_plot, ddq[1], 'ddq2')
+        except Exception as e:
+            print(f"Trace Error: {e}")
 
 # --- EEL EXPOSED FUNCTIONS ---
 
@@ -112,66 +104,32 @@ def py_get_data():
         if len(data) < 1: 
             raise Exception("Not Enough Points to build a Trajectory")
             
+        check = workspace.check_patches(data, SIZES)
+        if not check['valid']:
+            (x, y) = check['points'][:, 0]
+            (nx, ny) = check['nearest'][:, 0]
+            print(f"Warning: {len(check['unreachable'])} patch(es) leave the workspace, e.g. ({x:.3f}, {y:.3f}) "
+                  f"(nearest reachable: ({nx:.3f}, {ny:.3f})): the arm holds its position there")
+
+        # A job still running is stopped first: the new one is planned from where it actually stopped
+        serial_manager.stop_execution()
         current_q = read_position_cartesian()
         print(f"Start Point: {current_q}")
         
-        # Add initial path from current position
-        data = [{'type':'line', 'points':[current_q, data[0]['points'][0]], 'data':{'penup':True}}] + data[::]
-        
-        # Stitch patches
-        q0s = []
-        q1s = []
-        penups = []
-        ts = []
-        for patch in data: 
-            (q0s_p, q1s_p, penups_p, ts_p) = tpy.slice_trj(
-                patch, 
-                Tc=SETTINGS['Tc'],
-                max_acc=SETTINGS['max_acc'],
-                line=SETTINGS['line_tl'],
-                circle=SETTINGS['circle_tl'],
-                sizes=SIZES
-            )
-            # Stitching logic
-            q0s += q0s_p if len(q0s) == 0 else q0s_p[1:] 
-            q1s += q1s_p if len(q1s) == 0 else q1s_p[1:]
-            penups += penups_p if len(penups) == 0 else penups_p[1:]
-            ts += [(t + ts[-1] if len(ts) > 0  else t) for t in (ts_p if len(ts) == 0 else ts_p[1:])]
-
-        q = (q0s, q1s, penups)
-        dq = (tpy.find_velocities(q[0], ts), tpy.find_velocities(q[1], ts))
-        ddq = (tpy.find_accelerations(dq[0], ts), tpy.find_accelerations(dq[1], ts))
-        
-        # Validate and get scale factor
-        (is_valid, scale_factor) = validate_trajectory(q, dq, ddq)
-        
-        # Apply scaling if needed
-        if scale_factor > 1.0:
-            print(f"Applying time scaling factor: {scale_factor:.2f}x")
-            # Scale time intervals
-            ts_scaled = [t * scale_factor for t in ts]
-            # Recalculate velocities and accelerations with scaled time
-            dq = (tpy.find_velocities(q[0], ts_scaled), tpy.find_velocities(q[1], ts_scaled))
-            ddq = (tpy.find_accelerations(dq[0], ts_scaled), tpy.find_accelerations(dq[1], ts_scaled))
-            ts = ts_scaled
-            print(f"Trajectory scaled. New duration: {ts[-1]:.2f}s")
-            
+        # Plan lazily: the execution thread pulls patches through the pipeline while it transmits.
+        # Repeated jobs (templates, text) are replayed from the plan cache: only the travel from here is planned.
         state.stop_requested = False # Reset flag before start
-        serial_manager.send_data('trj', q=q, dq=dq, ddq=ddq)
-        
-        if len(q0s) > 0:
-             state.last_known_q = [q0s[-1], q1s[-1]]
-        
-        trace_trajectory(q)
-        
-        # DEBUG PLOTS
+        # The preview comes from the patches, not from the stream: it does not wait for the execution
+        try:
+            trace_patches(data)
+        except Exception as e:
+            print(f"Trace Error: {e}")
+        chunks = planner.plan_job(data, current_q, plan_cache)
+        # The whole-job trajectories are allocated once, from the per-patch sample counts
+        capacity = planner.job_samples(data, current_q)
         if DEBUG_MODE:
-            plotting.debug_plot(q[0], 'q1')
-            plotting.debug_plot(dq[0], 'dq1')
-            plotting.debug_plot(ddq[0], 'ddq1')
-            plotting.debug_plot(q[1], 'q2')
-            plotting.debug_plot(dq[1], 'dq2')
-            plotting.debug_plot(ddq[1], 'ddq2')
+            chunks = _debug_stream(chunks, capacity)
+        serial_manager.send_data('stream', chunks=chunks, capacity=capacity)
 
     except Exception as e:
         print(f"Error in py_get_data: {e}")
@@ -233,36 +191,22 @@ def py_homing_cmd():
         
         tf = max(tf0, tf1)
         
-        # Sample points
-        ts = tpy.rangef(0, SETTINGS['Tc'], tf, True)
-        
-        q0s = [f0[0](t) for t in ts]
-        q1s = [f1[0](t) for t in ts]
-        
-        # Velocity/Acc (Optional for sim but good for plot)
-        dq0s = [f0[1](t) for t in ts]
-        dq1s = [f1[1](t) for t in ts]
+        # Sample points (the cycloidal handles are evaluated on the whole time vector)
+        ts = np.array(tpy.rangef(0, SETTINGS['Tc'], tf, True))
         
-        ddq0s = [f0[2](t) for t in ts]
-        ddq1s = [f1[2](t) for t in ts] # Corrected from f0 to f1
-        
-        # Package for serial_manager (Sim Engine)
-        # It expects tuple lists: q=(q0s, q1s, penups)
-        # penups = 1 (Up) usually for homing to be safe? Or 0?
-        # Let's say 1 (Up).
-        penups = [1] * len(q0s)
-        
-        q = (q0s, q1s, penups)
-        dq = (dq0s, dq1s)
-        ddq = (ddq0s, ddq1s) # We don't really use this in sim, but consisteny
+        # Package for serial_manager (Sim Engine): pen up (1) for a safe homing
+        trj = Trajectory.from_arrays((f0[0](ts), f1[0](ts), np.ones(len(ts))),
+                                     (f0[1](ts), f1[1](ts)),
+                                     (f0[2](ts), f1[2](ts)), SETTINGS['Tc'])
+        (q0s, q1s, _) = trj.q
         
         # DEBUG: Log trajectory endpoints
-        print(f"Homing Trajectory: {len(q0s)} points")
+        print(f"Homing Trajectory: {len(trj)} points")
         print(f"  Start: q0={q0s[0]:.4f}, q1={q1s[0]:.4f}")
         print(f"  End:   q0={q0s[-1]:.4f}, q1={q1s[-1]:.4f}")
         
         # Send to manager
-        serial_manager.send_data('trj', q=q, dq=dq, ddq=ddq)
+        serial_manager.send_data('trj', q=trj.q, dq=trj.dq, ddq=trj.ddq)
         
         # Update last known
         state.last_known_q = [0.0, 0.0]
@@ -279,7 +223,7 @@ def py_serial_startup():
 
 @eel.expose
 def py_get_position():
-    # Return current robot state for Polling (Backup for Push)
+    # Current robot state on request (the GUI is kept up to date by telemetry.pose_publisher)
     q0, q1, pen_up = state.firmware.get_position()
     return [q0, q1, pen_up]
 
@@ -357,6 +301,12 @@ def _apply_curved_transform(patches, radius, offset_angle):
         
     return transformed
 
+# Last text generated for the preview: py_validate_text is called right after it with the same arguments
+_last_text = {'key': None, 'patches': []}
+
+def _text_key(text, options):
+    return (text, repr(sorted(options.items())) if isinstance(options, dict) else repr(options))
+
 @eel.expose
 def py_generate_text(text, options):
     print(f"Generating Text: '{text}' with options: {options}")
@@ -439,6 +389,8 @@ def py_generate_text(text, options):
         else:
             final_patches = patches
 
+        _last_text['key'] = _text_key(text, options)
+        _last_text['patches'] = final_patches
         return final_patches
         
     except Exception as e:
@@ -448,46 +400,22 @@ def py_generate_text(text, options):
 
 @eel.expose
 def py_validate_text(text, options):
-    # Generate the trajectory first
-    patches = py_generate_text(text, options)
+    # Generate the trajectory first (or reuse the preview of the same text)
+    if _last_text['key'] == _text_key(text, options):
+        patches = _last_text['patches']
+    else:
+        patches = py_generate_text(text, options)
     
     if not patches:
         return {'valid': True, 'message': 'Empty'}
 
-    valid = True
+    # Whole patches (not only their end points) against the workspace, with a 1% margin from its borders
+    check = workspace.check_patches(patches, SIZES, margin=0.01)
+    valid = check['valid']
     msg = "OK"
-    
-    # Check every point against IK or Workspace limits
-    # We can use tpy.ik to check if a solution exists
-    for patch in patches:
-        for p in patch['points']:
-            try:
-                # Check if point is reachable
-                # tpy.ik returns numpy array of q1, q2
-                # If it raises error or returns NaNs (depends on implementation), it's invalid.
-                # Looking at tpy.ik (dk is imported), let's assume it might throw or we check bounds.
-                # Actually commonly verification is checking if point is within reach.
-                # R_min < dist < R_max
-                
-                x, y = p
-                dist = (x**2 + y**2)**0.5
-                
-                # Check simple radius bounds
-                l1 = SIZES['l1']
-                l2 = SIZES['l2']
-                max_reach = l1 + l2
-                min_reach = abs(l1 - l2)
-                
-                if dist > max_reach * 0.99 or dist < min_reach * 1.01:
-                    valid = False
-                    msg = "Point out of reach"
-                    break
-                    
-            except Exception as e:
-                valid = False
-                msg = f"IK Error: {e}"
-                break
-        if not valid: break
+    if not valid:
+        (x, y) = check['points'][:, 0]
+        msg = f"Point out of reach ({x:.3f}, {y:.3f}), {len(check['unreachable'])} segment(s) affected"
         
     return {'valid': valid, 'message': msg}
 
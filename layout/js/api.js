@@ -85,12 +85,17 @@ export const API = {
 
         window.js_draw_pose = (q) => {
             if (callbacks.onDrawPose) callbacks.onDrawPose(q);
+            return true; // Acknowledgement: Python sends the next pose only after this one is handled
         };
 
         window.js_draw_traces = (points) => {
             if (callbacks.onDrawTraces) callbacks.onDrawTraces(points);
         }
 
+        window.js_draw_preview = (preview) => {
+            if (callbacks.onDrawPreview) callbacks.onDrawPreview(preview);
+        }
+
         // This is complex: Python calls this to GET data.
         // It expects a synchronous return of the data.
         window.js_get_data = () => {
@@ -102,6 +107,7 @@ export const API = {
         window.eel.expose(window.js_log, 'js_log');
         window.eel.expose(window.js_draw_pose, 'js_draw_pose');
         window.eel.expose(window.js_draw_traces, 'js_draw_traces');
+        window.eel.expose(window.js_draw_preview, 'js_draw_preview');
         window.eel.expose(window.js_get_data, 'js_get_data');
     }
 };
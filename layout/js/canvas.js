@@ -661,6 +661,7 @@ export class CanvasHandler {
 
         // Draw Manipulator
         if (this.state.manipulator) {
+            this.state.manipulator.draw_preview(ctx);
             this.state.manipulator.draw_pose(ctx);
             // this.state.manipulator.draw_traces(ctx); // Performance heavy
         }
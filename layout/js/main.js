@@ -1,6 +1,6 @@
 import { appState, TOOLS } from './state.js';
 import { CanvasHandler } from './canvas.js';
-import { Point } from './utils.js';
+import { Point, decodePreview } from './utils.js';
 import { API } from './api.js';
 
 // --- Initialization ---
@@ -365,7 +365,7 @@ window.addEventListener('load', () => {
     updateUndoRedoUI();
     if (typeof canvasHandler !== 'undefined' && canvasHandler) canvasHandler.resize();
     updateSerialStatus();
-    setInterval(updateSerialStatus, 50);
+    setInterval(updateSerialStatus, 500);
 });
 
 // --- App Mode Logic ---
@@ -621,23 +621,9 @@ function updateSerialStatus() {
         }
     });
 
-    // POLLING LOOP for Simulation/Position
-    // We poll faster to get smooth animation
-    API.getPosition().then(pos => {
-        if (state.manipulator && pos && pos.length >= 2) {
-            // Update Manipulator State (for drawing)
-            // pos = [q0, q1, penUp]
-            state.manipulator.q = [pos[0], pos[1]];
-
-            // Note: Pen state from backend might be useful
-            // But we trust local state for drawing logic usually.
-            // For Simulation, we want to see the "Virtual" pen state?
-            // Optional.
-        }
-    }).catch(e => console.warn("Polling Error:", e));
+    // The pose is pushed by Python (js_draw_pose), coalesced to the rate the page keeps up with: no polling
 }
 
-// Start Fast Polling (50ms = 20Hz)
 // --- Cleanup & Helpers ---
 // (Immediate calls removed to prevent crash before UI init)
 // API.initCallbacks and Keydown listeners preserved
@@ -817,6 +803,11 @@ API.initCallbacks({
         }
     },
 
+    onDrawPreview: (preview) => {
+        // preview = {job, points}: points is the packed Float32 preview of the whole job
+        if (state.manipulator) state.manipulator.set_preview(preview.job, decodePreview(preview.points));
+    },
+
     onGetData: () => {
         return getTrajectoryPayload();
     }
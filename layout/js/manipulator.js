@@ -5,6 +5,7 @@ export class Manipulator {
         this.q_coords = q;
         this.settings = settings;
         this.traces = { 'x1': [], 'x2': [] };
+        this.preview = { 'job': null, 'points': null }; // Float32Array of the (x, y, pen) preview pushed by Python
         this.penUp = true; // Default to Up
 
         // Calculate initial position
@@ -53,6 +54,12 @@ export class Manipulator {
 
     reset_trace() {
         this.traces = { 'x1': [], 'x2': [] };
+        this.preview = { 'job': null, 'points': null };
+    }
+
+    set_preview(job, points) {
+        // Every push carries the whole preview of a job: it replaces the previous one
+        this.preview = { 'job': job, 'points': points };
     }
 
     // --- Kinematics ---
@@ -120,6 +127,23 @@ export class Manipulator {
         ctx.closePath();
     }
 
+    draw_preview(ctx, color = 'rgba(0,255,0,0.3)') {
+        // Decimated polyline in meters: segments ending on a pen-up point are travel moves, not drawn
+        const points = this.preview['points'];
+        if (!points || points.length < 1) return;
+
+        ctx.lineWidth = 3;
+        ctx.beginPath();
+        ctx.strokeStyle = color;
+        for (let i = 0; i < points.length; i += 3) {
+            const [x, y] = abs2rel(points[i], points[i + 1], this.settings);
+            if (i === 0 || points[i + 2]) ctx.moveTo(x, y);
+            else ctx.lineTo(x, y);
+        }
+        ctx.stroke();
+        ctx.closePath();
+    }
+
     draw_traces(ctx, colors = ['rgba(0,0,255,0.3)', 'rgba(0,255,0,0.3)']) {
         // Traces are heavy, draw them efficiently
         if (this.traces['x1'].length < 1 || this.traces['x2'].length < 1) return;
@@ -113,6 +113,16 @@ export function abs2rel(x, y, settings) {
     return [x_p, y_p];
 }
 
+export function decodePreview(payload) {
+    /*
+    Packed preview from Python (lib/preview.py): base64 of little-endian Float32 (x, y, pen) triplets
+    */
+    const binary = atob(payload);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+    return new Float32Array(bytes.buffer);
+}
+
 export function find_circ(points, circle_definition, settings) {
     /*
     Calculate circle parameters given 3 points definition logic
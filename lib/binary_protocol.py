@@ -1,4 +1,5 @@
 import struct
+import numpy as np
 
 # Constants
 START_BYTE_1 = 0xA5
@@ -9,17 +10,48 @@ CMD_TRAJECTORY = 0x01
 CMD_HOMING = 0x02
 CMD_STOP = 0x03
 CMD_POS = 0x04
+CMD_CAPS = 0x05
+CMD_TRAJECTORY_BATCH = 0x06
+CMD_TRAJECTORY_COMPACT = 0x07
+CMD_TRAJECTORY_TIMED = 0x08
 
 # Response IDs
 RESP_ACK = 0xAA
 RESP_NACK = 0xFF
 RESP_STATUS = 0x01
 RESP_POS = 0x02
+RESP_CAPS = 0x03
+
+# Capability flags (RESP_CAPS payload)
+CAP_TRAJECTORY_BATCH = 0x01
+CAP_COMPACT_SETPOINTS = 0x02
+CAP_TIMED_SETPOINTS = 0x04
+
+# Layout of one setpoint, same as the CMD_TRAJECTORY payload (25 bytes, no padding)
+SETPOINT_DTYPE = np.dtype([
+    ('q0', '<f4'), ('q1', '<f4'),
+    ('dq0', '<f4'), ('dq1', '<f4'),
+    ('ddq0', '<f4'), ('ddq1', '<f4'),
+    ('pen_up', 'u1')
+])
+SETPOINT_SIZE = SETPOINT_DTYPE.itemsize
+MAX_BATCH_POINTS = 255 # the point count is a single byte
+
+# Compact setpoints: fixed-point position deltas from an absolute keyframe
+POSITION_LSB = 1e-5 # rad per count (int16 deltas cover +-0.33 rad per sample)
+COMPACT_MAX_POINTS = 64 # keyframe interval: every compact packet restarts from an absolute position
 
 def calculate_crc32(data: bytes) -> int:
     import zlib
     return zlib.crc32(data) & 0xFFFFFFFF
 
+def encode_frame(cmd: int, payload: bytes) -> bytes:
+    """Header + Cmd + Payload + CRC32 (computed over Cmd + Payload)"""
+    checksum_data = struct.pack('B', cmd) + payload
+    crc = calculate_crc32(checksum_data)
+    header = struct.pack('BB', START_BYTE_1, START_BYTE_2)
+    return header + checksum_data + struct.pack('<I', crc)
+
 def encode_trajectory_point(q0: float, q1: float, dq0: float, dq1: float, ddq0: float, ddq1: float, pen_up: bool) -> bytes:
     cmd = CMD_TRAJECTORY
     pen_up_val = 1 if pen_up else 0
@@ -30,6 +62,130 @@ def encode_trajectory_point(q0: float, q1: float, dq0: float, dq1: float, ddq0:
     packet = header + checksum_data + struct.pack('<I', crc)
     return packet
 
+def pack_setpoints(q0, q1, dq0, dq1, ddq0, ddq1, pen_up) -> bytes:
+    """
+    Packs N setpoints (array arguments) into one contiguous block of N*SETPOINT_SIZE bytes.
+    Every SETPOINT_SIZE slice is a valid CMD_TRAJECTORY payload.
+    """
+    setpoints = np.empty(len(q0), dtype=SETPOINT_DTYPE)
+    setpoints['q0'] = q0
+    setpoints['q1'] = q1
+    setpoints['dq0'] = dq0
+    setpoints['dq1'] = dq1
+    setpoints['ddq0'] = ddq0
+    setpoints['ddq1'] = ddq1
+    setpoints['pen_up'] = np.asarray(pen_up) != 0
+    return setpoints.tobytes()
+
+def encode_trajectory_payload(payload: bytes) -> bytes:
+    """Single CMD_TRAJECTORY packet from an already packed setpoint"""
+    return encode_frame(CMD_TRAJECTORY, payload)
+
+def encode_trajectory_batch(setpoints: bytes) -> bytes:
+    """
+    One CMD_TRAJECTORY_BATCH packet carrying several packed setpoints under a single header and CRC.
+    Structure: Header(2) + Cmd(1) + Count(1) + Count*SETPOINT_SIZE + CRC(4)
+    """
+    count, rest = divmod(len(setpoints), SETPOINT_SIZE)
+    if rest != 0 or not (0 < count <= MAX_BATCH_POINTS):
+        raise ValueError(f"Invalid setpoint block: {len(setpoints)} bytes")
+    return encode_frame(CMD_TRAJECTORY_BATCH, struct.pack('B', count) + setpoints)
+
+def encode_trajectory_compact(q0, q1, pen_up) -> bytes:
+    """
+    One CMD_TRAJECTORY_COMPACT packet: positions only (velocities and accelerations are recomputed by the firmware).
+    Structure: Header(2) + Cmd(1) + Count(1) + Width(1) + KeyQ0(4) + KeyQ1(4)
+               + (Count-1)*2*Width + PenBits(ceil(Count/8)) + CRC(4)
+    The first point is the absolute keyframe (float32), the others are int16 (Width=2) or int24 (Width=3)
+    deltas in POSITION_LSB units, interleaved q0/q1. Offsets are quantized against the keyframe before
+    being differenced, so the reconstruction error stays within POSITION_LSB/2 and does not drift.
+    """
+    q = np.column_stack((np.asarray(q0, dtype=float), np.asarray(q1, dtype=float)))
+    count = len(q)
+    if not (0 < count <= MAX_BATCH_POINTS):
+        raise ValueError(f"Invalid number of compact setpoints: {count}")
+    key = q[0].astype('<f4')
+    offsets = np.rint((q - key.astype(float)) / POSITION_LSB).astype(np.int64)
+    deltas = np.diff(offsets, axis=0)
+    max_delta = int(np.abs(deltas).max()) if deltas.size else 0
+    if max_delta <= 0x7FFF:
+        width = 2
+        body = deltas.astype('<i2').tobytes()
+    elif max_delta <= 0x7FFFFF:
+        width = 3
+        body = deltas.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        raise ValueError(f"Setpoint step too large for compact encoding: {max_delta*POSITION_LSB:.3f} rad")
+    pen_bits = np.packbits(np.asarray(pen_up) != 0, bitorder='little').tobytes()
+    payload = struct.pack('BB', count, width) + key.tobytes() + body + pen_bits
+    return encode_frame(CMD_TRAJECTORY_COMPACT, payload)
+
+def decode_trajectory_compact(data: bytes) -> tuple:
+    """Inverse of encode_trajectory_compact: returns (q0s, q1s, pen_ups) arrays, None if the packet is invalid"""
+    if len(data) < 2 + 1 + 2 + 8 + 1 + 4:
+        return None
+    if data[0] != START_BYTE_1 or data[1] != START_BYTE_2 or data[2] != CMD_TRAJECTORY_COMPACT:
+        return None
+    count, width = data[3], data[4]
+    body_end = 13 + (count-1)*2*width
+    pen_end = body_end + (count+7)//8
+    if count == 0 or width not in (2, 3) or len(data) != pen_end + 4:
+        return None
+    if struct.unpack('<I', data[pen_end:])[0] != calculate_crc32(data[2:pen_end]):
+        print("CRC Error on compact trajectory packet")
+        return None
+
+    key = np.frombuffer(data, dtype='<f4', count=2, offset=5).astype(float)
+    raw = np.frombuffer(data[13:body_end], dtype=np.uint8)
+    if width == 2:
+        deltas = raw.view('<i2').astype(np.int64)
+    else:
+        b = raw.reshape(-1, 3).astype(np.int64)
+        deltas = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        deltas = (deltas ^ 0x800000) - 0x800000 # sign extension of the 24 bit values
+    offsets = np.zeros((count, 2), dtype=np.int64)
+    offsets[1:] = np.cumsum(deltas.reshape(-1, 2), axis=0)
+    q = key + offsets*POSITION_LSB
+    pen = np.unpackbits(np.frombuffer(data[body_end:pen_end], dtype=np.uint8), bitorder='little')[:count]
+    return q[:, 0], q[:, 1], pen
+
+# Timed setpoints: the firmware reaches (q0, q1) `ticks` control periods after the previous setpoint,
+# interpolating linearly in the joint space (one point per Tc); the pen state holds for the whole span.
+# With these setpoints the RESP_STATUS buffer level counts the queued control periods, not the setpoints.
+TIMED_SETPOINT_DTYPE = np.dtype([('q0', '<f4'), ('q1', '<f4'), ('ticks', 'u1'), ('pen_up', 'u1')])
+TIMED_SETPOINT_SIZE = TIMED_SETPOINT_DTYPE.itemsize
+
+def encode_trajectory_timed(q0, q1, ticks, pen_up) -> bytes:
+    """
+    One CMD_TRAJECTORY_TIMED packet: positions only, each one with its duration in control periods.
+    Structure: Header(2) + Cmd(1) + Count(1) + Count*TIMED_SETPOINT_SIZE + CRC(4)
+    """
+    count = len(q0)
+    if not (0 < count <= MAX_BATCH_POINTS):
+        raise ValueError(f"Invalid number of timed setpoints: {count}")
+    ticks = np.asarray(ticks)
+    if ticks.min() < 1 or ticks.max() > 0xFF:
+        raise ValueError(f"Setpoint duration out of range: {ticks.min()}-{ticks.max()} control periods")
+    setpoints = np.empty(count, dtype=TIMED_SETPOINT_DTYPE)
+    setpoints['q0'] = q0
+    setpoints['q1'] = q1
+    setpoints['ticks'] = ticks
+    setpoints['pen_up'] = np.asarray(pen_up) != 0
+    return encode_frame(CMD_TRAJECTORY_TIMED, struct.pack('B', count) + setpoints.tobytes())
+
+def decode_trajectory_timed(data: bytes) -> np.ndarray:
+    """Inverse of encode_trajectory_timed: structured array of TIMED_SETPOINT_DTYPE, None if the packet is invalid"""
+    if len(data) < 2 + 1 + 1 + 4 or data[0] != START_BYTE_1 or data[1] != START_BYTE_2 or data[2] != CMD_TRAJECTORY_TIMED:
+        return None
+    count = data[3]
+    end = 4 + count*TIMED_SETPOINT_SIZE
+    if count == 0 or len(data) != end + 4:
+        return None
+    if struct.unpack('<I', data[end:])[0] != calculate_crc32(data[2:end]):
+        print("CRC Error on timed trajectory packet")
+        return None
+    return np.frombuffer(data, dtype=TIMED_SETPOINT_DTYPE, count=count, offset=4)
+
 def encode_stop_command() -> bytes:
     cmd = CMD_STOP
     payload = struct.pack('<ffffffB', 0, 0, 0, 0, 0, 0, 0) # Zero payload
@@ -57,6 +213,22 @@ def encode_pos_command() -> bytes:
     packet = header + checksum_data + struct.pack('<I', crc)
     return packet
 
+def encode_caps_command() -> bytes:
+    # Same fixed size as the other commands, so firmware without CMD_CAPS stays in sync
+    return encode_frame(CMD_CAPS, struct.pack('<ffffffB', 0, 0, 0, 0, 0, 0, 0))
+
+# --- Firmware side (responses), used by the firmware simulator ---
+
+def encode_status_feedback(buffer_level: int) -> bytes:
+    # Structure: Header(2) + Type(1) + Level(1) + CRC(4) = 8 bytes
+    return encode_frame(RESP_STATUS, struct.pack('B', min(buffer_level, 0xFF)))
+
+def encode_position_feedback(q0: float, q1: float) -> bytes:
+    return encode_frame(RESP_POS, struct.pack('<ff', q0, q1))
+
+def encode_caps_feedback(capabilities: int) -> bytes:
+    return encode_frame(RESP_CAPS, struct.pack('B', capabilities))
+
 def decode_feedback(data: bytes) -> dict:
     if len(data) < 8:
         return None
@@ -67,6 +239,8 @@ def decode_feedback(data: bytes) -> dict:
     
     if resp_type == RESP_POS:
         return decode_position_feedback(data)
+    if resp_type == RESP_CAPS:
+        return decode_caps_feedback(data)
         
     buffer_level = data[3]
     return {'type': resp_type, 'buffer_level': buffer_level}
@@ -97,3 +271,11 @@ def decode_position_feedback(data: bytes) -> dict:
     except Exception as e:
         print(f"Decode Error: {e}")
         return None
+
+def decode_caps_feedback(data: bytes) -> dict:
+    # Structure: Header(2) + Type(1) + Flags(1) + CRC(4) = 8 bytes
+    received_crc = struct.unpack('<I', data[4:8])[0]
+    if received_crc != calculate_crc32(data[2:4]):
+        print("CRC Error on CAPS Feedback")
+        return None
+    return {'type': RESP_CAPS, 'capabilities': data[3]}
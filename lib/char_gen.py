@@ -15,6 +15,7 @@ Supports 'line' (list of points) and 'ellipse' (parametric).
 """
 
 import math
+from functools import lru_cache
 
 # Character definitions
 # Format: List of Primitives.
@@ -158,6 +159,26 @@ def sample_ellipse(center, radii, arc, steps=None):
         
     return points
 
+GLYPH_CACHE_SIZE = 256 # (char, font_size) pairs kept by glyph_polylines
+
+@lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def glyph_polylines(char: str, font_size: float) -> tuple:
+    """
+    Polylines of a character scaled to font_size, relative to the bottom-left corner of its box
+    (ellipses already sampled). Cached: text is assembled by translating the glyphs.
+    """
+    char_width = font_size
+    polylines = []
+    for prim in get_char_strokes(char):
+        norm_points = []
+        if prim['type'] == 'line':
+            norm_points = prim['points']
+        elif prim['type'] == 'ellipse':
+            norm_points = sample_ellipse(prim['center'], prim['radii'], prim['arc'])
+        if not norm_points: continue
+        polylines.append(tuple((p[0] * char_width * 0.8, p[1] * font_size) for p in norm_points))
+    return tuple(polylines)
+
 def text_to_traj(text: str, start_pos: tuple, font_size: float, char_spacing: float):
     """
     Generates a list of line segments for the given text.
@@ -176,28 +197,11 @@ def text_to_traj(text: str, start_pos: tuple, font_size: float, char_spacing: fl
             cursor_x += (font_size * 0.8) + char_spacing
             continue
 
-        primitives = get_char_strokes(char)
-        char_width = font_size
-        
-        for prim in primitives:
-            # 1. Get Normalized Points
-            norm_points = []
-            
-            if prim['type'] == 'line':
-                norm_points = prim['points']
-            elif prim['type'] == 'ellipse':
-                norm_points = sample_ellipse(prim['center'], prim['radii'], prim['arc'])
-                
-            if not norm_points: continue
-            
-            # 2. Scale & Translate to World
-            world_points = []
-            for p in norm_points:
-                wx = cursor_x + p[0] * char_width * 0.8 
-                wy = cursor_y + p[1] * font_size
-                world_points.append((wx, wy))
+        for polyline in glyph_polylines(char.upper(), font_size):
+            # Translate the cached glyph to the cursor
+            world_points = [(cursor_x + x, cursor_y + y) for (x, y) in polyline]
             
-            # 3. Create Segments
+            # Create Segments
             for i in range(len(world_points) - 1):
                 p0 = world_points[i]
                 p1 = world_points[i+1]
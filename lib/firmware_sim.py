@@ -0,0 +1,253 @@
+"""
+Virtual firmware on a pseudo-terminal (Linux/macOS), for load testing without the robot.
+It speaks the same binary protocol as the board: trajectory setpoints (single, batched or compact)
+go into a bounded queue consumed one every Tc, and the buffer level is reported back with RESP_STATUS.
+Timed setpoints are interpolated linearly (joint space) into one queued point per control period.
+Latency, dropped frames and CRC corruption can be injected on the feedback to exercise flow control and parsing.
+
+Standalone: python -m lib.firmware_sim [--latency 0.005] [--drop 0.01] [--corrupt 0.01]
+then connect the GUI to the printed port (SERIAL_PORT in config.py).
+"""
+
+import os
+import tty
+import time
+import heapq
+import random
+import select
+import struct
+import threading
+from collections import deque
+from lib import binary_protocol as bp
+
+COMMAND_SIZE = 32 # fixed size commands: Header(2) + Cmd(1) + '<ffffffB'(25) + CRC(4)
+
+class VirtualFirmware:
+    def __init__(self, Tc: float = 0.01, buffer_size: int = 50,
+                 capabilities: int = bp.CAP_TRAJECTORY_BATCH | bp.CAP_COMPACT_SETPOINTS | bp.CAP_TIMED_SETPOINTS,
+                 latency: float = 0.0, drop_rate: float = 0.0, corrupt_rate: float = 0.0,
+                 status_every: int = 1, pos_every: int = 5, seed: int = None):
+        self.Tc = Tc
+        self.buffer_size = buffer_size
+        self.capabilities = capabilities
+        self.latency = latency # s, added to every byte received and every frame sent
+        self.drop_rate = drop_rate # probability of losing a feedback frame
+        self.corrupt_rate = corrupt_rate # probability of flipping a bit in a feedback frame
+        self.status_every = status_every # ticks between RESP_STATUS reports
+        self.pos_every = pos_every # ticks between RESP_POS reports
+        self.random = random.Random(seed)
+
+        self.queue = deque() # (q0, q1, pen_up) waiting to be executed
+        self.q = (0.0, 0.0, True)
+        self.target = self.q # last queued point, where the next timed setpoint starts from
+        self.master = None
+        self.slave = None
+        self.thread = None
+        self.running = False
+        self._rx = bytearray() # received, not parsed yet
+        self._rx_pending = deque() # (due, data) delayed by the injected latency
+        self._tx_pending = [] # heap of (due, seq, frame)
+        self._tx_seq = 0
+        self._active = False # the queue was not empty on the previous tick
+        self.stats = {
+            'points': 0, 'consumed': 0, 'overflow': 0, 'underruns': 0, 'max_level': 0,
+            'crc_errors': 0, 'resync_bytes': 0, 'frames_sent': 0, 'dropped': 0, 'corrupted': 0
+        }
+
+    # --- Lifecycle ---
+
+    def open(self) -> str:
+        """Creates the pseudo-terminal and returns the device path to open with pyserial"""
+        (self.master, self.slave) = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False) # nobody listening: feedback is lost, as on a real UART
+        return os.ttyname(self.slave)
+
+    def start(self) -> str:
+        port = self.open() if self.master is None else os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        (self.master, self.slave) = (None, None)
+
+    def level(self) -> int:
+        return len(self.queue)
+
+    # --- Main loop ---
+
+    def _run(self):
+        next_tick = time.monotonic() + self.Tc
+        tick = 0
+        while self.running:
+            now = time.monotonic()
+            wake = next_tick
+            if self._rx_pending: wake = min(wake, self._rx_pending[0][0])
+            if self._tx_pending: wake = min(wake, self._tx_pending[0][0])
+            # bounded wait, so that stop() is noticed even with a long Tc
+            if select.select([self.master], [], [], min(max(0.0, wake - now), 0.1))[0]:
+                try:
+                    self._rx_pending.append((time.monotonic() + self.latency, os.read(self.master, 4096)))
+                except BlockingIOError:
+                    pass
+
+            now = time.monotonic()
+            while self._rx_pending and self._rx_pending[0][0] <= now:
+                self._rx += self._rx_pending.popleft()[1]
+            self._parse()
+
+            # The firmware runs in real time: ticks missed while busy are executed at once
+            while next_tick <= now:
+                tick += 1
+                self._tick(tick)
+                next_tick += self.Tc
+
+            while self._tx_pending and self._tx_pending[0][0] <= now:
+                self._write(heapq.heappop(self._tx_pending)[2])
+
+    def _tick(self, tick: int):
+        """One control period: executes a setpoint and reports"""
+        if self.queue:
+            self.q = self.queue.popleft()
+            self.stats['consumed'] += 1
+            self._active = True
+        elif self._active:
+            self.stats['underruns'] += 1
+            self._active = False
+        if tick % self.status_every == 0:
+            self._send(bp.encode_status_feedback(len(self.queue)))
+        if tick % self.pos_every == 0:
+            self._send(bp.encode_position_feedback(*self.q[:2]))
+
+    # --- Commands ---
+
+    def _frame_size(self) -> int:
+        """Size of the command at the start of _rx, 0 if more bytes are needed, None if it is not a command"""
+        if len(self._rx) < 3:
+            return 0
+        cmd = self._rx[2]
+        if cmd in (bp.CMD_TRAJECTORY, bp.CMD_HOMING, bp.CMD_STOP, bp.CMD_POS, bp.CMD_CAPS):
+            return COMMAND_SIZE
+        if len(self._rx) < 5:
+            return 0
+        count = self._rx[3]
+        if cmd == bp.CMD_TRAJECTORY_BATCH:
+            return 4 + count*bp.SETPOINT_SIZE + 4
+        if cmd == bp.CMD_TRAJECTORY_TIMED:
+            return 4 + count*bp.TIMED_SETPOINT_SIZE + 4
+        if cmd == bp.CMD_TRAJECTORY_COMPACT and count > 0 and self._rx[4] in (2, 3):
+            return 13 + (count-1)*2*self._rx[4] + (count+7)//8 + 4
+        return None
+
+    def _parse(self):
+        while len(self._rx) >= 3:
+            if self._rx[0] != bp.START_BYTE_1 or self._rx[1] != bp.START_BYTE_2:
+                del self._rx[0]
+                self.stats['resync_bytes'] += 1
+                continue
+            size = self._frame_size()
+            if size is None:
+                del self._rx[0]
+                self.stats['resync_bytes'] += 1
+                continue
+            if size == 0 or len(self._rx) < size:
+                return
+            frame = bytes(self._rx[:size])
+            if struct.unpack_from('<I', frame, size-4)[0] != bp.calculate_crc32(frame[2:size-4]):
+                del self._rx[0]
+                self.stats['crc_errors'] += 1
+                continue
+            del self._rx[:size]
+            self._execute(frame)
+
+    def _execute(self, frame: bytes):
+        match frame[2]:
+            case bp.CMD_TRAJECTORY:
+                (q0, q1, _, _, _, _, pen_up) = struct.unpack_from('<ffffffB', frame, 3)
+                self._enqueue([(q0, q1, bool(pen_up))])
+            case bp.CMD_TRAJECTORY_BATCH:
+                setpoints = struct.iter_unpack('<ffffffB', frame[4:-4])
+                self._enqueue([(q0, q1, bool(pen_up)) for (q0, q1, _, _, _, _, pen_up) in setpoints])
+            case bp.CMD_TRAJECTORY_COMPACT:
+                (q0s, q1s, pen_ups) = bp.decode_trajectory_compact(frame)
+                self._enqueue(list(zip(q0s.tolist(), q1s.tolist(), (pen_ups != 0).tolist())))
+            case bp.CMD_TRAJECTORY_TIMED:
+                points = []
+                (q0, q1) = self.target[:2] if self.queue else self.q[:2]
+                for (t0, t1, ticks, pen_up) in bp.decode_trajectory_timed(frame).tolist():
+                    points += [(q0 + (t0-q0)*k/ticks, q1 + (t1-q1)*k/ticks, bool(pen_up)) for k in range(1, ticks+1)]
+                    (q0, q1) = (t0, t1)
+                self._enqueue(points)
+            case bp.CMD_POS:
+                self._send(bp.encode_position_feedback(*self.q[:2]))
+            case bp.CMD_CAPS:
+                self._send(bp.encode_caps_feedback(self.capabilities))
+            case bp.CMD_STOP:
+                self.queue.clear()
+            case bp.CMD_HOMING:
+                self.queue.clear()
+                self.q = (0.0, 0.0, True)
+
+    def _enqueue(self, points: list):
+        self.stats['points'] += len(points)
+        room = self.buffer_size - len(self.queue)
+        self.queue.extend(points[:room])
+        if points[:room]:
+            self.target = points[:room][-1]
+        self.stats['overflow'] += max(0, len(points) - room)
+        self.stats['max_level'] = max(self.stats['max_level'], len(self.queue))
+
+    # --- Feedback ---
+
+    def _send(self, frame: bytes):
+        if self.random.random() < self.drop_rate:
+            self.stats['dropped'] += 1
+            return
+        if self.random.random() < self.corrupt_rate:
+            frame = bytearray(frame)
+            frame[self.random.randrange(2, len(frame))] ^= 1 << self.random.randrange(8)
+            self.stats['corrupted'] += 1
+        if self.latency > 0:
+            self._tx_seq += 1
+            heapq.heappush(self._tx_pending, (time.monotonic() + self.latency, self._tx_seq, bytes(frame)))
+        else:
+            self._write(frame)
+
+    def _write(self, frame: bytes):
+        try:
+            os.write(self.master, frame)
+            self.stats['frames_sent'] += 1
+        except (BlockingIOError, OSError):
+            self.stats['dropped'] += 1
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Virtual planar arm firmware on a pseudo-terminal")
+    parser.add_argument('--Tc', type=float, default=0.01)
+    parser.add_argument('--buffer', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--drop', type=float, default=0.0)
+    parser.add_argument('--corrupt', type=float, default=0.0)
+    args = parser.parse_args()
+
+    fw = VirtualFirmware(Tc=args.Tc, buffer_size=args.buffer, latency=args.latency,
+                         drop_rate=args.drop, corrupt_rate=args.corrupt)
+    print(f"Virtual firmware listening on {fw.start()} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    fw.stop()
+    print(fw.stats)
@@ -0,0 +1,99 @@
+"""
+Incremental parser for the feedback frames sent by the firmware.
+Bytes are read straight into a preallocated ring buffer and complete frames are
+returned as memoryviews over it, so the monitor loop does not allocate per byte or per packet.
+"""
+
+import struct
+from lib import binary_protocol as bp
+
+# Total size (header + type + payload + CRC) of every response the firmware sends
+FRAME_SIZES = {
+    bp.RESP_POS: 15,
+    bp.RESP_STATUS: 8,
+    bp.RESP_CAPS: 8,
+}
+MAX_FRAME_SIZE = max(FRAME_SIZES.values())
+
+class FrameParser:
+    def __init__(self, capacity: int = 4096):
+        if capacity & (capacity-1) or capacity < 2*MAX_FRAME_SIZE:
+            raise ValueError("capacity must be a power of 2 of at least two frames")
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._mask = capacity-1
+        self._scratch = memoryview(bytearray(MAX_FRAME_SIZE)) # frames wrapping around the end of the ring
+        self._head = 0 # read counter (index = counter & mask)
+        self._tail = 0 # write counter
+        # Statistics
+        self.frames = 0
+        self.crc_errors = 0
+        self.resync_bytes = 0 # bytes dropped while looking for a valid header
+
+    def available(self) -> int:
+        """Bytes received but not parsed yet"""
+        return self._tail - self._head
+
+    def writable(self) -> memoryview:
+        """Contiguous free region of the ring, to be filled (e.g. by serial readinto) and then commit()ed"""
+        start = self._tail & self._mask
+        size = min(len(self._buf) - self.available(), len(self._buf) - start)
+        return self._view[start:start+size]
+
+    def commit(self, n: int):
+        """Marks n bytes of the region returned by writable() as received"""
+        self._tail += n
+
+    def feed(self, data: bytes):
+        """Copies data into the ring (the serial path uses writable/commit instead)"""
+        data = memoryview(data)
+        while len(data):
+            region = self.writable()
+            if not len(region):
+                raise BufferError("Frame parser buffer full")
+            n = min(len(region), len(data))
+            region[:n] = data[:n]
+            self.commit(n)
+            data = data[n:]
+
+    def _at(self, offset: int) -> int:
+        return self._buf[(self._head + offset) & self._mask]
+
+    def _frame(self, size: int) -> memoryview:
+        start = self._head & self._mask
+        if start + size <= len(self._buf):
+            return self._view[start:start+size]
+        first = len(self._buf) - start
+        self._scratch[:first] = self._view[start:]
+        self._scratch[first:size] = self._view[:size-first]
+        return self._scratch[:size]
+
+    def frames_ready(self):
+        """
+        Yields every complete frame with a valid CRC as a memoryview.
+        The view is only valid until the next write into the ring: use it before reading again.
+        """
+        while self.available() >= 3:
+            if self._at(0) != bp.START_BYTE_1 or self._at(1) != bp.START_BYTE_2:
+                self._head += 1
+                self.resync_bytes += 1
+                continue
+            size = FRAME_SIZES.get(self._at(2))
+            if size is None:
+                # Unknown response type: not a real header, look for the next one
+                self._head += 1
+                self.resync_bytes += 1
+                continue
+            if self.available() < size:
+                break # wait for the rest of the frame
+            frame = self._frame(size)
+            if struct.unpack_from('<I', frame, size-4)[0] != bp.calculate_crc32(frame[2:size-4]):
+                self.crc_errors += 1
+                self._head += 1 # the header may have been a payload byte: resync from the next one
+                continue
+            self._head += size
+            self.frames += 1
+            yield frame
+
+    def stats(self) -> dict:
+        return {'frames': self.frames, 'crc_errors': self.crc_errors, 'resync_bytes': self.resync_bytes}
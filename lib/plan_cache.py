@@ -0,0 +1,115 @@
+"""
+Content-addressed disk cache of planned trajectories.
+A job is identified by the SHA-256 of its patches and of everything the planning depends on (settings, sizes,
+planner sources), so an identical job always maps to the same file and a changed setting never hits a stale plan.
+Entries are the structured arrays of lib/trajectory.py saved as .npy files (loaded back with one read).
+The directory is bounded in size: the least recently used entries (file mtime, refreshed on every hit)
+are evicted first.
+"""
+
+import os
+import json
+import hashlib
+import inspect
+import tempfile
+import numpy as np
+
+from lib.trajectory import Trajectory, DTYPE
+
+def fingerprint(value) -> str:
+    """Stable text form of a settings value: functions are identified by their source code"""
+    if callable(value):
+        try:
+            return inspect.getsource(value).strip()
+        except (OSError, TypeError):
+            return value.__code__.co_code.hex()
+    if isinstance(value, dict):
+        return '{' + ','.join(f"{k!r}:{fingerprint(value[k])}" for k in sorted(value)) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(fingerprint(v) for v in value) + ']'
+    return repr(value)
+
+def job_key(patches: list, *context) -> str:
+    """Hex digest of the patches (as sent by the GUI) and of the planning context"""
+    h = hashlib.sha256(json.dumps(patches, sort_keys=True, separators=(',', ':')).encode())
+    for value in context:
+        h.update(b'\0' + fingerprint(value).encode())
+    return h.hexdigest()
+
+class PlanCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key: str, Tc: float) -> Trajectory:
+        """Cached trajectory of the job, or None"""
+        path = self._path(key)
+        try:
+            data = np.load(path, allow_pickle=False)
+            os.utime(path) # most recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if data.dtype != DTYPE:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Trajectory.from_data(data, Tc)
+
+    def put(self, key: str, trj: Trajectory):
+        """Stores the trajectory (atomically: readers never see a partial file), then enforces the size bound"""
+        os.makedirs(self.directory, exist_ok=True)
+        (fd, tmp) = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, trj.data, allow_pickle=False)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"Plan cache: cannot store {key[:12]}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.evict()
+
+    def record(self, key: str, chunks, Tc: float, capacity: int = 0):
+        """
+        Forwards the planned chunks (q, dq, ddq, ...) and stores the whole job once they are all consumed
+        (collected in a Trajectory allocated for `capacity` samples)
+        """
+        trj = Trajectory(Tc, capacity)
+        for chunk in chunks:
+            trj.append(*chunk[:3])
+            yield chunk
+        if len(trj):
+            self.put(key, trj)
+
+    def entries(self) -> list:
+        """(mtime, size, path) of the cached plans, least recently used first"""
+        entries = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.npy'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, path) in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for (_, _, path) in self.entries():
+            os.remove(path)
@@ -0,0 +1,87 @@
+"""
+Lightweight previews of planned trajectories for the frontend.
+The Cartesian path is decimated with Douglas-Peucker (every dropped point stays within `tolerance` of the
+kept polyline, pen changes are always kept) and shipped as packed little-endian Float32 triplets (x, y, pen)
+in a base64 string, so the browser gets a compact typed array instead of nested JSON lists.
+The preview of a job is built from its patch geometry (sample_patches), before anything is planned.
+"""
+
+import base64
+import numpy as np
+
+from lib import trajpy as tpy
+
+POINT_DTYPE = np.dtype('<f4')
+VALUES_PER_POINT = 3 # x, y, pen
+
+def douglas_peucker(x, y, tolerance: float) -> np.ndarray:
+    """Sorted indices of the points kept by Douglas-Peucker (first and last point included)"""
+    (x, y) = (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    n = len(x)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, n - 1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        (i, j) = stack.pop()
+        if j - i < 2:
+            continue
+        (px, py) = (x[i+1:j] - x[i], y[i+1:j] - y[i])
+        (dx, dy) = (x[j] - x[i], y[j] - y[i])
+        length2 = dx*dx + dy*dy
+        # distance from the segment (not the line), so back-and-forth strokes are kept
+        t = np.clip((px*dx + py*dy)/length2, 0.0, 1.0) if length2 > 0 else 0.0
+        d = np.hypot(px - t*dx, py - t*dy)
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack += [(i, k), (k, j)]
+    return np.flatnonzero(keep)
+
+def decimate(x, y, pen, tolerance: float) -> np.ndarray:
+    """Indices of the preview points: Douglas-Peucker on every run of constant pen state"""
+    pen = np.asarray(pen) != 0
+    bounds = np.concatenate(([0], np.flatnonzero(pen[1:] != pen[:-1]) + 1, [len(pen)]))
+    indices = [a + douglas_peucker(x[a:b], y[a:b], tolerance) for (a, b) in zip(bounds[:-1], bounds[1:])]
+    return np.concatenate(indices) if indices else np.empty(0, dtype=int)
+
+def sample_patches(patches: list, tolerance: float) -> tuple:
+    """
+    (x, y, pen) polyline of the patches, straight from their geometry: lines by their end points, arcs by chords
+    within `tolerance` of the arc. A patch that does not continue the previous one starts with a pen up point.
+    """
+    (xs, ys, pens) = ([], [], [])
+    last = None # end point of the previous pen-down patch
+    for patch in patches:
+        geometry = tpy.patch_geometry(patch)
+        (radius, angle) = geometry[3:5]
+        if patch['type'] == 'circle' and radius > tolerance:
+            n = max(int(np.ceil(abs(angle)/(2*np.arccos(1 - tolerance/radius)))), 1)
+        else:
+            n = 1
+        p = tpy.path_points('circle' if patch['type'] == 'circle' else 'line', geometry, np.linspace(0.0, 1.0, n + 1))[0]
+        penup = bool(patch['data'].get('penup', False))
+        pen = np.full(n + 1, penup)
+        if penup or last is None or not np.allclose(p[:, 0], last):
+            pen[0] = True
+        else:
+            (p, pen) = (p[:, 1:], pen[1:]) # the junction is the end point of the previous patch
+        last = None if penup else p[:, -1]
+        xs.append(p[0])
+        ys.append(p[1])
+        pens.append(pen)
+    if not xs:
+        return (np.empty(0), np.empty(0), np.empty(0, dtype=bool))
+    return (np.concatenate(xs), np.concatenate(ys), np.concatenate(pens))
+
+def pack(x, y, pen) -> str:
+    """Base64 of the interleaved Float32 (x, y, pen) triplets"""
+    data = np.empty((len(x), VALUES_PER_POINT), dtype=POINT_DTYPE)
+    (data[:, 0], data[:, 1], data[:, 2]) = (x, y, np.asarray(pen) != 0)
+    return base64.b64encode(data.tobytes()).decode('ascii')
+
+def unpack(payload: str) -> np.ndarray:
+    """Nx3 array of the (x, y, pen) triplets of a packed preview"""
+    return np.frombuffer(base64.b64decode(payload), dtype=POINT_DTYPE).reshape(-1, VALUES_PER_POINT)
@@ -0,0 +1,50 @@
+"""
+Fixed-capacity ring recorder for telemetry samples.
+Every field is a preallocated float64 NumPy column: recording a sample writes one slot per field and
+advances a counter, so the producer never allocates and memory stays bounded however long the shift is
+(the oldest samples are overwritten). There is one producer and no lock: readers take snapshots that
+re-read the counter after copying and drop the slots the producer may have overwritten meanwhile.
+"""
+
+import numpy as np
+
+class RingRecorder:
+    def __init__(self, fields: tuple, capacity: int):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        # One spare slot: the sample being written never overwrites one of the last `capacity` samples
+        self._slots = capacity + 1
+        self._columns = [np.zeros(self._slots) for _ in self.fields]
+        self._count = 0 # samples ever recorded (the slot of sample k is k % (capacity + 1))
+
+    def record(self, *values):
+        """Producer side: one value per field, in the order of `fields`"""
+        slot = self._count % self._slots
+        for (column, value) in zip(self._columns, values):
+            column[slot] = value
+        self._count += 1 # published only once the slot is complete
+
+    def clear(self):
+        """Producer side (or while nothing is recorded): forgets every sample, keeps the memory"""
+        self._count = 0
+
+    @property
+    def dropped(self) -> int:
+        """Samples overwritten since the last clear"""
+        return max(self._count - self.capacity, 0)
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def snapshot(self) -> dict:
+        """Consistent copy of the recorded samples, oldest first: {field: ndarray}"""
+        end = self._count
+        start = max(end - self.capacity, 0)
+        order = np.arange(start, end) % self._slots
+        data = [column[order] for column in self._columns]
+        # Slots rewritten by the producer while copying (the sample being written included) belong to newer samples
+        overwritten = max(self._count + 1 - self._slots - start, 0)
+        return {field: column[overwritten:] for (field, column) in zip(self.fields, data)}
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        return self.snapshot()[field]
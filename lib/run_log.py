@@ -0,0 +1,177 @@
+"""
+Append-only binary run logs: one file per execution, desired setpoints and actual feedback interleaved
+as fixed-size records, so a run is opened back as a memory-mapped NumPy structured array (no parsing,
+no copy) and thousands of runs can be scanned without loading them.
+
+File layout (little-endian):
+    [0:8)    magic b'RUNLOG1\\0'
+    [8:16)   uint64 number of complete records (updated after every write: a crashed run stays readable)
+    [16:256) JSON metadata (record fields, Tc, start time, ...), space padded
+    [256:)   records of RECORD_DTYPE
+The writer maps GROW_RECORDS records ahead (doubling when full) and truncates the file to its records on close.
+
+    python -m lib.run_log export runs/run_20260101_120000.bin --csv run.csv
+"""
+
+import os
+import json
+import mmap
+import struct
+import threading
+import numpy as np
+from datetime import datetime
+
+MAGIC = b'RUNLOG1\0'
+HEADER_SIZE = 256
+GROW_RECORDS = 1 << 16
+
+DESIRED = 0 # setpoint sent to the firmware (t: planned time)
+ACTUAL = 1 # position reported by the firmware / simulation (t: time since the start of the run)
+
+RECORD_DTYPE = np.dtype([('t', '<f8'), ('source', 'u1'), ('pen', 'u1'), ('q0', '<f8'), ('q1', '<f8')])
+
+class RunLogWriter:
+    """Appends records to a new run file. Thread-safe: setpoints and feedback come from different threads."""
+    def __init__(self, path: str, meta: dict = None):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        meta = {'fields': RECORD_DTYPE.names, 'created': datetime.now().isoformat(), **(meta or {})}
+        header = json.dumps(meta).encode()
+        if len(header) > HEADER_SIZE - 16:
+            raise ValueError("Run log metadata too large")
+        self._file = open(path, 'w+b')
+        self._file.write(MAGIC + struct.pack('<Q', 0) + header.ljust(HEADER_SIZE - 16))
+        self._map = None
+        self._records = None
+        self._grow(GROW_RECORDS)
+
+    def _grow(self, capacity: int):
+        if self._map is not None:
+            self._records = None
+            self._map.close()
+        self._file.truncate(HEADER_SIZE + capacity*RECORD_DTYPE.itemsize)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._records = np.frombuffer(self._map, dtype=RECORD_DTYPE, count=capacity, offset=HEADER_SIZE)
+
+    def _reserve(self, n: int):
+        if self.count + n > len(self._records):
+            self._grow(max(2*len(self._records), self.count + n))
+
+    def _commit(self, n: int):
+        # the count is published after the records: readers never see a partial one
+        self.count += n
+        struct.pack_into('<Q', self._map, 8, self.count)
+
+    def append(self, t: float, source: int, q0: float, q1: float, pen: bool = False):
+        """One record (feedback samples)"""
+        with self._lock:
+            if self._map is None:
+                return
+            self._reserve(1)
+            self._records[self.count] = (t, source, pen, q0, q1)
+            self._commit(1)
+
+    def extend(self, t, source: int, q0, q1, pen):
+        """A block of records with the same source (planned chunks)"""
+        with self._lock:
+            if self._map is None:
+                return
+            self._reserve(len(q0))
+            records = self._records[self.count:self.count + len(q0)]
+            (records['t'], records['source'], records['pen']) = (t, source, np.asarray(pen) != 0)
+            (records['q0'], records['q1']) = (q0, q1)
+            del records
+            self._commit(len(q0))
+
+    def close(self):
+        with self._lock:
+            if self._map is None:
+                return
+            self._records = None
+            self._map.close()
+            self._map = None
+            self._file.truncate(HEADER_SIZE + self.count*RECORD_DTYPE.itemsize)
+            self._file.close()
+
+def new_run(directory: str, meta: dict = None) -> RunLogWriter:
+    """Writer of a new run file named after the current time"""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return RunLogWriter(os.path.join(directory, f"run_{stamp}.bin"), meta)
+
+# --- Reading ---
+
+def read_meta(path: str) -> dict:
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if header[:8] != MAGIC:
+        raise ValueError(f"{path} is not a run log")
+    meta = json.loads(header[16:].decode())
+    meta['records'] = struct.unpack('<Q', header[8:16])[0]
+    return meta
+
+def open_run(path: str) -> tuple:
+    """(metadata, records): records is a read-only memory map of RECORD_DTYPE (columns: records['q0'], ...)"""
+    meta = read_meta(path)
+    available = (os.path.getsize(path) - HEADER_SIZE)//RECORD_DTYPE.itemsize
+    count = min(meta['records'], available)
+    if count == 0:
+        return (meta, np.empty(0, dtype=RECORD_DTYPE))
+    return (meta, np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,)))
+
+def list_runs(directory: str) -> list:
+    """Run files of a directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('run_') and name.endswith('.bin'))
+
+def export_csv(path: str, out: str, chunk: int = GROW_RECORDS):
+    """Writes the records as CSV, one chunk at a time (the run is never loaded whole)"""
+    (_, records) = open_run(path)
+    with open(out, 'w') as f:
+        f.write(','.join(RECORD_DTYPE.names) + '\n')
+        for k in range(0, len(records), chunk):
+            block = records[k:k + chunk]
+            np.savetxt(f, np.column_stack([block[name] for name in RECORD_DTYPE.names]),
+                       fmt=['%.6f', '%d', '%d', '%.9g', '%.9g'], delimiter=',')
+
+def export_parquet(path: str, out: str, chunk: int = GROW_RECORDS):
+    """Writes the records as a Parquet file (requires pyarrow), one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+    (meta, records) = open_run(path)
+    schema = pa.schema([(name, pa.from_numpy_dtype(RECORD_DTYPE[name])) for name in RECORD_DTYPE.names],
+                       metadata={'run_log': json.dumps(meta)})
+    with pq.ParquetWriter(out, schema) as writer:
+        for k in range(0, len(records), chunk):
+            block = records[k:k + chunk]
+            writer.write_table(pa.table({name: np.ascontiguousarray(block[name]) for name in RECORD_DTYPE.names},
+                                        schema=schema))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run log export")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ls = sub.add_parser('list', help="list the runs of a directory")
+    ls.add_argument('directory')
+    export = sub.add_parser('export', help="export a run to CSV and/or Parquet")
+    export.add_argument('run')
+    export.add_argument('--csv')
+    export.add_argument('--parquet')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for path in list_runs(args.directory):
+            meta = read_meta(path)
+            print(f"{os.path.basename(path)}: {meta['records']} records, {meta.get('mode', '?')}")
+    else:
+        if args.csv:
+            export_csv(args.run, args.csv)
+        if args.parquet:
+            export_parquet(args.run, args.parquet)
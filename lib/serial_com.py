@@ -1,9 +1,221 @@
 import serial
 import time
+import os
+import asyncio
+import threading
 import serial.tools.list_ports
 from lib import binary_protocol as bp
 
 ser = None # serial object
+transport = None # AsyncSerialTransport, once started it owns all reads and writes of `ser`
+
+class AsyncSerialTransport:
+    """
+    Event driven serial I/O: one asyncio loop (in its own thread) schedules reads, writes and timers.
+    - reads wake up on data (add_reader on the port file descriptor) and go straight into the frame parser;
+    - writes can be queued from any thread and are flushed without blocking (add_writer on partial writes);
+    - timers (call_every) replace the sleeps of the old polling threads;
+    - coroutines (submit) can await feedback frames (wait_frame) instead of polling.
+    Ports without a selectable file descriptor (Windows) are polled from a timer instead.
+    """
+    POLL_INTERVAL = 0.005 # s, only used when the port cannot be selected
+
+    def __init__(self, parser, on_frame):
+        self.parser = parser # lib.frame_parser.FrameParser
+        self.on_frame = on_frame # called on the loop thread for every complete frame
+        self.ser = None
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self._fd = None
+        self._poll_handle = None
+        self._out = bytearray()
+        self._frame_event = None
+
+    # --- Loop management ---
+
+    def start(self):
+        ready = threading.Event()
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self._frame_event = asyncio.Event()
+            ready.set()
+            self.loop.run_forever()
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def stop(self):
+        if self.thread is None: return
+        self._call(self._detach)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.thread = None
+
+    def in_loop(self) -> bool:
+        return self.thread is not None and threading.current_thread() is self.thread
+
+    def _call(self, fn, *args):
+        """Runs fn on the loop thread and returns its result (waits for it when called from another thread)"""
+        if self.thread is None or self.in_loop():
+            return fn(*args)
+        async def call():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(call(), self.loop).result()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the loop, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_every(self, interval: float, fn):
+        """Calls fn on the loop thread every interval seconds"""
+        def tick():
+            try:
+                fn()
+            except Exception as e:
+                print(f"Transport Timer Error: {e}")
+            self.loop.call_later(interval, tick)
+        self.loop.call_soon_threadsafe(tick)
+
+    # --- Port ---
+
+    def attach(self, port):
+        self._call(self._attach, port)
+
+    def detach(self):
+        self._call(self._detach)
+
+    def is_attached(self) -> bool:
+        return self.ser is not None
+
+    def _attach(self, port):
+        self._detach()
+        self.ser = port
+        try:
+            self._fd = port.fileno()
+            self.loop.add_reader(self._fd, self._on_readable)
+        except (AttributeError, NotImplementedError, ValueError, OSError):
+            self._fd = None
+            self._poll_handle = self.loop.call_later(self.POLL_INTERVAL, self._poll)
+
+    def _detach(self):
+        if self._fd is not None:
+            self.loop.remove_reader(self._fd)
+            self.loop.remove_writer(self._fd)
+        if self._poll_handle is not None:
+            self._poll_handle.cancel()
+        self.ser = None
+        self._fd = None
+        self._poll_handle = None
+        self._out.clear()
+
+    # --- Reads ---
+
+    def _on_readable(self):
+        first = True
+        while True:
+            try:
+                n = os.readv(self._fd, [self.parser.writable()])
+            except BlockingIOError:
+                break
+            except OSError as e:
+                print(f"Serial Data Read Error: {e}")
+                self._detach()
+                return
+            if n == 0:
+                # Serial ports are opened with VMIN=0: an empty read means drained,
+                # unless the port was reported readable and had nothing (device gone, as pyserial does)
+                if first:
+                    print("Serial port closed by the device")
+                    self._detach()
+                    return
+                break
+            first = False
+            self.parser.commit(n)
+            self._dispatch()
+
+    def _poll(self):
+        try:
+            while self.ser is not None:
+                n = min(self.ser.in_waiting, len(self.parser.writable()))
+                if n == 0: break
+                self.parser.commit(self.ser.readinto(self.parser.writable()[:n]))
+                self._dispatch()
+        except Exception as e:
+            print(f"Serial Data Read Error: {e}")
+        if self.ser is not None:
+            self._poll_handle = self.loop.call_later(self.POLL_INTERVAL, self._poll)
+
+    def _dispatch(self):
+        received = False
+        for frame in self.parser.frames_ready():
+            received = True
+            try:
+                self.on_frame(frame)
+            except Exception as e:
+                print(f"Serial Monitor Error: {e}")
+        if received:
+            # wake up every coroutine waiting for feedback
+            self._frame_event.set()
+            self._frame_event = asyncio.Event()
+
+    async def wait_frame(self, timeout: float) -> bool:
+        """Waits (on the loop) for the next feedback frame, False on timeout"""
+        try:
+            await asyncio.wait_for(self._frame_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # --- Writes ---
+
+    def write(self, data: bytes) -> bool:
+        """Thread-safe, non-blocking write (data is queued and flushed by the loop)"""
+        if self.ser is None: return False
+        if self.in_loop():
+            self._write(bytes(data))
+        else:
+            self.loop.call_soon_threadsafe(self._write, bytes(data))
+        return True
+
+    def _write(self, data: bytes):
+        if self.ser is None: return
+        if self._fd is None:
+            try:
+                self.ser.write(data)
+            except Exception as e:
+                print(f"Serial Write Error: {e}")
+            return
+        self._out += data
+        self._flush()
+
+    def _flush(self):
+        try:
+            n = os.write(self._fd, self._out)
+        except BlockingIOError:
+            n = 0
+        except OSError as e:
+            print(f"Serial Write Error: {e}")
+            self._detach()
+            return
+        del self._out[:n]
+        if self._out:
+            self.loop.add_writer(self._fd, self._flush)
+        else:
+            self.loop.remove_writer(self._fd)
+
+def start_transport(parser, on_frame) -> AsyncSerialTransport:
+    """Starts the event driven transport, from now on write_data goes through it while a port is attached"""
+    global transport
+    transport = AsyncSerialTransport(parser, on_frame)
+    transport.start()
+    return transport
+
+def stop_transport():
+    global transport
+    if transport is not None:
+        transport.stop()
+    transport = None
 
 def verify_connection(s):
     """Helper to verify connection by sending a handshake."""
@@ -65,10 +277,13 @@ def ser_init(serial_path:str = None) -> bool:
             temp_ser = serial.Serial(port, 115200, timeout=0.1, write_timeout=0.5) 
             
             # Auto-Reset DTR logic (Standard for Arduinos/STM32)
-            temp_ser.dtr = False
-            time.sleep(0.1)
-            temp_ser.dtr = True
-            time.sleep(1.0) # Wait for reboot
+            try:
+                temp_ser.dtr = False
+                time.sleep(0.1)
+                temp_ser.dtr = True
+                time.sleep(1.0) # Wait for reboot
+            except OSError:
+                pass # no modem lines (virtual ports, e.g. lib/firmware_sim.py)
             
             if verify_connection(temp_ser):
                 ser = temp_ser
@@ -101,6 +316,8 @@ def write_data(data: bytes) -> bool:
     """Write raw binary data"""
     global ser
     if ser is None: return False
+    if transport is not None and transport.is_attached():
+        return transport.write(data)
     try:
         ser.write(data)
         return True
@@ -137,6 +354,8 @@ def get_waiting_in_buffer() -> int:
 
 def serial_close():
     global ser
+    if transport is not None:
+        transport.detach()
     if ser is not None:
         try:
             ser.flush()
@@ -0,0 +1,110 @@
+"""
+Columnar container for sampled joint trajectories.
+Every sample is one record of a structured NumPy array (t, q0, q1, dq0, dq1, ddq0, ddq1, pen):
+positions and time in float64, derivatives in float32 (the precision of the wire format), 41 bytes per sample
+instead of seven boxed Python floats. Chunks are appended into a buffer that grows geometrically,
+so stitching a whole job is linear in its length, and slices are views sharing the same memory.
+The (q, dq, ddq) properties are tuples of column views, as expected by the planner and the plotting code.
+"""
+
+import numpy as np
+
+DTYPE = np.dtype([('t', '<f8'), ('q0', '<f8'), ('q1', '<f8'),
+                  ('dq0', '<f4'), ('dq1', '<f4'), ('ddq0', '<f4'), ('ddq1', '<f4'), ('pen', '?')])
+
+class Trajectory:
+    def __init__(self, Tc: float, capacity: int = 0, t0: float = 0.0):
+        self.Tc = Tc
+        self.t0 = t0
+        self._buffer = np.empty(capacity, dtype=DTYPE)
+        self._size = 0
+
+    @classmethod
+    def from_arrays(cls, q, dq, ddq, Tc: float, t0: float = 0.0) -> 'Trajectory':
+        """Trajectory of one chunk: q = (q0s, q1s, penups), dq = (dq0s, dq1s), ddq = (ddq0s, ddq1s)"""
+        trj = cls(Tc, len(q[0]), t0)
+        trj.append(q, dq, ddq)
+        return trj
+
+    @classmethod
+    def from_chunks(cls, chunks, Tc: float, capacity: int, t0: float = 0.0) -> 'Trajectory':
+        """
+        Stitches planned chunks (q, dq, ddq, ...) while they are produced: the buffer is allocated once for
+        `capacity` samples (the per-patch sample counts, see planner.sample_counts) and every chunk is written
+        in place as it arrives; it only grows if the count was short.
+        """
+        trj = cls(Tc, capacity, t0)
+        for chunk in chunks:
+            trj.append(*chunk[:3])
+        return trj
+
+    @classmethod
+    def from_data(cls, data: np.ndarray, Tc: float, t0: float = 0.0) -> 'Trajectory':
+        """Trajectory on an existing structured array of DTYPE (no copy)"""
+        trj = cls(Tc, 0, t0)
+        (trj._buffer, trj._size) = (data, len(data))
+        return trj
+
+    def reserve(self, capacity: int):
+        """Grows the buffer to hold at least `capacity` samples (existing views keep the old buffer)"""
+        if capacity > len(self._buffer):
+            buffer = np.empty(max(capacity, 2*len(self._buffer)), dtype=DTYPE)
+            buffer[:self._size] = self._buffer[:self._size]
+            self._buffer = buffer
+
+    def append(self, q, dq=None, ddq=None):
+        """
+        Appends a chunk of samples after the last one, one control period apart.
+        Missing derivatives are stored as zeros.
+        """
+        n = len(q[0])
+        self.reserve(self._size + n)
+        chunk = self._buffer[self._size:self._size + n]
+        chunk['t'] = self.t0 + self.Tc*np.arange(self._size, self._size + n)
+        (chunk['q0'], chunk['q1'], chunk['pen']) = (q[0], q[1], np.asarray(q[2]) != 0)
+        for (name, x) in (('dq', dq), ('ddq', ddq)):
+            (chunk[name + '0'], chunk[name + '1']) = (x[0], x[1]) if x is not None else (0.0, 0.0)
+        self._size += n
+
+    @property
+    def data(self) -> np.ndarray:
+        """Structured array of the samples (a view: no copy)"""
+        return self._buffer[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def q(self) -> tuple:
+        data = self.data
+        return (data['q0'], data['q1'], data['pen'])
+
+    @property
+    def dq(self) -> tuple:
+        data = self.data
+        return (data['dq0'], data['dq1'])
+
+    @property
+    def ddq(self) -> tuple:
+        data = self.data
+        return (data['ddq0'], data['ddq1'])
+
+    @property
+    def duration(self) -> float:
+        return self._size*self.Tc
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        """Slices are Trajectory views on the same memory, integers give one record"""
+        if isinstance(index, slice):
+            (start, _, step) = index.indices(self._size)
+            return Trajectory.from_data(self.data[index], self.Tc*step, self.t0 + start*self.Tc)
+        return self.data[index]
+
+    def chunks(self, size: int):
+        """Consecutive views of at most `size` samples"""
+        for k in range(0, self._size, size):
+            yield self[k:k + size]
@@ -1,4 +1,4 @@
-from math import sqrt,atan2,cos,sin,pi,acos, copysign
+from math import sqrt,atan2,cos,sin,tan,pi,acos, copysign
 import numpy as np
 from typing import Callable
 
@@ -125,6 +125,27 @@ def rangef(start:float=0, step:float=1, end:float=0, consider_limit:bool = False
             i += step
     return r
 
+""" #@
+@name: arangef
+@brief: array version of rangef, returns the same values as a contiguous numpy array
+@notes: the values are accumulated one step at a time (like rangef does) so that the returned samples are bit-for-bit identical to the ones in the list returned by rangef
+@inputs: 
+- float start: the starting value of the range;
+- float step : the step size used to find the values withing the specified range;
+- float end: the final value of the range;
+- bool consider_limit: boolean that indicates whether the end value should be inserted in the returned array or not;
+@outputs: 
+- ndarray : 1D float array of all the values found in the specified range with the specified step size.
+@# """
+def arangef(start:float=0, step:float=1, end:float=0, consider_limit:bool = False) -> np.ndarray:
+    if step <= 0 or start >= end: return np.empty(0)
+    n = int((end-start)/step) + 2 # upper bound on the number of samples
+    steps = np.full(n, step, dtype=float)
+    steps[0] = start
+    r = np.add.accumulate(steps) # sequential sum, same rounding as rangef
+    side = 'right' if consider_limit else 'left'
+    return np.ascontiguousarray(r[:np.searchsorted(r, end, side=side)])
+
 """ #@
 @name: compose_spline3
 @brief: returns the trajectory that results from the composition of the cubic splines obtained for each couple of points in the specified path.
@@ -279,9 +300,10 @@ def compose_trapezoidal(q:list[float], ddqm:float = 1.05) -> list[tuple[list[fun
 def cycloidal(q:list[float], ddqm:float = 1.05, tf:float=None) -> tuple[list[function], float]: # return the function handles for q, dq and ddq
     if tf is None:
         tf = sqrt(2*pi*abs(q[1]-q[0])/ddqm)
-    qt = lambda t: q[0]+(q[1]-q[0])*(t/tf-sin(2*pi*t/tf)/(2*pi))
-    dqt = lambda t: (q[1]-q[0])*(1-cos(2*pi*t/tf))/tf # derivative of q
-    ddqt = lambda t: 2*pi*(q[1]-q[0])*sin(2*pi*t/tf)/(tf**2) # 2nd derivative of q
+    # np.sin/np.cos let the same handles be evaluated on scalars or on whole time vectors
+    qt = lambda t: q[0]+(q[1]-q[0])*(t/tf-np.sin(2*pi*t/tf)/(2*pi))
+    dqt = lambda t: (q[1]-q[0])*(1-np.cos(2*pi*t/tf))/tf # derivative of q
+    ddqt = lambda t: 2*pi*(q[1]-q[0])*np.sin(2*pi*t/tf)/(tf**2) # 2nd derivative of q
     return ([qt, dqt, ddqt], tf) # all of q and its derivatives are returned because they cannot be computed simply by using a different set of coefficients
 
 
@@ -354,6 +376,53 @@ def dk(q:np.ndarray, sizes:dict[float] = {'l1':0.170,'l2':0.158})->np.ndarray:
     theta = q[0]+q[1]
     return np.array([[x,y,theta]]).T
 
+""" #@
+@name: ik_batch
+@brief: inverse kinematics of a 2Dofs planar manipulator for N points at once
+@notes: same formulas used by ik when the orientation is not specified. Instead of returning None for the points that cannot be reached, 
+a boolean mask is returned alongside the joint values (the joint values of the unreachable points are set to nan).
+@inputs: 
+- ndarray x: array of x coordinates of the end effector;
+- ndarray y: array of y coordinates of the end effector;
+- dict[float] sizes: sizes of the two links that make up the manipulator, accessed via 'l1' and 'l2'; 
+@outputs: 
+- ndarray: 2xN numpy array containing the values of the joint coordinates (one column per point);
+- ndarray: boolean array of length N, True where the point is reachable.
+@# """
+def ik_batch(x:np.ndarray, y:np.ndarray, sizes:dict[float] = {'l1':0.170 ,'l2':0.158}) -> tuple[np.ndarray, np.ndarray]:
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    a1 = sizes['l1']
+    a2 = sizes['l2']
+    r2 = x**2+y**2
+    cos_q2 = (r2-a1**2-a2**2)/(2*a1*a2)
+    reachable = (r2 <= (a1+a2)**2) & (np.abs(cos_q2) <= 1)
+
+    q = np.empty((2, len(x)))
+    q[1] = np.arccos(np.where(reachable, cos_q2, np.nan))
+    q[0] = np.arctan2(y, x)-np.arctan2(a2*np.sin(q[1]), a1+a2*np.cos(q[1]))
+    return q, reachable
+
+""" #@
+@name: dk_batch
+@brief: direct kinematics of a 2Dofs planar manipulator for N joint configurations at once
+@inputs: 
+- ndarray q0: array of values of the first joint coordinate;
+- ndarray q1: array of values of the second joint coordinate;
+- dict[float] sizes: sizes of the two links that make up the manipulator, accessed via 'l1' and 'l2'; 
+@outputs: 
+- ndarray: 3xN numpy array containing the coordinates of the end effector (x, y and the rotation angle theta), one column per configuration.
+@# """
+def dk_batch(q0:np.ndarray, q1:np.ndarray, sizes:dict[float] = {'l1':0.170,'l2':0.158}) -> np.ndarray:
+    q0 = np.asarray(q0, dtype=float)
+    q1 = np.asarray(q1, dtype=float)
+    theta = q0+q1
+    x = np.empty((3, len(q0)))
+    x[0] = sizes['l1']*np.cos(q0)+sizes['l2']*np.cos(theta)
+    x[1] = sizes['l1']*np.sin(q0)+sizes['l2']*np.sin(theta)
+    x[2] = theta
+    return x
+
 """
 #@
 @name: Point (class)
@@ -506,6 +575,28 @@ a timing law s(t) specified by the user
 @#
 """
 def slice_trj(patch: dict, **kargs):
+    (q0s, q1s, penups, ts) = slice_trj_batch(patch, **kargs)
+    return q0s.tolist(), q1s.tolist(), penups.tolist(), ts.tolist()
+
+
+"""
+#@
+@name: slice_trj_batch
+@brief: array version of slice_trj
+@notes: the timing law is sampled, the line/arc is interpolated and the inverse kinematics is solved on the whole time vector at once, 
+without building a Point per sample. The returned values are the same ones returned (as lists) by slice_trj, which is a thin wrapper around this function.
+The timing laws passed via kargs must accept a numpy array as time argument (the cycloidal handles do).
+@inputs: 
+- dict patch: trajectory patch (same structure used by slice_trj);
+- **kargs: same keyword arguments used by slice_trj;
+@outputs: 
+- ndarray q0s: contiguous float array of values for the generalized coordinate q of the first motor;
+- ndarray q1s: contiguous float array of values for the generalized coordinate q of the second motor;
+- ndarray penups: integer array of values that show wether the pen should be up or down;
+- ndarray ts: contiguous float array of time instants;
+@#
+"""
+def slice_trj_batch(patch: dict, **kargs):
     # populate arguments with default values
     if 'max_acc' not in kargs:
         kargs['max_acc'] = 1.05
@@ -515,12 +606,102 @@ def slice_trj(patch: dict, **kargs):
         kargs['Tc'] = 1e-3
     if 'sizes' not in kargs:
         print('Using default sizes')
-    
-    q0s = []
-    q1s = []
-    penups = []
-    ts = []
+    (q, _, _, penups, ts) = _slice_patch(patch, kargs, False)
+    return q[0], q[1], penups, ts
 
+
+"""
+#@
+@name: slice_trj_analytic
+@brief: slices the trajectory patch like slice_trj_batch, returning the exact joint velocities and accelerations as well
+@notes: the derivatives are not estimated with finite differences: the timing law derivatives are mapped to the operational space 
+(dp = p'(s)*ds, ddp = p''(s)*ds^2 + p'(s)*dds) and then to the joint space with the inverse of the jacobian 
+(dq = J^-1*dp, ddq = J^-1*(ddp - dJ*dq)). Pen-up patches are cycloidal in the joint space, so the derivative handles of cycloidal are used directly.
+Samples that cannot be reached hold the last reachable position with zero velocity and acceleration. 
+On a singular configuration (q2 = 0 or pi) the derivatives are set to 0.
+@inputs: 
+- dict patch: trajectory patch (same structure used by slice_trj);
+- **kargs: same keyword arguments used by slice_trj, plus:
+    * 'line_d': derivatives of the line timing law, (t, tf) -> [ds(t), dds(t)];
+    * 'circle_d': derivatives of the circle timing law, (t, tf) -> [ds(t), dds(t)];
+@outputs: 
+- ndarray q: 2xN array of joint positions;
+- ndarray dq: 2xN array of joint velocities;
+- ndarray ddq: 2xN array of joint accelerations;
+- ndarray penups: integer array of values that show wether the pen should be up or down;
+- ndarray ts: contiguous float array of time instants;
+@#
+"""
+def slice_trj_analytic(patch: dict, **kargs):
+    if 'max_acc' not in kargs:
+        kargs['max_acc'] = 1.05
+    if 'line' not in kargs or 'circle' not in kargs:
+        raise Exception("No line or circle timing law was specified")
+    if 'line_d' not in kargs or 'circle_d' not in kargs:
+        raise Exception("No line or circle timing law derivatives were specified")
+    if 'Tc' not in kargs:
+        kargs['Tc'] = 1e-3
+    if 'sizes' not in kargs:
+        print('Using default sizes')
+    return _slice_patch(patch, kargs, True)
+
+
+SINGULAR_SIN = 1e-3 # |sin(q2)| below which the jacobian is treated as singular (the inverse grows as 1/sin(q2))
+
+def _singular(q: np.ndarray) -> np.ndarray:
+    """Configurations (columns of q) too close to a singularity for the differential inverse kinematics"""
+    with np.errstate(invalid='ignore'):
+        return np.abs(np.sin(q[1])) < SINGULAR_SIN
+
+""" #@
+@name: diff_ik_batch
+@brief: differential inverse kinematics of a 2Dofs planar manipulator for N points at once
+@notes: dq = J^-1*dp and ddq = J^-1*(ddp - dJ*dq), with J the jacobian of the position of the end effector. 
+Where the jacobian is singular or badly conditioned (|sin(q2)| < SINGULAR_SIN: the arm is almost stretched or folded) 
+velocities and accelerations are set to 0, like on the held samples of unreachable points.
+@inputs: 
+- ndarray q: 2xN array of joint positions (as returned by ik_batch);
+- ndarray dp: 2xN array of end effector velocities (x, y);
+- ndarray ddp: 2xN array of end effector accelerations (x, y);
+- dict[float] sizes: sizes of the two links that make up the manipulator, accessed via 'l1' and 'l2'; 
+@outputs: 
+- ndarray: 2xN array of joint velocities;
+- ndarray: 2xN array of joint accelerations.
+@# """
+def diff_ik_batch(q:np.ndarray, dp:np.ndarray, ddp:np.ndarray, sizes:dict[float] = {'l1':0.170 ,'l2':0.158}) -> tuple[np.ndarray, np.ndarray]:
+    a1 = sizes['l1']
+    a2 = sizes['l2']
+    (s1, c1) = (np.sin(q[0]), np.cos(q[0]))
+    (s12, c12) = (np.sin(q[0]+q[1]), np.cos(q[0]+q[1]))
+    singular = _singular(q)
+    det = np.where(singular, 1.0, a1*a2*np.sin(q[1]))
+
+    # J = [[-a1*s1-a2*s12, -a2*s12], [a1*c1+a2*c12, a2*c12]], inverted in closed form
+    def solve(vx, vy):
+        return np.where(singular, 0.0, np.array([
+            (a2*c12*vx + a2*s12*vy)/det,
+            (-(a1*c1+a2*c12)*vx - (a1*s1+a2*s12)*vy)/det
+        ]))
+
+    dq = solve(dp[0], dp[1])
+    w1 = dq[0]
+    w12 = dq[0]+dq[1]
+    # dJ*dq (centripetal terms)
+    bx = -a1*c1*w1**2 - a2*c12*w12**2
+    by = -a1*s1*w1**2 - a2*s12*w12**2
+    ddq = solve(ddp[0]-bx, ddp[1]-by)
+    return dq, ddq
+
+
+""" #@
+@name: patch_geometry
+@brief: geometry of a line or circle patch
+@inputs: 
+- dict patch: trajectory patch ('type', 'points' and, for circles, data['center']);
+@outputs: 
+- tuple: start point, end point, center (None for lines), radius (None for lines), signed angle of the arc (0 for lines) and length of the path.
+@# """
+def patch_geometry(patch: dict) -> tuple:
     # patch['points'] -> [[x0, y0], [x1, y1]]
     sp = Point(*patch['points'][0]) # starting point in operational space
     ep = Point(*patch['points'][1]) # ending point in operational space
@@ -538,59 +719,354 @@ def slice_trj(patch: dict, **kargs):
     # length = l if patch['type'] == 'line' else patch['data']['radius']*abs(angle) # LENGTH OF THE PATH
     # NOTE: changed for testing purposes -> change when real accelerations values are found
     length = l if patch['type'] == 'line' else abs(angle)*radius # LENGTH OF THE PATH
-    tf = sqrt(2*pi*length/kargs['max_acc']) # duration of the motion
+    return sp, ep, c, radius, angle, length
+
+""" #@
+@name: path_points
+@brief: points of a line or circle patch for the given fractions of its path
+@inputs: 
+- str patch_type: 'line' or 'circle';
+- tuple geometry: geometry of the patch (see patch_geometry);
+- ndarray s: fractions of the path, in [0, 1];
+@outputs: 
+- tuple: points p(s) and derivatives p'(s) and p''(s), 2xN arrays each.
+@# """
+def path_points(patch_type: str, geometry: tuple, s: np.ndarray) -> tuple:
+    (sp, ep, c, radius, angle, _) = geometry
+    if patch_type == 'line':
+        p = np.array([sp.x + (ep.x-sp.x)*s, sp.y + (ep.y-sp.y)*s])
+        p_s = np.empty_like(p)
+        p_s[0] = ep.x-sp.x
+        p_s[1] = ep.y-sp.y
+        return p, p_s, np.zeros_like(p)
+    phi = (sp-c).angle() + s*angle
+    (sin_phi, cos_phi) = (np.sin(phi), np.cos(phi))
+    p = np.array([c.x + radius*cos_phi, c.y + radius*sin_phi])
+    p_s = radius*angle*np.array([-sin_phi, cos_phi])
+    p_ss = -radius*angle**2*np.array([cos_phi, sin_phi])
+    return p, p_s, p_ss
+
+def _hold_unreachable(p, q, dq, ddq, ts, reachable):
+    """
+    Unreachable samples hold the last reachable position (pen up, at rest), the ones before the first reachable sample
+    are dropped (from ts too: every returned array has one entry per kept sample, ts keeps their original times)
+    """
+    penups = np.zeros(len(reachable), dtype=np.int8)
+    if reachable.all():
+        return np.ascontiguousarray(q), dq, ddq, penups, ts
+    bad = np.flatnonzero(~reachable)
+    print(f"Warning: {len(bad)} point(s) unreachable by robot, from ({p[0, bad[0]]:.3f}, {p[1, bad[0]]:.3f}) "
+          f"to ({p[0, bad[-1]]:.3f}, {p[1, bad[-1]]:.3f})")
+    idx = np.where(reachable, np.arange(len(reachable)), -1)
+    idx = np.maximum.accumulate(idx)
+    keep = idx >= 0
+    hold = ~reachable[keep]
+    q = q[:, idx[keep]]
+    if dq is not None:
+        dq = np.where(hold, 0.0, dq[:, idx[keep]])
+        ddq = np.where(hold, 0.0, ddq[:, idx[keep]])
+    return np.ascontiguousarray(q), dq, ddq, hold.astype(np.int8), ts[len(ts) - len(hold):]
+
+def _slice_penup(patch: dict, kargs: dict, tf: float, derivatives: bool):
+    """Pen-up patches: point-to-point cycloidal trajectory in the joint space"""
+    # patch['points'] -> [[x0, y0], [x1, y1]]
+    ik0 = ik(patch['points'][0][0], patch['points'][0][1], 1, None, kargs['sizes'])
+    ik1 = ik(patch['points'][1][0], patch['points'][1][1], 1, None, kargs['sizes'])
+    
+    if ik0 is None or ik1 is None:
+        print(f"Warning: Penup trajectory has unreachable point(s). Start: {patch['points'][0]}, End: {patch['points'][1]}")
+        return None  # skip this patch
+
+    (traj0, _) = cycloidal([ik0[0, 0], ik1[0, 0]], kargs['max_acc']*0.4, tf) # first motor
+    (traj1, _) = cycloidal([ik0[1, 0], ik1[1, 0]], kargs['max_acc']*0.4, tf) # second motor
+    ts = arangef(0, kargs['Tc'], tf)
+    # both motors share the duration tf, so no padding is needed at the end of the shorter one
+    q = np.array([traj0[0](ts), traj1[0](ts)])
+    penups = np.ones(len(ts), dtype=np.int8)
+    if not derivatives:
+        return q, None, None, penups, ts
+    dq = np.array([traj0[1](ts), traj1[1](ts)])
+    ddq = np.array([traj0[2](ts), traj1[2](ts)])
+    return q, dq, ddq, penups, ts
+
+def _empty_slice(derivatives: bool) -> tuple:
+    return (np.empty((2, 0)), np.empty((2, 0)) if derivatives else None, np.empty((2, 0)) if derivatives else None,
+            np.empty(0, dtype=np.int8), np.empty(0))
+
+def _slice_patch(patch: dict, kargs: dict, derivatives: bool):
+    """Shared implementation of slice_trj_batch and slice_trj_analytic (dq and ddq are None if not requested)"""
+    geometry = patch_geometry(patch)
+    tf = sqrt(2*pi*geometry[5]/kargs['max_acc']) # duration of the motion
 
-    points = [] # points (in operational space)
     if patch['data']['penup']:
         # if penup -> use a point-to-point trajectory (in this case: cycloidal)
-        # patch['points'] -> [[x0, y0], [x1, y1]]
-        ik0 = ik(patch['points'][0][0], patch['points'][0][1], 1, None, kargs['sizes'])
-        ik1 = ik(patch['points'][1][0], patch['points'][1][1], 1, None, kargs['sizes'])
-        
-        if ik0 is None or ik1 is None:
-            print(f"Warning: Penup trajectory has unreachable point(s). Start: {patch['points'][0]}, End: {patch['points'][1]}")
-            return [], [], [], []  # Return empty - skip this patch
-            
-        qt0 = list(ik0.T[0])
-        qt1 = list(ik1.T[0])
-        (traj0, dt0) = cycloidal([qt0[0], qt1[0]], kargs['max_acc']*0.4, tf) # first motor
-        (traj1, dt1) = cycloidal([qt0[1], qt1[1]], kargs['max_acc']*0.4, tf) # second motor
-        for t in rangef(0, kargs['Tc'], tf):
-            if t <= dt0 : q0s.append(traj0[0](t))
-            else: q0s.append(q0s[-1]) # if the trajectories don't have the same length
-            if t <= dt1 : q1s.append(traj1[0](t))
-            else: q1s.append(q1s[-1]) # if the trajectories don't have the same length
-            ts.append(t)
-            penups.append(1)
-        return q0s, q1s, penups, ts
+        sliced = _slice_penup(patch, kargs, tf, derivatives)
+        return _empty_slice(derivatives) if sliced is None else sliced
+
     # here penup=0 surely
-    if patch['type'] == 'line':
-        for t in rangef(0, kargs['Tc'], tf, True):
-            s = kargs['line'](t, tf) # s \in [0, 1], t \in [0, tf]
-            points.append(sp + ((ep-sp)*s))
-            ts.append(t)
-    elif patch['type'] == 'circle':
-        for t in rangef(0, kargs['Tc'], tf, True):
-            s = kargs['circle'](t, tf)
-            points.append(c+(sp-c).rotate(s*angle))
-            ts.append(t)
-
-    for p in points:
-        ik_result = ik(p.x, p.y, 0, None, kargs['sizes'])
-        if ik_result is None:
-            # Point unreachable - skip or use last known position
-            print(f"Warning: Point ({p.x:.3f}, {p.y:.3f}) unreachable by robot")
-            if q0s:
-                q0s.append(q0s[-1])
-                q1s.append(q1s[-1])
-                penups.append(1)  # Pen up for unreachable
+    if patch['type'] not in ('line', 'circle'):
+        return _empty_slice(derivatives)
+    ts = arangef(0, kargs['Tc'], tf, True)
+    law = kargs[patch['type']] # 'line' or 'circle' timing law
+    s = law(ts, tf) # s \in [0, 1], t \in [0, tf]
+    (p, p_s, p_ss) = path_points(patch['type'], geometry, s)
+    (q, reachable) = ik_batch(p[0], p[1], kargs['sizes'])
+    (dq, ddq) = (None, None)
+
+    if derivatives:
+        (ds, dds) = kargs[patch['type'] + '_d'](ts, tf)
+        # chain rule: dp = p'(s)*ds, ddp = p''(s)*ds^2 + p'(s)*dds
+        (dq, ddq) = diff_ik_batch(q, p_s*ds, p_ss*ds**2 + p_s*dds, kargs['sizes'])
+        reachable &= ~_singular(q) # no finite derivatives there: held like the unreachable samples
+
+    return _hold_unreachable(p, q, dq, ddq, ts, reachable)
+
+
+""" #@
+@name: topp_profile
+@brief: time-optimal parameterization of a path under joint velocity and acceleration limits
+@notes: the path is given on a grid of the path parameter s, through the joint derivatives q'(s) and q''(s). 
+The returned profile x = (ds/dt)^2 is the fastest one that starts and ends at rest with 
+|q'*ds| <= vmax and |q'*dds + q''*ds^2| <= amax for every joint (the acceleration dds is constant between grid points 
+and the limits are checked at both ends of every step, so that they hold where the curvature changes quickly). 
+It is found with two passes (reachability analysis, as in TOPP-RA): 
+a backward pass computes the largest x from which the end can still be reached at rest (controllable set), 
+then a forward pass accelerates as much as possible while staying inside it.
+@inputs: 
+- ndarray q_s: 2xN array, derivative of the joint positions with respect to s;
+- ndarray q_ss: 2xN array, second derivative of the joint positions with respect to s;
+- float | ndarray ds: step of the grid of s (or the N-1 steps of a non-uniform grid);
+- float vmax: joint velocity limit;
+- float amax: joint acceleration limit;
+@outputs: 
+- ndarray: array of N values of (ds/dt)^2, zero at both ends.
+@# """
+def topp_profile(q_s:np.ndarray, q_ss:np.ndarray, ds:float|np.ndarray, vmax:float, amax:float) -> np.ndarray:
+    n = q_s.shape[1]
+    ds = np.broadcast_to(np.asarray(ds, dtype=float), (n-1,)) # step from each grid point to the next one
+    with np.errstate(divide='ignore'):
+        x_max = np.min(np.where(np.abs(q_s) > 1e-12, (vmax/np.abs(q_s))**2, np.inf), axis=0) # velocity limits
+
+    # Acceleration limits of each step (dds is constant from point i to i+1), checked at both of its ends for each joint:
+    # q'_i*dds + q''_i*x_i and q'_(i+1)*dds + q''_(i+1)*x_(i+1), with x_(i+1) = x_i + 2*ds*dds.
+    # Each row is |a*dds + b*x_i| <= amax, that is dds in [-A - k*x_i, A - k*x_i] (or |b*x_i| <= amax when a = 0)
+    a = np.vstack((q_s[:, :-1], q_s[:, 1:] + 2*ds*q_ss[:, 1:]))
+    b = np.vstack((q_ss[:, :-1], q_ss[:, 1:]))
+    moving = np.abs(a) > 1e-12
+    safe = np.where(moving, a, 1.0)
+    A = np.where(moving, amax/np.abs(safe), np.inf)
+    k = np.where(moving, b/safe, 0.0)
+
+    # Maximum velocity curve: rows with a = 0 and compatible dds bounds between every pair of rows
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bound = np.min(np.where(moving, np.inf, amax/np.abs(b)), axis=0)
+        for i in range(len(a)):
+            for j in range(i+1, len(a)):
+                pair = np.where(moving[i] & moving[j], (A[i]+A[j])/np.abs(k[i]-k[j]), np.inf)
+                bound = np.minimum(bound, pair)
+    x_max[:-1] = np.minimum(x_max[:-1], np.nan_to_num(bound, nan=np.inf))
+
+    # Backward pass: largest x_i such that some admissible dds leads to x_(i+1) <= K_(i+1).
+    # For each row: x + 2*ds*(-A - k*x) <= K  ->  c*x <= K + 2*ds*A, with c = 1 - 2*ds*k (no bound if c <= 0)
+    # The passes are sequential: plain floats are much faster than indexing numpy arrays
+    c = 1 - 2*ds*k
+    bounded = (c > 0) & np.isfinite(A)
+    (c0, c1, c2, c3) = np.where(bounded, c, 1.0).tolist()
+    (a0, a1, a2, a3) = np.where(bounded, 2*ds*A, np.inf).tolist()
+    x_max = x_max.tolist()
+    K = [0.0]*n
+    for i in range(n-2, -1, -1):
+        K1 = K[i+1]
+        K[i] = max(min(x_max[i], (K1 + a0[i])/c0[i], (K1 + a1[i])/c1[i], (K1 + a2[i])/c2[i], (K1 + a3[i])/c3[i]), 0.0)
+
+    # Forward pass: maximum acceleration, clipped to the controllable set
+    (A0, A1, A2, A3) = (2*ds*A).tolist()
+    (k0, k1, k2, k3) = (2*ds*k).tolist()
+    x = [0.0]*n
+    for i in range(n-1):
+        xi = x[i]
+        x[i+1] = min(K[i+1], max(xi + min(A0[i] - k0[i]*xi, A1[i] - k1[i]*xi, A2[i] - k2[i]*xi, A3[i] - k3[i]*xi), 0.0))
+    return np.array(x)
+
+
+""" #@
+@name: blend_corners
+@brief: splits a sequence of pen-down patches into strokes, continuous paths that can be drawn without stopping
+@notes: consecutive patches stay in the same stroke when the direction of the path does not change at their junction 
+(collinear lines, tangent arcs) or when both are lines and the corner is not sharper than max_angle: the corner is then 
+rounded with an arc tangent to both lines, that deviates at most tolerance from the corner and uses at most half of each line 
+(so that consecutive blends do not overlap). Every other junction (sharp corners, kinks involving an arc) starts a new stroke, 
+where the arm stops. Zero-length patches are dropped. The input patches are not modified.
+@inputs: 
+- list[dict] patches: pen-down trajectory patches (same structure used by slice_trj), each one starting where the previous ends;
+- float tolerance: maximum distance between a corner and its blend arc (m);
+- float max_angle: sharpest direction change that is blended (rad);
+@outputs: 
+- list[list[dict]]: the strokes, lists of line and circle patches.
+@# """
+def blend_corners(patches:list[dict], tolerance:float, max_angle:float) -> list[list[dict]]:
+    strokes = []
+    last_length = 0 # original length of the last line of the current stroke, before its end is trimmed
+    for patch in patches:
+        geometry = patch_geometry(patch)
+        if patch['type'] not in ('line', 'circle') or geometry[5] < 1e-9:
+            continue
+        if not strokes:
+            strokes.append([patch])
+            last_length = geometry[5]
             continue
-        qt = list(ik_result.T[0])
-        q0s.append(qt[0])
-        q1s.append(qt[1])
-        penups.append(0)
+        stroke = strokes[-1]
+        prev = stroke[-1]
+        prev_geometry = patch_geometry(prev)
+        t1 = _patch_tangents(prev['type'], prev_geometry)[1]
+        t2 = _patch_tangents(patch['type'], geometry)[0]
+        theta = abs(atan2(t1.x*t2.y - t1.y*t2.x, t1.x*t2.x + t1.y*t2.y)) # direction change at the junction
+        if theta <= 1e-3:
+            stroke.append(patch)
+        elif prev['type'] == 'line' and patch['type'] == 'line' and theta <= max_angle:
+            corner = prev_geometry[1]
+            # tangent arc: distance of the tangent points from the corner d = r*tan(theta/2), deviation r*(1/cos(theta/2) - 1)
+            radius = min(tolerance/(1/cos(theta/2) - 1), min(last_length, geometry[5])/2/tan(theta/2))
+            d = radius*tan(theta/2)
+            a = corner - t1*d
+            b = corner + t2*d
+            normal = Point(-t1.y, t1.x) if t1.x*t2.y - t1.y*t2.x > 0 else Point(t1.y, -t1.x) # towards the inside of the corner
+            c = a + normal*radius
+            stroke[-1] = {**prev, 'points': [prev['points'][0], [a.x, a.y]]}
+            stroke.append({'type': 'circle', 'points': [[a.x, a.y], [b.x, b.y]], 'data': {**prev['data'], 'center': [c.x, c.y]}})
+            stroke.append({**patch, 'points': [[b.x, b.y], patch['points'][1]]})
+        else:
+            strokes.append([patch])
+        last_length = geometry[5]
+    return strokes
+
+def _patch_tangents(patch_type: str, geometry: tuple) -> tuple:
+    """Unit tangents (direction of motion) at the start and at the end of a line or circle patch"""
+    (sp, ep, c, _, angle, length) = geometry
+    if patch_type == 'line':
+        t = (ep-sp)*(1/length)
+        return t, t
+    sign = 1 if angle >= 0 else -1
+    (u0, u1) = ((sp-c).angle(), (sp-c).angle() + angle)
+    return Point(-sign*sin(u0), sign*cos(u0)), Point(-sign*sin(u1), sign*cos(u1))
+
+
+""" #@
+@name: slice_path_topp
+@brief: slices a continuous path, made of several line and circle patches, with the time-optimal parameterization
+@notes: the path is sampled on a grid of its arc length (at most kargs['path_step'] meters apart, at least two steps per patch 
+and a grid point on every junction), the joint derivatives along the path come from diff_ik_batch and topp_profile finds the 
+fastest profile within the joint limits. The arm stops only at the two ends of the path: it keeps moving through the junctions, 
+so the path must have a continuous direction (see blend_corners). The duration is rounded up to a multiple of Tc (the profile is 
+slowed down uniformly, so it stays within the limits) and the profile is resampled every Tc. 
+The path starts and ends at rest, exactly on its end points.
+@inputs: 
+- list[dict] patches: pen-down trajectory patches, each one starting where the previous ends;
+- **kargs: same keyword arguments used by slice_trj_topp;
+@outputs: 
+- same outputs of slice_trj_analytic (q, dq, ddq, penups, ts).
+@# """
+def slice_path_topp(patches: list[dict], **kargs):
+    _topp_defaults(kargs)
+    segments = [(patch['type'], patch_geometry(patch)) for patch in patches if patch['type'] in ('line', 'circle')]
+    segments = [segment for segment in segments if segment[1][5] > 0]
+    if not segments:
+        return _empty_slice(True)
+    lengths = np.array([segment[1][5] for segment in segments])
+    offsets = np.concatenate(([0.0], np.cumsum(lengths))) # arc length at the start of each patch
+
+    # 1. Time-optimal profile on the grid of the arc length
+    steps = np.maximum(np.ceil(lengths/kargs['path_step']).astype(int), 2)
+    if len(segments) == 1:
+        steps = np.maximum(steps, 4)
+    grid = np.concatenate([offsets[i] + lengths[i]*np.arange(steps[i])/steps[i] for i in range(len(segments))] + [offsets[-1:]])
+    (p, p_s, p_ss) = _stroke_points(segments, offsets, grid)
+    (q, reachable) = ik_batch(p[0], p[1], kargs['sizes'])
+    (q_s, q_ss) = diff_ik_batch(q, p_s, p_ss, kargs['sizes'])
+    # Unreachable (or singular) stretches are held: they are crossed as if one joint moved the tip along the shorter
+    # link, so they take a finite time instead of bounding nothing (an infinite path speed)
+    held = ~reachable | _singular(q)
+    q_s[:, held] = 1/min(kargs['sizes']['l1'], kargs['sizes']['l2'])
+    q_ss[:, held] = 0.0
+    x = topp_profile(q_s, q_ss, np.diff(grid), kargs['vmax'], kargs['amax'])
+
+    # 2. Time of each grid point (constant dds between grid points), duration rounded up to a multiple of Tc
+    v = np.sqrt(x)
+    dt = 2*np.diff(grid)/(v[:-1]+v[1:])
+    t = np.concatenate(([0.0], np.cumsum(dt)))
+    Tc = kargs['Tc']
+    n_steps = max(int(np.ceil(t[-1]/Tc - 1e-9)), 1)
+    slow = n_steps*Tc/t[-1] # >= 1: uniform slowdown, v/slow and a/slow^2
+    t *= slow
+    v /= slow
+    ts = np.arange(n_steps+1)*Tc
+
+    # 3. Resample every Tc: s(t) inside each grid interval is a parabola
+    i = np.clip(np.searchsorted(t, ts, side='right')-1, 0, len(grid)-2)
+    tau = ts - t[i]
+    dds = (v[i+1]**2 - v[i]**2)/(2*(grid[i+1]-grid[i]))
+    s = np.clip(grid[i] + v[i]*tau + dds*tau**2/2, 0.0, offsets[-1])
+    sd = np.maximum(v[i] + dds*tau, 0.0)
+    s[-1] = offsets[-1]
+    sd[-1] = 0.0
+
+    (p, p_s, p_ss) = _stroke_points(segments, offsets, s)
+    (q, reachable) = ik_batch(p[0], p[1], kargs['sizes'])
+    (dq, ddq) = diff_ik_batch(q, p_s*sd, p_ss*sd**2 + p_s*dds, kargs['sizes'])
+    # the profile bounds the joints only between grid points where they move: samples next to a held one are held too
+    reachable &= ~(held[i] | held[i+1] | _singular(q))
+    return _hold_unreachable(p, q, dq, ddq, ts, reachable)
 
-    return q0s, q1s, penups, ts
+def _stroke_points(segments: list, offsets: np.ndarray, s: np.ndarray) -> tuple:
+    """Points p(s) of a path made of several patches for the (sorted) arc lengths s, with the derivatives p'(s) and p''(s)"""
+    p = np.empty((2, len(s)))
+    p_s = np.empty((2, len(s)))
+    p_ss = np.empty((2, len(s)))
+    # a junction belongs to the patch that starts there
+    bounds = np.searchsorted(s, offsets[1:-1], side='left').tolist()
+    for (k, ((patch_type, geometry), a, b)) in enumerate(zip(segments, [0]+bounds, bounds+[len(s)])):
+        if a == b:
+            continue
+        length = geometry[5]
+        (p[:, a:b], p_s[:, a:b], p_ss[:, a:b]) = path_points(patch_type, geometry, (s[a:b]-offsets[k])/length)
+        p_s[:, a:b] /= length # d/ds of the arc length instead of the fraction of the patch
+        p_ss[:, a:b] /= length**2
+    return p, p_s, p_ss
+
+def _topp_defaults(kargs: dict):
+    if 'max_acc' not in kargs:
+        kargs['max_acc'] = 1.05
+    if 'vmax' not in kargs or 'amax' not in kargs:
+        raise Exception("No joint velocity or acceleration limit was specified")
+    if 'path_step' not in kargs:
+        kargs['path_step'] = 5e-4
+    if 'Tc' not in kargs:
+        kargs['Tc'] = 1e-3
+    if 'sizes' not in kargs:
+        print('Using default sizes')
+
+
+""" #@
+@name: slice_trj_topp
+@brief: slices a trajectory patch with the time-optimal parameterization instead of a fixed timing law
+@notes: pen-down patches are sliced by slice_path_topp as a path of their own: they start and end at rest, exactly on their end points. 
+Pen-up patches keep the cycloidal point-to-point trajectory.
+@inputs: 
+- dict patch: trajectory patch (same structure used by slice_trj);
+- **kargs: same keyword arguments used by slice_trj_analytic, plus:
+    * 'vmax': joint velocity limit;
+    * 'amax': joint acceleration limit;
+    * 'path_step': spacing of the path grid used by the optimization (m);
+@outputs: 
+- same outputs of slice_trj_analytic (q, dq, ddq, penups, ts).
+@# """
+def slice_trj_topp(patch: dict, **kargs):
+    _topp_defaults(kargs)
+    if patch['data']['penup']:
+        geometry = patch_geometry(patch)
+        sliced = _slice_penup(patch, kargs, sqrt(2*pi*geometry[5]/kargs['max_acc']), True)
+        return _empty_slice(True) if sliced is None else sliced
+    return slice_path_topp([patch], **kargs)
 
 
 """
@@ -0,0 +1,85 @@
+"""
+Workspace of the 2-link planar arm: the annulus |l1-l2| <= r <= l1+l2 around the base.
+The signed distance from its border is known in closed form, so every query is a vectorized O(1)
+expression over whole arrays of points, with the same reachability rule used by trajpy.ik_batch.
+Patches are checked along their whole path (the closest and farthest points of lines and arcs),
+not only at their end points, so a line cutting through the inner hole is caught before slicing.
+"""
+
+import numpy as np
+
+def reach_limits(sizes: dict, margin: float = 0.0) -> tuple:
+    """(r_min, r_max) of the workspace; margin > 0 shrinks it (relative: r_min*(1+margin), r_max*(1-margin))"""
+    (l1, l2) = (sizes['l1'], sizes['l2'])
+    return (abs(l1 - l2)*(1 + margin), (l1 + l2)*(1 - margin))
+
+def signed_distance(x, y, sizes: dict, margin: float = 0.0) -> np.ndarray:
+    """Distance of the points from the border of the workspace: negative inside, positive outside"""
+    (r_min, r_max) = reach_limits(sizes, margin)
+    r = np.hypot(x, y)
+    return np.maximum(r - r_max, r_min - r)
+
+def reachable(x, y, sizes: dict, margin: float = 0.0) -> np.ndarray:
+    """Boolean mask of the points inside the workspace"""
+    return signed_distance(x, y, sizes, margin) <= 0
+
+def nearest_reachable(x, y, sizes: dict, margin: float = 0.0) -> np.ndarray:
+    """Closest points of the workspace (2xN): reachable points are returned unchanged, the others are moved radially"""
+    (x, y) = (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    (r_min, r_max) = reach_limits(sizes, margin)
+    r = np.hypot(x, y)
+    (r_min, r_max) = (r_min*(1 + 1e-9), r_max*(1 - 1e-9)) # strictly inside: the border itself is subject to rounding
+    scale = np.where((r >= r_min) & (r <= r_max), 1.0, np.clip(r, r_min, r_max)/np.where(r > 0, r, 1.0))
+    # the base itself has no direction: any point of the inner circle is the closest one
+    return np.array([np.where(r > 0, x*scale, r_min), np.where(r > 0, y*scale, 0.0)])
+
+def patch_extremes(patches: list) -> tuple:
+    """
+    Closest and farthest points from the base along each patch (2xN arrays each).
+    Lines: end points or the foot of the perpendicular from the base. Arcs (shortest arc between the end points,
+    as sliced by trajpy): end points or the points of the circle aligned with the base, when the arc contains them.
+    """
+    n = len(patches)
+    sp = np.array([patch['points'][0] for patch in patches], dtype=float).reshape(n, 2).T
+    ep = np.array([patch['points'][1] for patch in patches], dtype=float).reshape(n, 2).T
+    circle = np.array([patch['type'] == 'circle' for patch in patches], dtype=bool)
+    c = np.array([patch['data']['center'] if patch['type'] == 'circle' else (0.0, 0.0) for patch in patches],
+                 dtype=float).reshape(n, 2).T
+
+    # Candidates: start, end, and one interior point for the minimum (lines and arcs) and the maximum (arcs)
+    d = ep - sp
+    t = np.clip(-(sp*d).sum(axis=0)/np.where((d*d).sum(axis=0) > 0, (d*d).sum(axis=0), 1.0), 0.0, 1.0)
+    foot = sp + d*t
+
+    radius = np.hypot(*(sp - c))
+    phi0 = np.arctan2(*(sp - c)[::-1])
+    sweep = (np.arctan2(*(ep - c)[::-1]) - phi0 + np.pi) % (2*np.pi) - np.pi # shortest arc, in (-pi, pi]
+    towards = np.arctan2(c[1], c[0]) # direction of the center seen from the base
+    def on_arc(phi):
+        delta = np.where(sweep >= 0, (phi - phi0) % (2*np.pi), (phi0 - phi) % (2*np.pi))
+        return circle & (delta <= np.abs(sweep))
+    far = c + radius*np.array([np.cos(towards), np.sin(towards)])
+    near = c - radius*np.array([np.cos(towards), np.sin(towards)])
+
+    near_candidate = np.where(circle, np.where(on_arc(towards + np.pi), near, sp), foot)
+    far_candidate = np.where(on_arc(towards), far, sp)
+    candidates = np.stack((sp, ep, near_candidate, far_candidate)) # 4x2xN
+    r = np.hypot(candidates[:, 0], candidates[:, 1])
+    cols = np.arange(n)
+    return candidates[np.argmin(r, axis=0), :, cols].T, candidates[np.argmax(r, axis=0), :, cols].T
+
+def check_patches(patches: list, sizes: dict, margin: float = 0.0) -> dict:
+    """
+    Checks every patch against the workspace.
+    Returns {'valid', 'unreachable': indices of the patches leaving the workspace,
+    'points': 2xK offending points (one per unreachable patch), 'nearest': 2xK closest reachable points}
+    """
+    if not patches:
+        return {'valid': True, 'unreachable': np.empty(0, dtype=int), 'points': np.empty((2, 0)), 'nearest': np.empty((2, 0))}
+    (near, far) = patch_extremes(patches)
+    (d_near, d_far) = (signed_distance(*near, sizes, margin), signed_distance(*far, sizes, margin))
+    worst = np.where(d_far >= d_near, far, near)
+    unreachable = np.flatnonzero(np.maximum(d_near, d_far) > 0)
+    points = worst[:, unreachable]
+    return {'valid': len(unreachable) == 0, 'unreachable': unreachable, 'points': points,
+            'nearest': nearest_reachable(*points, sizes, margin)}
@@ -8,12 +8,14 @@ from config import SETTINGS, WEB_OPTIONS, SERIAL_PORT
 from lib import serial_com as scm
 from serial_manager import serial_manager
 import gui_interface # Imports exposed functions
+import plotting
 import sys
 import threading
 
 def handle_closure(sig, frame):
     print("Closing Serial and Exiting...")
     serial_manager.stop_monitor()
+    plotting.shutdown()
     if SETTINGS['ser_started']:
         scm.serial_close()
         SETTINGS['ser_started'] = False
@@ -0,0 +1,378 @@
+"""
+Streaming trajectory planner.
+Turns the list of patches coming from the GUI into a lazy pipeline:
+patch -> samples (positions, velocities, accelerations) -> encoded packets.
+Every stage is a generator working on one patch at a time, so the execution
+thread can start transmitting as soon as the first patch is planned and memory
+does not grow with the length of the job.
+"""
+
+import time
+import numpy as np
+from itertools import chain
+
+from lib import trajpy as tpy
+from lib import binary_protocol as bp
+from lib import plan_cache
+from config import SETTINGS, SIZES, MAX_SPEED_RAD, MAX_ACC_TOLERANCE_FACTOR, TIME_OPTIMAL, TRAVEL_OPTIMIZATION
+
+
+def limit_scale_factor(dq, ddq) -> tuple[float, float, float]:
+    """
+    Finds the time scale needed to bring a trajectory within the speed/acceleration limits.
+    Returns: (max_v, max_a, scale_factor)
+    - scale_factor: Factor to multiply time intervals by (1.0 if already valid, >1.0 if needs slowing)
+    """
+    MAX_ACC_RAD = SETTINGS['max_acc'] * MAX_ACC_TOLERANCE_FACTOR
+    max_v = max((float(np.max(np.abs(d))) for d in dq if len(d)), default=0.0)
+    max_a = max((float(np.max(np.abs(d))) for d in ddq if len(d)), default=0.0)
+
+    # For velocity: v' = v / scale -> need scale >= v / v_max
+    # For acceleration: a' = a / scale^2 -> need scale >= sqrt(a / a_max)
+    scale_v = max_v / MAX_SPEED_RAD if max_v > MAX_SPEED_RAD else 1.0
+    scale_a = (max_a / MAX_ACC_RAD) ** 0.5 if max_a > MAX_ACC_RAD else 1.0
+    return (max_v, max_a, max(scale_v, scale_a))
+
+def validate_trajectory(q, dq, ddq):
+    """
+    Validate trajectory against speed/acceleration limits.
+    Returns: (is_valid, scale_factor)
+    - is_valid: True if within limits (possibly after scaling)
+    - scale_factor: Factor to multiply time intervals by (1.0 if already valid, >1.0 if needs slowing)
+    """
+    print("\n--- TRAJECTORY VALIDATION ---")
+    MAX_ACC_RAD = SETTINGS['max_acc'] * MAX_ACC_TOLERANCE_FACTOR
+    (max_v, max_a, scale_factor) = limit_scale_factor(dq, ddq)
+
+    print(f"Stats: Max Vel={max_v:.2f} rad/s (limit: {MAX_SPEED_RAD}), Max Acc={max_a:.2f} rad/s^2 (limit: {MAX_ACC_RAD:.2f})")
+
+    if scale_factor > 1.0:
+        print(f"[!] Trajectory exceeds limits. Auto-scaling by factor {scale_factor:.2f}x (slower)")
+        print(f"    New max vel: {max_v/scale_factor:.2f} rad/s, New max acc: {max_a/(scale_factor**2):.2f} rad/s^2")
+        return (True, scale_factor)
+    else:
+        print("Trajectory Dynamics: OK")
+        return (True, 1.0)
+
+def slice_stroke(stroke: list, scale: float = 1.0):
+    """
+    Samples a stroke (list of patches drawn without stopping, see group_strokes) with the current SETTINGS
+    (arrays: q 2xN, dq 2xN, ddq 2xN, penups, ts).
+    Pen-down strokes are time-optimal within the joint limits when TIME_OPTIMAL is enabled, cycloidal otherwise.
+    scale > 1 slows the stroke down (velocities / scale, accelerations / scale^2).
+    """
+    kargs = dict(
+        Tc=SETTINGS['Tc'],
+        max_acc=SETTINGS['max_acc']/scale**2, # tf grows with 1/sqrt(max_acc): the cycloidal patch is stretched by scale
+        line=SETTINGS['line_tl'],
+        circle=SETTINGS['circle_tl'],
+        line_d=SETTINGS['line_tl_d'],
+        circle_d=SETTINGS['circle_tl_d'],
+        sizes=SIZES
+    )
+    if not TIME_OPTIMAL['enabled']:
+        return tpy.slice_trj_analytic(stroke[0], **kargs)
+    kargs.update(
+        vmax=MAX_SPEED_RAD/scale,
+        amax=SETTINGS['max_acc']*MAX_ACC_TOLERANCE_FACTOR/scale**2,
+        path_step=TIME_OPTIMAL['path_step']
+    )
+    if stroke[0]['data']['penup']:
+        return tpy.slice_trj_topp(stroke[0], **kargs)
+    return tpy.slice_path_topp(stroke, **kargs)
+
+def slice_patch(patch: dict, scale: float = 1.0):
+    """Samples a single patch with the current SETTINGS (see slice_stroke)"""
+    return slice_stroke([patch], scale)
+
+def sample_counts(patches) -> np.ndarray:
+    """
+    Samples of every patch, from its geometry only (nothing is sliced): the duration of the cycloidal law,
+    tf = sqrt(2*pi*length/max_acc), sampled every Tc. Exact for cycloidal patches within the limits, an upper bound
+    for time-optimal strokes (faster); strokes slowed down to the limits take more.
+    """
+    lengths = np.array([tpy.patch_geometry(patch)[5] for patch in patches], dtype=float)
+    tf = np.sqrt(2*np.pi*lengths/SETTINGS['max_acc'])
+    return np.floor(tf/SETTINGS['Tc']).astype(int) + 1
+
+def job_samples(patches, start) -> int:
+    """Samples to allocate for the job planned by plan_job from `start` (travel to its first point included)"""
+    travel = {'type': 'line', 'points': [list(start), list(patches[0]['points'][0])], 'data': {'penup': True}}
+    return int(sample_counts([travel] + list(patches)).sum())
+
+def retime(q, dq, ddq, penups, scale: float):
+    """
+    Slows a sliced trajectory down by `scale` (>= 1) on a stretched time base, resampled every Tc
+    (the duration is rounded up to a multiple of Tc, so the actual scale is a little larger).
+    Velocities and accelerations are interpolated linearly between the original samples and divided by scale and
+    scale^2: their new maxima are exactly the old ones over the scale. Positions are cubic Hermite on q and dq.
+    """
+    n = len(penups)
+    if n < 2 or scale <= 1.0:
+        return q, dq, ddq, penups
+    m = int(np.ceil((n - 1)*scale - 1e-9)) + 1
+    scale = (m - 1)/(n - 1)
+    u = np.minimum(np.arange(m)/scale, n - 1) # position of every new sample on the original ones
+    i = np.minimum(u.astype(int), n - 2)
+    f = u - i
+    (f2, f3) = (f*f, f*f*f)
+    Tc = SETTINGS['Tc']
+    q = ((2*f3 - 3*f2 + 1)*q[:, i] + (f3 - 2*f2 + f)*Tc*dq[:, i]
+         + (3*f2 - 2*f3)*q[:, i+1] + (f3 - f2)*Tc*dq[:, i+1])
+    dq = ((1 - f)*dq[:, i] + f*dq[:, i+1])/scale
+    ddq = ((1 - f)*ddq[:, i] + f*ddq[:, i+1])/scale**2
+    return q, dq, ddq, penups[np.rint(u).astype(int)]
+
+def group_strokes(patches):
+    """
+    Groups the patches into strokes, the units of motion that start and end at rest.
+    With TIME_OPTIMAL enabled, consecutive pen-down patches form one stroke up to the next pen lift
+    or sharp corner (smaller corners are rounded, see tpy.blend_corners); pen-up patches are strokes of their own.
+    With the cycloidal timing laws every patch is a stroke.
+    """
+    if not TIME_OPTIMAL['enabled']:
+        yield from ([patch] for patch in patches)
+        return
+    run = [] # consecutive pen-down patches
+    for patch in patches:
+        if not patch['data']['penup']:
+            run.append(patch)
+            continue
+        yield from tpy.blend_corners(run, TIME_OPTIMAL['blend_tolerance'], np.radians(TIME_OPTIMAL['max_blend_angle']))
+        run = []
+        yield [patch]
+    yield from tpy.blend_corners(run, TIME_OPTIMAL['blend_tolerance'], np.radians(TIME_OPTIMAL['max_blend_angle']))
+
+def split_strokes(patches) -> list:
+    """Splits the patches into pen-down runs, the parts of the drawing between two pen lifts (pen-up patches are dropped)"""
+    strokes = [[]]
+    for patch in patches:
+        if patch['data']['penup']:
+            if strokes[-1]: strokes.append([])
+        else:
+            strokes[-1].append(patch)
+    return [stroke for stroke in strokes if stroke]
+
+def reverse_stroke(stroke: list) -> list:
+    """The same stroke drawn in the opposite direction"""
+    return [{**patch, 'points': [patch['points'][1], patch['points'][0]]} for patch in reversed(stroke)]
+
+def travel_time(p: np.ndarray, q: np.ndarray, a, b):
+    """
+    Duration of the pen-up moves between the points a and b (indices or index arrays of the columns of p and q):
+    the planner times them like a cycloidal patch of their length, stretched to the joint limits
+    (peak acceleration 2*pi*dq/tf^2, peak speed 2*dq/tf) when the joint displacement dq needs it.
+    Unreachable points (q = nan) are timed on the length only.
+    """
+    length = np.hypot(p[0, b] - p[0, a], p[1, b] - p[1, a])
+    dq = np.fmax(np.abs(q[0, b] - q[0, a]), np.abs(q[1, b] - q[1, a]))
+    max_acc = SETTINGS['max_acc']*MAX_ACC_TOLERANCE_FACTOR
+    return np.fmax(np.sqrt(2*np.pi*length/SETTINGS['max_acc']),
+                   np.fmax(np.sqrt(2*np.pi*dq/max_acc), 2*dq/MAX_SPEED_RAD))
+
+def order_strokes(patches, start=None, time_budget: float = None) -> list:
+    """
+    Reorders the strokes of a job (and chooses the direction of each one) to minimize the time of the pen-up moves,
+    then joins them with new pen-up patches, starting with the move from start (default: the start of the first stroke).
+    Nearest neighbour tour from start, improved with 2-opt moves (reversing a part of the tour also reverses its strokes)
+    until no move helps or time_budget (s) runs out. The original order is kept if it is not slower.
+    """
+    strokes = split_strokes(patches)
+    if not strokes:
+        return []
+    if start is None:
+        start = strokes[0][0]['points'][0]
+    if time_budget is None:
+        time_budget = TRAVEL_OPTIMIZATION['time_budget']
+    deadline = time.perf_counter() + time_budget
+    n = len(strokes)
+
+    # Points: 2k = start of stroke k, 2k+1 = its end, 2n = start position
+    p = np.array([stroke[0]['points'][0] for stroke in strokes] + [start], dtype=float).T
+    p = np.insert(p, np.arange(1, n+1), np.array([stroke[-1]['points'][1] for stroke in strokes], dtype=float).T, axis=1)
+    (q, reachable) = tpy.ik_batch(p[0], p[1], SIZES)
+    q[:, ~reachable] = np.nan
+
+    # Tour: position 0 is the start position, then the strokes entered at entry[k] and left at exit[k] (2k or 2k+1)
+    entry = np.empty(n+1, dtype=int)
+    entry[0] = 2*n
+    free = np.ones(2*n, dtype=bool)
+    for k in range(1, n+1):
+        costs = np.where(free, travel_time(p, q, entry[k-1] ^ int(k > 1), np.arange(2*n)), np.inf)
+        entry[k] = int(np.argmin(costs))
+        free[entry[k] & ~1] = free[entry[k] | 1] = False
+    exit = entry ^ 1
+    exit[0] = 2*n
+
+    # 2-opt: reversing the positions i+1..j replaces the edges exit[i]->entry[i+1] and exit[j]->entry[j+1]
+    # with exit[i]->exit[j] and entry[i+1]->entry[j+1] (travel times are symmetric)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(n):
+            if time.perf_counter() >= deadline:
+                break
+            edges = np.append(travel_time(p, q, exit[:-1], entry[1:]), 0.0) # edges[k]: exit[k] -> entry[k+1]
+            j = np.arange(i+1, n+1)
+            after = np.append(travel_time(p, q, entry[i+1], entry[i+2:]), 0.0) # nothing after the last stroke
+            gain = edges[i] + edges[j] - travel_time(p, q, exit[i], exit[j]) - after
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                j = i+1 + best
+                (entry[i+1:j+1], exit[i+1:j+1]) = (exit[j:i:-1].copy(), entry[j:i:-1].copy())
+                improved = True
+
+    optimized = float(np.sum(travel_time(p, q, exit[:-1], entry[1:])))
+    original = float(travel_time(p, q, 2*n, 0) + np.sum(travel_time(p, q, np.arange(1, 2*n-1, 2), np.arange(2, 2*n, 2))))
+    if optimized >= original:
+        (entry, exit) = (np.append(2*n, np.arange(0, 2*n, 2)), np.append(2*n, np.arange(1, 2*n, 2)))
+
+    ordered = []
+    position = list(start)
+    for (k, point) in enumerate(entry[1:].tolist()):
+        stroke = strokes[point//2] if point % 2 == 0 else reverse_stroke(strokes[point//2])
+        if k == 0 or not np.allclose(position, stroke[0]['points'][0], rtol=0, atol=1e-9):
+            ordered.append({'type': 'line', 'points': [position, list(stroke[0]['points'][0])], 'data': {'penup': True}})
+        ordered += stroke
+        position = list(stroke[-1]['points'][1])
+    return ordered
+
+def stream_samples(patches):
+    """
+    Slices the strokes one at a time and yields the stitched chunk (q, dq, ddq) of each one,
+    with q = (q0s, q1s, penups), dq = (dq0s, dq1s) and ddq = (ddq0s, ddq1s).
+    Velocities and accelerations are the analytic ones (timing law + jacobian), not finite differences.
+    The first sample of every stroke after the first is dropped, since it repeats the end of the previous one.
+    Strokes exceeding the speed/acceleration limits (cycloidal ones, or time-optimal ones by a
+    discretization margin) are sliced again with a longer duration, so the slowdown is local to the stroke.
+    The samples of the new slice fall elsewhere on the path, so it can still overshoot a little: it is then
+    retimed, which brings it within the limits exactly.
+    """
+    first = True
+    for stroke in group_strokes(patches):
+        (q, dq, ddq, penups, _) = slice_stroke(stroke)
+        (_, _, scale) = limit_scale_factor(dq, ddq)
+        if scale > 1.0:
+            (q, dq, ddq, penups, _) = slice_stroke(stroke, scale)
+            (_, _, scale) = limit_scale_factor(dq, ddq)
+            if scale > 1.0:
+                (q, dq, ddq, penups) = retime(q, dq, ddq, penups, scale)
+        if not first:
+            (q, dq, ddq, penups) = (q[:, 1:], dq[:, 1:], ddq[:, 1:], penups[1:])
+        if len(penups) == 0:
+            continue
+        first = False
+        yield ((q[0], q[1], penups), (dq[0], dq[1]), (ddq[0], ddq[1]))
+
+def stream_packets(chunks):
+    """
+    Yields (q, dq, ddq, setpoints), where setpoints packs the CMD_TRAJECTORY payload of every sample
+    of the chunk in one bytes block (bp.SETPOINT_SIZE bytes each).
+    Framing (single or batched packets) is left to the sender, which knows what the firmware supports.
+    """
+    for (q, dq, ddq) in chunks:
+        setpoints = bp.pack_setpoints(q[0], q[1], dq[0], dq[1], ddq[0], ddq[1], q[2])
+        yield (q, dq, ddq, setpoints)
+
+def adaptive_keyframes(q0, q1, penups, tolerance: float, max_ticks: int, anchor=None) -> tuple:
+    """
+    Picks the samples to send as timed setpoints: the firmware moves linearly in the joint space from one keyframe
+    to the next, one interpolated point per Tc. Every dropped sample stays within tolerance (m) of the interpolated
+    position of the same control period, and the pen state does not change inside a span.
+    Greedy: from each keyframe, the farthest sample (at most max_ticks away) that satisfies both conditions.
+    anchor: (q0, q1) the samples continue from (the last one sent), None if the first sample starts the motion
+    (it is sent as it is, with one control period).
+    Returns (indices, ticks): the keyframes and the control periods from the previous one (ticks sum to the samples).
+    """
+    q = np.array([q0, q1], dtype=float)
+    pen = np.asarray(penups) != 0
+    n = q.shape[1]
+    if n == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    # Column 0 is the anchor, column k+1 the sample k
+    q = np.hstack((q[:, :1] if anchor is None else np.array(anchor, dtype=float).reshape(2, 1), q))
+    pen = np.concatenate((pen[:1], pen))
+    xy = tpy.dk_batch(q[0], q[1], SIZES)[:2]
+
+    keys = [1] if anchor is None else []
+    a = keys[-1] if keys else 0
+    while a < n:
+        m = min(max_ticks, n - a) # candidate spans: a -> a+1 ... a+m
+        span = np.arange(1, m+1) # ticks of each candidate
+        k = np.arange(1, m) # intermediate control periods
+        frac = np.where(k[:, None] < span[None, :], k[:, None]/span[None, :], 0.0) # (m-1) x m
+        interp = q[:, a, None, None] + (q[:, None, a+1:a+m+1] - q[:, a, None, None])*frac
+        exy = tpy.dk_batch(interp[0].ravel(), interp[1].ravel(), SIZES)[:2].reshape(2, m-1, m)
+        err = np.hypot(exy[0] - xy[0, a+1:a+m, None], exy[1] - xy[1, a+1:a+m, None])
+        err = np.where(k[:, None] < span[None, :], err, 0.0).max(axis=0, initial=0.0)
+        pen_ok = np.cumsum(np.concatenate(([False], pen[a+2:a+m+1] != pen[a+1:a+m]))) == 0
+        valid = np.flatnonzero((err <= tolerance) & pen_ok)
+        a += int(span[valid[-1]]) if len(valid) else 1
+        keys.append(a)
+    keys = np.array(keys)
+    return keys - 1, np.diff(keys, prepend=0)
+
+def stream_keyframes(chunks, tolerance: float, max_ticks: int):
+    """
+    Adds the timed setpoints to the planned chunks: yields (q, dq, ddq, setpoints, keyframes),
+    with keyframes = (q0s, q1s, penups, ticks) of the samples picked by adaptive_keyframes.
+    """
+    anchor = None
+    for chunk in chunks:
+        q = chunk[0]
+        (indices, ticks) = adaptive_keyframes(q[0], q[1], q[2], tolerance, max_ticks, anchor)
+        if len(indices):
+            anchor = (q[0][-1], q[1][-1])
+        yield chunk + ((np.asarray(q[0])[indices], np.asarray(q[1])[indices], np.asarray(q[2])[indices], ticks),)
+
+def plan_stream(patches):
+    """Full planning pipeline: patches -> samples (with analytic derivatives) -> encoded packets"""
+    return stream_packets(stream_samples(patches))
+
+CACHE_CHUNK = 512 # samples per chunk replayed from the plan cache
+
+def job_key(patches) -> str:
+    """Plan cache key: the patches and everything their planning depends on, planner sources included"""
+    settings = {k: SETTINGS[k] for k in ('Tc', 'max_acc', 'line_tl', 'circle_tl', 'line_tl_d', 'circle_tl_d')}
+    sources = []
+    for path in (__file__, tpy.__file__):
+        with open(path, 'rb') as f:
+            sources.append(f.read().decode(errors='replace'))
+    return plan_cache.job_key(patches, settings, SIZES, MAX_SPEED_RAD, MAX_ACC_TOLERANCE_FACTOR,
+                              TIME_OPTIMAL, TRAVEL_OPTIMIZATION['enabled'], sources)
+
+def _without_first_sample(chunks):
+    """Drops the first sample of the first chunk (it repeats the end of the pen-up travel before it)"""
+    first = True
+    for (q, dq, ddq, *_) in chunks:
+        if first:
+            (q, dq, ddq) = (tuple(x[1:] for x in q), tuple(x[1:] for x in dq), tuple(x[1:] for x in ddq))
+            first = False
+        if len(q[0]):
+            yield (q, dq, ddq)
+
+def plan_job(patches, start, cache: plan_cache.PlanCache = None):
+    """
+    Planning pipeline of a whole job from the current position `start`, encoded packets included.
+    The job itself (stroke order with TRAVEL_OPTIMIZATION, slicing) is taken from the plan cache when an identical
+    job was planned before, otherwise it is planned lazily and stored once completely streamed.
+    Only the leading pen-up travel from start depends on the current position: it is always planned.
+    """
+    trj = None
+    if cache is not None:
+        key = job_key(patches)
+        trj = cache.get(key, SETTINGS['Tc'])
+    if trj is not None:
+        print(f"Plan cache hit: {len(trj)} samples ({key[:12]})")
+        body = ((view.q, view.dq, view.ddq) for view in trj.chunks(CACHE_CHUNK))
+        first = tpy.dk_batch(trj.q[0][:1], trj.q[1][:1], SIZES)[:2, 0].tolist()
+    else:
+        if TRAVEL_OPTIMIZATION['enabled']:
+            # Reorder the strokes from the current position: shortest pen-up travel time (the start travel is dropped)
+            patches = order_strokes(patches, start)[1:] or patches
+        first = list(patches[0]['points'][0])
+        body = stream_samples(patches)
+        if cache is not None:
+            body = cache.record(key, body, SETTINGS['Tc'], int(sample_counts(patches).sum()))
+    travel = [{'type': 'line', 'points': [list(start), first], 'data': {'penup': True}}]
+    return stream_packets(chain(stream_samples(travel), _without_first_sample(body)))
@@ -1,21 +1,77 @@
-import matplotlib.pyplot as plt
+"""
+Debug and post-run plots (PNG files in images/).
+matplotlib is imported lazily with the non-interactive Agg backend, and the GUI process sends its plots to a
+worker process (submit): executions never wait for figures, and only the worker holds matplotlib's memory.
+The plotting functions can still be called directly (that is what the worker does).
+"""
+
 import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from lib import trajpy as tpy
-from config import SETTINGS
+from config import SETTINGS, PLOTTING
 import os
 
 # Ensure images directory exists
 os.makedirs('images', exist_ok=True)
 
+def _pyplot():
+    """matplotlib.pyplot on the Agg backend, imported on first use"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+# --- Background plotting ---
+
+_executor = None
+_pending = set()
+
+def submit(fn, *args):
+    """
+    Runs fn(*args) (a function of this module) in the plotting worker process and returns its Future,
+    or None when PLOTTING['max_pending'] jobs are already queued (the new plot is skipped, the execution is not held).
+    The worker is spawned, not forked: the GUI process is gevent patched and holds the serial port.
+    """
+    global _executor
+    if not PLOTTING['background']:
+        fn(*args)
+        return None
+    if len(_pending) >= PLOTTING['max_pending']:
+        print(f"Plotting busy: {fn.__name__} skipped")
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PLOTTING['workers'], mp_context=multiprocessing.get_context('spawn'))
+    future = _executor.submit(fn, *args)
+    _pending.add(future)
+    future.add_done_callback(_plot_done)
+    return future
+
+def _plot_done(future):
+    _pending.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Plotting Error: {future.exception()}")
+
+def shutdown(wait: bool = False):
+    """Stops the worker process (queued plots are dropped unless wait)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=not wait)
+        _executor = None
+
+# --- Plots ---
+
 def debug_plot(q, name="image"):
+    plt = _pyplot()
     plt.figure()
-    t = [i*SETTINGS['Tc'] for i in range(len(q))]
+    t = np.arange(len(q))*SETTINGS['Tc']
     plt.plot(t, q)
     plt.grid(visible=True)
     plt.savefig('images/'+name+'.png')
     plt.close()
 
 def debug_plotXY(x, y, name="image"):
+    plt = _pyplot()
     plt.figure()
     plt.plot(x, y)
     plt.grid(visible=True)
@@ -23,20 +79,20 @@ def debug_plotXY(x, y, name="image"):
     plt.close()
 
 def plot_recorded_data(des_q0, des_q1, Tc, rec_data):
-    if not rec_data['t']:
+    if len(rec_data['t']) == 0:
         print("No data recorded to plot.")
         return
 
+    plt = _pyplot()
     plt.close('all') # FORCE CLOSE ALL PREVIOUS FIGURES
     plt.figure()
     
     # 1. Actual Time Axis
-    t0 = rec_data['t'][0]
-    t_act = np.array([ti - t0 for ti in rec_data['t']])
+    t_act = np.asarray(rec_data['t']) - rec_data['t'][0]
     q0_act = np.array(rec_data['q0'])
     
     # 2. Desired Time Axis
-    t_des = np.array([i * Tc for i in range(len(des_q0))])
+    t_des = np.arange(len(des_q0))*Tc
     q0_des = np.array(des_q0)
     
     # 3. Alignment Logic (Start/End Scaling)
@@ -99,20 +155,10 @@ def plot_recorded_data(des_q0, des_q1, Tc, rec_data):
     plt.figure()
     
     # Compute Desired XY
-    x_des = []
-    y_des = []
-    for q0, q1 in zip(des_q0, des_q1):
-        pos = tpy.dk(np.array([q0, q1]))
-        x_des.append(pos[0][0])
-        y_des.append(pos[1][0])
+    (x_des, y_des, _) = tpy.dk_batch(des_q0, des_q1)
         
     # Compute Actual XY
-    x_act = []
-    y_act = []
-    for q0, q1 in zip(rec_data['q0'], rec_data['q1']):
-        pos = tpy.dk(np.array([q0, q1]))
-        x_act.append(pos[0][0])
-        y_act.append(pos[1][0])
+    (x_act, y_act, _) = tpy.dk_batch(rec_data['q0'], rec_data['q1'])
         
     plt.plot(x_des, y_des, '--', label='Desired Path', alpha=0.7)
     plt.plot(x_act, y_act, label='Actual Path', linewidth=1.5)
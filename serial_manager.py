@@ -1,228 +1,366 @@
 import threading
-from time import sleep, time
-import eel
+import asyncio
+from collections import deque
+from time import sleep, time, monotonic
 
 from lib import serial_com as scm
 from lib import binary_protocol as bp
+from lib.frame_parser import FrameParser
+from lib.trajectory import Trajectory
+from lib import run_log
 from state import state
-from config import SETTINGS
-import plotting 
+from config import SETTINGS, SIZES, RUN_LOG, FLOW_CONTROL, COMPACT_SETPOINTS, ADAPTIVE_SAMPLING, TELEMETRY
+from telemetry import pose_publisher
+import plotting
+import planner
 
 class SerialManager:
     def __init__(self):
-        self.stop_event = threading.Event()
-        self.monitor_thread = None
+        self.transport = None # scm.AsyncSerialTransport, owns serial reads/writes and the periodic tick
+        self.attached_port = None
         self.execution_thread = None
+        self.caps_requested = False
+        self.parser = FrameParser()
+        # Flow control counters of the last online execution
+        self.underruns = 0
+        self.overruns = 0
+        # Binary log of the current execution (lib/run_log.py): desired setpoints and actual feedback
+        self.run_log = None
+        self.run_start = 0.0
 
     def start_monitor(self):
-        print("Starting Serial Monitor Thread...")
-        self.stop_event.clear()
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitor_thread.start()
-
-    def _monitor_loop(self):
-        last_gui_update = 0
-        GUI_UPDATE_INTERVAL = 0.05 # Limit updates to ~20Hz
-
-        while not self.stop_event.is_set():
-            if SETTINGS['ser_started']:
-                try:
-                    # Check for feedback (Robust reading)
-                    # Process ALL available packets to avoid lag
-                    while scm.get_waiting_in_buffer() >= 3:
-                        b1 = scm.read_data(1)
-                        if b1 and b1[0] == bp.START_BYTE_1:
-                            b2 = scm.read_data(1)
-                            if b2 and b2[0] == bp.START_BYTE_2:
-                                # Header found
-                                b_type = scm.read_data(1)
-                                if b_type:
-                                    if b_type[0] == bp.RESP_POS:
-                                        payload = scm.read_data(12)
-                                        if payload and len(payload) == 12:
-                                            full_packet = b1 + b2 + b_type + payload
-                                            feedback = bp.decode_feedback(full_packet)
-                                            if feedback and feedback['type'] == bp.RESP_POS:
-                                                state.firmware.update_position(feedback['q0'], feedback['q1'])
-                                                state.firmware.last_update = time()
-                                                
-                                                if state.recording_active:
-                                                    state.rec_data['q0'].append(feedback['q0'])
-                                                    state.rec_data['q1'].append(feedback['q1'])
-                                                    state.rec_data['t'].append(time())
-                                    elif b_type[0] == bp.RESP_STATUS:
-                                        payload = scm.read_data(5)
-                                        if payload and len(payload) == 5:
-                                            full_packet = b1 + b2 + b_type + payload
-                                            feedback = bp.decode_feedback(full_packet)
-                                            if feedback and 'buffer_level' in feedback:
-                                                state.firmware.update_buffer(feedback['buffer_level'])
-                        else:
-                            # If not a start byte, consume it to realign
-                            pass
-                    
-                except Exception as e:
-                    print(f"Serial Monitor Error: {e}")
-
-            # Update GUI with current position (Always, even if offline)
-            if time() - last_gui_update > GUI_UPDATE_INTERVAL:
-                try:
-                    q0, q1, pen_up = state.firmware.get_position()
-                    eel.js_draw_pose([q0, q1, pen_up])
-                except:
-                    pass
-                last_gui_update = time()
+        print("Starting Serial Transport...")
+        self.transport = scm.start_transport(self.parser, self._handle_feedback)
+        self.transport.call_every(0.05, self._tick) # ~20Hz connection checks
+        self.transport.call_every(TELEMETRY['min_interval'], pose_publisher.tick) # pose updates to the GUI
+
+    def _tick(self):
+        """Periodic housekeeping on the transport loop: (re)attaches the port"""
+        if SETTINGS['ser_started'] and scm.ser is not None:
+            if scm.ser is not self.attached_port:
+                # New connection: the next device has to advertise its capabilities again
+                self.attached_port = scm.ser
+                self._reset_feedback()
+                self.transport.attach(scm.ser)
+            # Ask once per connection what the firmware supports (no answer -> capabilities stay 0)
+            if not self.caps_requested and self.transport.is_attached():
+                scm.write_data(bp.encode_caps_command())
+                self.caps_requested = True
+
+        elif self.attached_port is not None:
+            self.attached_port = None
+            self.transport.detach()
+            self._reset_feedback()
+
+    def _reset_feedback(self):
+        self.caps_requested = False
+        state.firmware.update_capabilities(0)
+        self.parser = FrameParser()
+        self.transport.parser = self.parser
+
+    def _handle_feedback(self, frame):
+        """Dispatches a complete (CRC checked) feedback frame"""
+        feedback = bp.decode_feedback(frame)
+        if not feedback:
+            return
+        if feedback['type'] == bp.RESP_POS:
+            state.firmware.update_position(feedback['q0'], feedback['q1'])
+            state.firmware.last_update = time()
             
-            sleep(0.005) # Fast polling
+            if state.recording_active:
+                state.rec_data.record(monotonic(), feedback['q0'], feedback['q1'])
+            log = self.run_log
+            if log is not None:
+                log.append(monotonic() - self.run_start, run_log.ACTUAL, feedback['q0'], feedback['q1'], state.firmware.pen_up)
+        elif feedback['type'] == bp.RESP_CAPS:
+            state.firmware.update_capabilities(feedback['capabilities'])
+            print(f"Firmware capabilities: {feedback['capabilities']:#04x}")
+        elif 'buffer_level' in feedback:
+            state.firmware.update_buffer(feedback['buffer_level'])
 
     def stop_monitor(self):
-        self.stop_event.set()
-        if self.monitor_thread:
-            self.monitor_thread.join()
+        if self.transport is not None:
+            scm.stop_transport()
+            self.transport = None
+            self.attached_port = None
 
     def send_data(self, msg_type: str, **data):
         """
         Non-blocking send data. Spawns a thread for trajectory execution.
+        'trj' takes the whole trajectory (q, dq, ddq), 'stream' takes an iterator of
+        planned chunks (q, dq, ddq, packets) that is consumed while the trajectory runs
+        (and optionally its expected number of samples, 'capacity', see planner.job_samples).
         """
         match msg_type:
             case 'trj':
                 if ('q' not in data) or ('dq' not in data) or ('ddq' not in data):
                     print("Not enough data to define the trajectory")
                     return 
+                self._start_execution(planner.stream_packets([(data['q'], data['dq'], data['ddq'])]), len(data['q'][0]))
+            case 'stream':
+                if 'chunks' not in data:
+                    print("Not enough data to define the trajectory")
+                    return
+                self._start_execution(data['chunks'], data.get('capacity', 0))
 
-                # Stop any previous execution
-                if self.execution_thread and self.execution_thread.is_alive():
-                    print("Stopping previous trajectory...")
-                    state.stop_requested = True
-                    self.execution_thread.join()
-                
-                state.stop_requested = False
-                
-                # Start new execution thread
-                self.execution_thread = threading.Thread(
-                    target=self._execute_trajectory, 
-                    kwargs=data, 
-                    daemon=True
-                )
-                self.execution_thread.start()
-
-    def _execute_trajectory(self, q, dq, ddq):
+    def stop_execution(self):
+        """Stops the running execution, if any, and waits for it: state.last_known_q is then its final position"""
+        if self.execution_thread and self.execution_thread.is_alive():
+            print("Stopping previous trajectory...")
+            state.stop_requested = True
+            self.execution_thread.join()
+
+    def _start_execution(self, chunks, capacity: int = 0):
+        # Stop any previous execution
+        self.stop_execution()
+        
+        state.stop_requested = False
+        
+        # Start new execution thread
+        self.execution_thread = threading.Thread(
+            target=self._execute_trajectory, 
+            args=(chunks, capacity), 
+            daemon=True
+        )
+        self.execution_thread.start()
+
+    def _iter_points(self, chunks, desired):
+        """
+        Flattens the planned chunks into (packet, q0, q1, pen_up, ticks) samples (one control period each).
+        The chunks are pulled lazily, so planning proceeds only as fast as execution needs it.
+        The desired positions are appended to the `desired` Trajectory for the post-run plot (and to the run log).
+        """
+        for (q, dq, ddq, setpoints) in chunks:
+            start = len(desired)
+            desired.append(q)
+            self._log_desired(desired[start:])
+            (q0s, q1s, pen_ups) = desired[start:].q # converted once per chunk, not per sample
+            view = memoryview(setpoints)
+            size = bp.SETPOINT_SIZE
+            for (i, q0, q1, pen_up) in zip(range(0, len(view), size), q0s.tolist(), q1s.tolist(), pen_ups.tolist()):
+                yield (view[i:i+size], q0, q1, pen_up, 1)
+
+    def _iter_timed_points(self, chunks, desired):
+        """
+        Same as _iter_points for timed setpoints: only the keyframes picked by the adaptive sampling,
+        each one lasting `ticks` control periods (no packed setpoint: they are encoded in batches).
+        """
+        max_ticks = min(ADAPTIVE_SAMPLING['max_ticks'], FLOW_CONTROL['high_water']) # a setpoint must fit in the credit
+        keyframes = planner.stream_keyframes(chunks, ADAPTIVE_SAMPLING['tolerance'], max_ticks)
+        for (q, dq, ddq, setpoints, (q0s, q1s, pen_ups, ticks)) in keyframes:
+            start = len(desired)
+            desired.append(q)
+            self._log_desired(desired[start:])
+            for (q0, q1, pen_up, n) in zip(q0s.tolist(), q1s.tolist(), pen_ups.tolist(), ticks.tolist()):
+                yield (None, q0, q1, bool(pen_up), n)
+
+    def _log_desired(self, trj):
+        if self.run_log is not None:
+            self.run_log.extend(trj.data['t'], run_log.DESIRED, *trj.q)
+
+    def _open_run_log(self, mode: str):
+        """Starts the binary log of this execution (one file per run, see RUN_LOG in config.py)"""
+        if not RUN_LOG['enabled']:
+            return
+        try:
+            self.run_start = monotonic()
+            self.run_log = run_log.new_run(RUN_LOG['directory'], {'mode': mode, 'Tc': SETTINGS['Tc'], 'sizes': SIZES})
+        except OSError as e:
+            print(f"Run log disabled for this run: {e}")
+
+    def _close_run_log(self):
+        (log, self.run_log) = (self.run_log, None)
+        if log is not None:
+            log.close()
+            print(f"Run log: {log.count} records in {log.path}")
+
+    def _packet_mode(self) -> str:
+        """Picks the densest trajectory packet format the firmware advertises: 'timed', 'compact', 'batch' or 'single'"""
+        caps = state.firmware.capabilities
+        if ADAPTIVE_SAMPLING['enabled'] and caps & bp.CAP_TIMED_SETPOINTS:
+            return 'timed'
+        if COMPACT_SETPOINTS and caps & bp.CAP_COMPACT_SETPOINTS:
+            return 'compact'
+        if caps & bp.CAP_TRAJECTORY_BATCH:
+            return 'batch'
+        return 'single'
+
+    def _write_points(self, batch, mode: str):
+        """Sends the points of the batch with the selected packet format"""
+        match mode:
+            case 'timed':
+                for k in range(0, len(batch), bp.MAX_BATCH_POINTS):
+                    (_, q0, q1, pen_up, ticks) = zip(*batch[k:k+bp.MAX_BATCH_POINTS])
+                    scm.write_data(bp.encode_trajectory_timed(q0, q1, ticks, pen_up))
+            case 'compact':
+                for k in range(0, len(batch), bp.COMPACT_MAX_POINTS):
+                    (_, q0, q1, pen_up, _) = zip(*batch[k:k+bp.COMPACT_MAX_POINTS])
+                    scm.write_data(bp.encode_trajectory_compact(q0, q1, pen_up))
+            case 'batch':
+                for k in range(0, len(batch), bp.MAX_BATCH_POINTS):
+                    block = b''.join(point[0] for point in batch[k:k+bp.MAX_BATCH_POINTS])
+                    scm.write_data(bp.encode_trajectory_batch(block))
+            case _:
+                for point in batch:
+                    scm.write_data(bp.encode_trajectory_payload(point[0]))
+
+    @staticmethod
+    def _take(points, pending, credit: int) -> tuple:
+        """
+        Pulls points worth at most `credit` control periods (each point lasts point[4] of them).
+        Returns (batch, pending, exhausted): pending is the next point, pulled but left for the next batch.
+        """
+        batch = []
+        used = 0
+        while True:
+            point = pending if pending is not None else next(points, None)
+            pending = None
+            if point is None:
+                return (batch, None, True)
+            if used + point[4] > credit:
+                return (batch, point, False)
+            batch.append(point)
+            used += point[4]
+
+    async def _send_points(self, points, mode: str):
+        """
+        Online sender (runs on the transport loop).
+        Credit based flow control: keep the firmware queue at the high-water mark.
+        The queue level is estimated from the last buffer_level report, plus the points
+        sent since then, minus the ones the firmware consumed (one every Tc) in the meantime.
+        Levels and credits count control periods: a timed setpoint fills as many of them as it lasts.
+        Between writes the sender awaits the next feedback frame, or the time the firmware
+        needs to free min_batch slots if no report comes first.
+        Returns: (sent_count, last_point, remaining) - remaining is the estimated time to drain the queue
+        """
+        loop = asyncio.get_running_loop()
+        Tc = SETTINGS['Tc']
+        sent_count = 0
+        last_point = None
+        (_, report_seq, _) = state.firmware.get_buffer() # reports older than this run are ignored
+        (ref_level, ref_sent, ref_time) = (0, 0, time())
+        writes = deque() # (time, sent_count) after each recent write, to match reports with what they can account for
+        empty = False
+        full = False
+        exhausted = False
+        pending = None # next point, pulled from the planner but not sent yet
+
+        while not exhausted:
+            if state.stop_requested:
+                print("!!! TRAJECTORY ABORTED BY USER (ONLINE) !!!")
+                break
+
+            (level, seq, t_report) = state.firmware.get_buffer()
+            if seq != report_seq:
+                report_seq = seq
+                # A report only accounts for the points that reached the firmware before it was sent:
+                # the ones written in the last report_latency seconds may still be in transit
+                t_seen = t_report - FLOW_CONTROL['report_latency']
+                while len(writes) > 1 and writes[1][0] <= t_seen:
+                    writes.popleft()
+                seen = writes[0][1] if writes and writes[0][0] <= t_seen else ref_sent
+                (ref_level, ref_sent, ref_time) = (level, max(seen, ref_sent), t_report)
+                # Count each underrun/overrun once, on the report that enters the condition
+                if level == 0 and ref_sent > 0 and not empty:
+                    self.underruns += 1
+                if level >= FLOW_CONTROL['buffer_size'] and not full:
+                    self.overruns += 1
+                empty = level == 0
+                full = level >= FLOW_CONTROL['buffer_size']
+
+            consumed = (time() - ref_time) / Tc
+            estimated = max(0.0, ref_level + (sent_count - ref_sent) - consumed)
+            credit = int(FLOW_CONTROL['high_water'] - estimated)
+
+            if credit >= FLOW_CONTROL['min_batch'] and (pending is None or pending[4] <= credit):
+                # Planning runs off the loop, so feedback keeps being parsed meanwhile
+                (batch, pending, exhausted) = await loop.run_in_executor(None, self._take, points, pending, credit)
+                self._write_points(batch, mode)
+
+                if batch:
+                    prev_count = sent_count
+                    sent_count += sum(point[4] for point in batch)
+                    last_point = batch[-1]
+                    writes.append((time(), sent_count))
+
+                    # Update State for UI Visualization (Commanded Position)
+                    # This allows seeing the arm move even if feedback is silent
+                    state.firmware.update_position(*last_point[1:4])
+
+                    if sent_count // 100 > prev_count // 100:
+                        print(f"Progress: {sent_count} points sent")
+                continue
+
+            # Wait for a report, at most until min_batch points have been consumed
+            timeout = (FLOW_CONTROL['min_batch'] - credit) * Tc
+            await self.transport.wait_frame(min(max(timeout, 0.0), FLOW_CONTROL['max_wait']))
+
+        consumed = (time() - ref_time) / Tc
+        remaining = max(0.0, ref_level + (sent_count - ref_sent) - consumed) * Tc
+        return (sent_count, last_point, remaining)
+
+    def _execute_trajectory(self, chunks, capacity: int = 0):
         """
         Actual execution loop (runs in background thread)
+        The desired trajectory is collected in a Trajectory allocated once for `capacity` samples.
         """
         try:
-            # Total number of points
-            num_points = len(q[0])
-            print(f"Total Trajectory Points: {num_points}")
+            desired = Trajectory(SETTINGS['Tc'], capacity)
+            sent_count = 0
+            last_point = None
             
-            if SETTINGS['ser_started']:
-                # Configuration for Flow Control
-                FIRMWARE_BUFFER_SIZE = 50 
-                BATCH_SIZE = 5            
-                
+            if SETTINGS['ser_started'] and self.transport is not None:
                 # --- EXECUTION ENGINE ---
-                
-                # 1. Fill the buffer initially (Pre-roll)
                 state.reset_recording()
-                start_time = time()
-                
-                sent_count = 0
-                initial_fill = min(num_points, FIRMWARE_BUFFER_SIZE - 5)
-                
-                print(f"Pre-rolling {initial_fill} points...")
-                for i in range(initial_fill):
-                    packet = bp.encode_trajectory_point(
-                        q[0][i], q[1][i],
-                        dq[0][i], dq[1][i],
-                        ddq[0][i], ddq[1][i],
-                        int(q[2][i])
-                    )
-                    scm.write_data(packet)
-                    sent_count += 1
-                    
-                # 2. Main Execution Loop
-                while sent_count < num_points:
-                    if state.stop_requested:
-                        print("!!! TRAJECTORY ABORTED BY USER (ONLINE) !!!")
-                        break
-
-                    sleep(0.04) # Sleep 40ms -> Firmware consumes ~4 points
-                    
-                    # Send a batch of 5 points to top up
-                    limit = min(sent_count + BATCH_SIZE, num_points)
-                    for i in range(sent_count, limit):
-                            packet = bp.encode_trajectory_point(
-                            q[0][i], q[1][i],
-                            dq[0][i], dq[1][i],
-                            ddq[0][i], ddq[1][i],
-                            int(q[2][i])
-                        )
-                            scm.write_data(packet)
-                    
-                    sent_count = limit
-                    
-                    # Update State for UI Visualization (Commanded Position)
-                    # This allows seeing the arm move even if feedback is silent
-                    current_idx = limit - 1
-                    state.firmware.update_position(
-                        q[0][current_idx],
-                        q[1][current_idx],
-                        bool(q[2][current_idx])
-                    )
+                self.underruns = 0
+                self.overruns = 0
+                mode = self._packet_mode()
+                print(f"Trajectory packets: {mode}")
+                self._open_run_log(mode)
+                points = (self._iter_timed_points if mode == 'timed' else self._iter_points)(chunks, desired)
 
-                    if sent_count % 100 == 0:
-                        print(f"Progress: {sent_count}/{num_points}")
+                (sent_count, last_point, remaining) = self.transport.submit(self._send_points(points, mode)).result()
 
                 if state.stop_requested:
                         print("Execution stopped.")
-                else:
-                    print(f"TRJ SENT COMPLETE: {num_points} points")
+                elif last_point is not None:
+                    print(f"TRJ SENT COMPLETE: {sent_count} points")
                     # Ensure final position is set
-                    state.firmware.update_position(q[0][-1], q[1][-1])
-                    
-                    # Wait for the trajectory to finish physically
-                    total_duration = num_points * SETTINGS['Tc']
-                    elapsed = time() - start_time
-                    remaining = total_duration - elapsed
+                    state.firmware.update_position(last_point[1], last_point[2])
                     
+                    # Wait for the firmware queue to drain (trajectory finishes physically)
                     if remaining > 0:
                         print(f"Waiting for trajectory to finish: {remaining:.2f}s")
                         sleep(remaining + 0.5) 
+                print(f"Flow Control: {self.underruns} underruns, {self.overruns} overruns")
                 state.stop_recording()
 
             else:
                 # --- SIMULATION ENGINE ---
                 print("SIMULATION MODE: Playing trajectory locally...")
+                self._open_run_log('simulation')
+                points = self._iter_points(chunks, desired)
                 state.reset_recording()
                 start_time = time()
 
-                for i in range(num_points):
+                for (i, point) in enumerate(points):
                     if state.stop_requested:
                         print("!!! TRAJECTORY ABORTED BY USER (SIMULATION) !!!")
                         break
 
                     # Simula il passare del tempo esatto del controller
                     loop_start = time()
+                    last_point = point
+                    sent_count += 1
 
-                    # Update State
-                    state.firmware.update_position(
-                        q[0][i],
-                        q[1][i],
-                        bool(q[2][i])
-                    )
+                    # Update State (the pose publisher forwards the latest one to the UI)
+                    state.firmware.update_position(*point[1:4])
                     state.firmware.last_update = loop_start
-                    
-                    # Notify UI (Animation) - Optional push, polling handles it too
-                    try:
-                        q0, q1, pen_up = state.firmware.get_position()
-                        eel.js_draw_pose([q0, q1, pen_up])
-                    except:
-                        pass 
 
                     if state.recording_active:
-                        state.rec_data['q0'].append(state.firmware.q0)
-                        state.rec_data['q1'].append(state.firmware.q1)
-                        state.rec_data['t'].append(loop_start)
+                        state.rec_data.record(monotonic(), point[1], point[2])
+                    if self.run_log is not None:
+                        self.run_log.append(monotonic() - self.run_start, run_log.ACTUAL, *point[1:4])
                     
                     # Wait typical sample time
                     # Improving timing accuracy
@@ -232,19 +370,26 @@ class SerialManager:
                         sleep(sleep_time)
                     
                     if i % 100 == 0:
-                        print(f"Sim Progress: {i}/{num_points}")
+                        print(f"Sim Progress: {i} points played")
                 
                 state.stop_recording()
                 print("SIMULATION COMPLETE")
 
-            # Pass desired trajectory data to plotter (Runs after thread finishes)
-            # CAUTION: Plotting might block this thread, which is fine as it's background.
-            plotting.plot_recorded_data(q[0], q[1], SETTINGS['Tc'], state.rec_data)
+            print(f"Total Trajectory Points: {sent_count}")
+            if last_point is not None:
+                state.last_known_q = [last_point[1], last_point[2]]
+
+            # Pass desired trajectory data to the plotting process: the next job does not wait for the figures
+            if len(desired):
+                (des_q0, des_q1, _) = desired.q
+                plotting.submit(plotting.plot_recorded_data, des_q0, des_q1, SETTINGS['Tc'], state.rec_data.snapshot())
 
         except Exception as e:
             print(f"Execution Thread Error: {e}")
             import traceback
             traceback.print_exc()
+        finally:
+            self._close_run_log()
 
 # Global Instance
 serial_manager = SerialManager()
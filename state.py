@@ -1,6 +1,10 @@
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+from typing import List, Optional
 import threading
+from time import time
+
+from lib.recorder import RingRecorder
+from config import RECORDING
 
 @dataclass
 class FirmwareState:
@@ -8,6 +12,9 @@ class FirmwareState:
     q1: float = 0.0
     pen_up: bool = True
     buffer_level: int = 0
+    buffer_seq: int = 0 # number of buffer reports received
+    buffer_time: float = 0 # time of the last buffer report
+    capabilities: int = 0 # RESP_CAPS flags (0 until the firmware answers CMD_CAPS)
     last_update: float = 0
     _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
     
@@ -28,25 +35,38 @@ class FirmwareState:
         """Thread-safe buffer level update"""
         with self._lock:
             self.buffer_level = level
+            self.buffer_seq += 1
+            self.buffer_time = time()
+    
+    def update_capabilities(self, flags: int):
+        """Thread-safe capabilities update"""
+        with self._lock:
+            self.capabilities = flags
+    
+    def get_buffer(self) -> tuple:
+        """Thread-safe buffer report read: (level, seq, time)"""
+        with self._lock:
+            return (self.buffer_level, self.buffer_seq, self.buffer_time)
     
 @dataclass
 class RobotState:
     firmware: FirmwareState = field(default_factory=FirmwareState)
     recording_active: bool = False
     stop_requested: bool = False
-    rec_data: Dict[str, List[float]] = field(default_factory=lambda: {'q0': [], 'q1': [], 't': []})
+    # Bounded, preallocated recorders (lib/recorder.py): t is time.monotonic()
+    rec_data: RingRecorder = field(default_factory=lambda: RingRecorder(('t', 'q0', 'q1'), RECORDING['capacity']))
     last_known_q: List[float] = field(default_factory=lambda: [0.0, 0.0])
     
     # Logging data
-    log_data: Dict[str, List] = field(default_factory=lambda: {
-        'time': [], 'q0': [], 'q1': [], 'dq0': [], 'dq1': [],
-        'ddq0': [], 'ddq1': [], 'q0_actual': [], 'q1_actual': [],
-        'dq0_actual': [], 'dq1_actual': [], 'ddq0_actual': [], 'ddq1_actual': [],
-        'x': [], 'y': [], 'x_actual': [], 'y_actual': []
-    })
+    log_data: RingRecorder = field(default_factory=lambda: RingRecorder((
+        'time', 'q0', 'q1', 'dq0', 'dq1',
+        'ddq0', 'ddq1', 'q0_actual', 'q1_actual',
+        'dq0_actual', 'dq1_actual', 'ddq0_actual', 'ddq1_actual',
+        'x', 'y', 'x_actual', 'y_actual'
+    ), RECORDING['log_capacity']))
 
     def reset_recording(self):
-        self.rec_data = {'q0': [], 'q1': [], 't': []}
+        self.rec_data.clear()
         self.recording_active = True
 
     def stop_recording(self):
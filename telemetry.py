@@ -0,0 +1,75 @@
+"""
+Pose telemetry towards the GUI.
+One publisher owns every pose update sent to the browser: producers only update state.firmware, and the
+publisher sends the latest pose (older ones are coalesced, never queued). At most one update is in flight:
+the next one waits for the browser to acknowledge the previous one (the return value of js_draw_pose),
+and the publishing interval follows the measured round trip, so a slow panel gets fewer frames instead
+of a growing eel message queue.
+"""
+
+import threading
+from time import time
+
+import eel
+from state import state
+from config import TELEMETRY
+
+def _eel_send(pose, ack):
+    eel.js_draw_pose(pose)(ack, ack) # a JS error acknowledges too: the page is alive
+
+class PosePublisher:
+    def __init__(self, send=_eel_send, clock=time):
+        self.send = send # send(pose, ack): ack() must be called once the browser has handled the pose
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.interval = TELEMETRY['min_interval']
+        self.rtt = None # s, smoothed round trip of the acknowledgements
+        self.in_flight = None # send time of the unacknowledged update
+        self.last_sent = -float('inf')
+        self.last_pose = None
+        # Counters
+        self.sent = 0
+        self.acked = 0
+        self.skipped = 0 # ticks with a new pose that could not be sent (coalesced into a later update)
+        self.errors = 0
+
+    def tick(self):
+        """Sends the latest pose if it changed (or the keepalive expired) and the browser is ready for it"""
+        pose = list(state.firmware.get_position())
+        now = self.clock()
+        with self._lock:
+            changed = pose != self.last_pose
+            if not changed and now - self.last_sent < TELEMETRY['keepalive']:
+                return
+            if self.in_flight is not None and now - self.in_flight < TELEMETRY['ack_timeout']:
+                self.skipped += changed
+                return
+            if now - self.last_sent < self.interval:
+                self.skipped += changed
+                return
+            (self.in_flight, self.last_sent, self.last_pose) = (now, now, pose)
+            self.sent += 1
+        try:
+            self.send(pose, lambda *_, sent=now: self._ack(sent))
+        except Exception as e:
+            # Retried at the next tick: only the first failure is reported
+            with self._lock:
+                (self.in_flight, self.last_pose) = (None, None)
+                self.errors += 1
+                first = self.errors == 1
+            if first:
+                print(f"Telemetry Error: {e}")
+
+    def _ack(self, sent: float):
+        now = self.clock()
+        with self._lock:
+            if self.in_flight != sent: # late ack of an update given up on
+                return
+            self.in_flight = None
+            self.acked += 1
+            rtt = now - sent
+            self.rtt = rtt if self.rtt is None else 0.8*self.rtt + 0.2*rtt
+            self.interval = min(max(2*self.rtt, TELEMETRY['min_interval']), TELEMETRY['max_interval'])
+
+# Global Instance
+pose_publisher = PosePublisher()
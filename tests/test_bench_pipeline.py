@@ -0,0 +1,31 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import json
+import bench_pipeline as bench
+
+def test_workloads_are_fixed():
+    assert bench.text_workload() == bench.text_workload()
+    workloads = bench.default_workloads()
+    assert {'text', 'circles', 'template:shapes'} <= set(workloads)
+
+def test_benchmark_report_is_json():
+    patches = bench.template_workloads()['template:shapes'][:6]
+    results = bench.run_benchmarks({'small': patches}, mode='batch', repeat=1)
+    w = json.loads(json.dumps(results))['workloads']['small']
+    assert set(w['stages']) == set(bench.STAGES)
+    assert w['points'] > 0 and w['points_per_s'] > 0
+    assert w['setpoints'] == w['points'] and w['wire_bytes'] > 0
+    assert w['time_to_first_packet'] > 0 and w['peak_memory_bytes'] > 0
+
+    timed = bench.run_benchmarks({'small': patches}, mode='timed', repeat=1, serial=False)['workloads']['small']
+    assert timed['points'] == w['points'] and timed['setpoints'] < w['setpoints']
+
+if __name__ == "__main__":
+    test_workloads_are_fixed()
+    test_benchmark_report_is_json()
+    print("ALL CHECKS PASSED")
@@ -0,0 +1,101 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import struct
+import numpy as np
+from lib import binary_protocol as bp
+
+def random_setpoints(n):
+    rng = np.random.default_rng(0)
+    values = [rng.uniform(-3, 3, n) for _ in range(6)]
+    pen = rng.integers(0, 2, n)
+    return values, pen
+
+def test_packed_setpoint_matches_single_packet():
+    (values, pen) = random_setpoints(20)
+    setpoints = bp.pack_setpoints(*values, pen)
+    assert len(setpoints) == 20*bp.SETPOINT_SIZE
+    for i in range(20):
+        payload = setpoints[i*bp.SETPOINT_SIZE:(i+1)*bp.SETPOINT_SIZE]
+        expected = bp.encode_trajectory_point(*(v[i] for v in values), bool(pen[i]))
+        assert bp.encode_trajectory_payload(payload) == expected
+
+def test_trajectory_batch_frame():
+    (values, pen) = random_setpoints(40)
+    packet = bp.encode_trajectory_batch(bp.pack_setpoints(*values, pen))
+    assert packet[:3] == bytes([bp.START_BYTE_1, bp.START_BYTE_2, bp.CMD_TRAJECTORY_BATCH])
+    assert packet[3] == 40
+    assert len(packet) == 2 + 1 + 1 + 40*bp.SETPOINT_SIZE + 4
+    assert struct.unpack('<I', packet[-4:])[0] == bp.calculate_crc32(packet[2:-4])
+    decoded = np.frombuffer(packet[4:-4], dtype=bp.SETPOINT_DTYPE)
+    assert np.array_equal(decoded['q0'], values[0].astype(np.float32))
+    assert np.array_equal(decoded['ddq1'], values[5].astype(np.float32))
+    assert np.array_equal(decoded['pen_up'], pen)
+
+def test_trajectory_batch_rejects_bad_blocks():
+    for block in (b'', b'\x00'*(bp.SETPOINT_SIZE+1), b'\x00'*(bp.SETPOINT_SIZE*(bp.MAX_BATCH_POINTS+1))):
+        try:
+            bp.encode_trajectory_batch(block)
+        except ValueError:
+            continue
+        assert False, f"{len(block)} bytes accepted"
+
+def test_decode_caps_feedback():
+    body = bytes([bp.RESP_CAPS, bp.CAP_TRAJECTORY_BATCH])
+    packet = bytes([bp.START_BYTE_1, bp.START_BYTE_2]) + body + struct.pack('<I', bp.calculate_crc32(body))
+    assert bp.decode_feedback(packet) == {'type': bp.RESP_CAPS, 'capabilities': bp.CAP_TRAJECTORY_BATCH}
+    assert bp.decode_feedback(packet[:-1] + b'\x00') is None
+
+def test_compact_round_trip_int16():
+    t = np.linspace(0, 1, bp.COMPACT_MAX_POINTS)
+    q0 = 0.7 - 0.4*np.sin(2*np.pi*t)
+    q1 = -2.1 + 0.3*t**2
+    pen = (t > 0.5).astype(int)
+    packet = bp.encode_trajectory_compact(q0, q1, pen)
+    assert packet[4] == 2 # int16 deltas
+    (d0, d1, dpen) = bp.decode_trajectory_compact(packet)
+    assert np.max(np.abs(d0-q0)) <= bp.POSITION_LSB/2 + 1e-12
+    assert np.max(np.abs(d1-q1)) <= bp.POSITION_LSB/2 + 1e-12
+    assert np.array_equal(dpen, pen)
+    # 7x smaller than single CMD_TRAJECTORY packets
+    assert 7*len(packet) < len(q0)*len(bp.encode_trajectory_point(0, 0, 0, 0, 0, 0, 0))
+
+def test_compact_round_trip_int24_and_single_point():
+    q0 = np.array([0.0, 0.5, -0.2, 1.0])
+    q1 = np.array([1.0, 1.0, 1.5, 0.1])
+    packet = bp.encode_trajectory_compact(q0, q1, [1, 0, 1, 1])
+    assert packet[4] == 3 # steps over 0.33 rad need int24 deltas
+    (d0, d1, dpen) = bp.decode_trajectory_compact(packet)
+    assert np.allclose(d0, q0, atol=bp.POSITION_LSB) and np.allclose(d1, q1, atol=bp.POSITION_LSB)
+    assert dpen.tolist() == [1, 0, 1, 1]
+
+    (d0, d1, dpen) = bp.decode_trajectory_compact(bp.encode_trajectory_compact([0.25], [-0.5], [0]))
+    assert d0.tolist() == [0.25] and d1.tolist() == [-0.5] and dpen.tolist() == [0]
+
+def test_compact_rejects_corruption():
+    packet = bytearray(bp.encode_trajectory_compact(np.linspace(0, 0.1, 10), np.zeros(10), np.zeros(10)))
+    packet[8] ^= 0xFF
+    assert bp.decode_trajectory_compact(bytes(packet)) is None
+    assert bp.decode_trajectory_compact(bytes(packet[:-1])) is None
+
+def test_timed_round_trip():
+    ((q0, q1, *_), pen) = random_setpoints(30)
+    ticks = np.arange(1, 31)
+    packet = bp.encode_trajectory_timed(q0, q1, ticks, pen)
+    assert len(packet) == 4 + 30*bp.TIMED_SETPOINT_SIZE + 4
+    decoded = bp.decode_trajectory_timed(packet)
+    assert np.array_equal(decoded['q0'], q0.astype('<f4')) and np.array_equal(decoded['q1'], q1.astype('<f4'))
+    assert np.array_equal(decoded['ticks'], ticks) and np.array_equal(decoded['pen_up'], pen)
+
+    corrupted = bytearray(packet)
+    corrupted[6] ^= 0x01
+    assert bp.decode_trajectory_timed(bytes(corrupted)) is None
+    for bad in ([0], [256]):
+        try:
+            bp.encode_trajectory_timed([0.0], [0.0], bad, [0])
+            assert False, "duration out of range accepted"
+        except ValueError:
+            pass
@@ -0,0 +1,27 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from lib import char_gen
+
+def test_text_is_assembled_from_cached_glyphs():
+    char_gen.glyph_polylines.cache_clear()
+    patches = char_gen.text_to_traj("OBO", (0.1, 0.2), 0.02, 0.004)
+    info = char_gen.glyph_polylines.cache_info()
+    assert (info.misses, info.hits) == (2, 1)
+
+    # every 'O' is the same glyph, translated by the advance of the cursor
+    ring = [p for p in patches if not p['data']['penup']]
+    o = len(char_gen.glyph_polylines('O', 0.02)[0]) - 1
+    (first, last) = (np.array([p['points'] for p in ring[:o]]), np.array([p['points'] for p in ring[-o:]]))
+    assert np.allclose(last - first, [2*(0.02*0.8 + 0.004), 0])
+
+    # lowercase letters use the same glyphs
+    assert char_gen.text_to_traj("obo", (0.1, 0.2), 0.02, 0.004) == patches
+
+if __name__ == "__main__":
+    test_text_is_assembled_from_cached_glyphs()
+    print("ALL CHECKS PASSED")
@@ -0,0 +1,90 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import serial
+import numpy as np
+from lib import binary_protocol as bp
+from lib.firmware_sim import VirtualFirmware
+from lib.frame_parser import FrameParser
+
+def read_feedback(port, parser, duration):
+    feedback = []
+    end = time.time() + duration
+    while time.time() < end:
+        n = port.readinto(parser.writable())
+        parser.commit(n or 0)
+        feedback += [bp.decode_feedback(bytes(frame)) for frame in parser.frames_ready()]
+        time.sleep(0.002)
+    return feedback
+
+def test_firmware_consumes_at_Tc_and_reports_level():
+    fw = VirtualFirmware(Tc=0.005, buffer_size=20, pos_every=1000)
+    port = serial.Serial(fw.start(), timeout=0)
+    parser = FrameParser()
+    try:
+        port.write(bp.encode_caps_command())
+        q = np.linspace(0, 1, 30)
+        setpoints = bp.pack_setpoints(q, -q, q, q, q, q, np.zeros(30))
+        port.write(bp.encode_trajectory_batch(setpoints[:10*bp.SETPOINT_SIZE]))
+        port.write(bp.encode_trajectory_compact(q[10:], -q[10:], np.zeros(20)))
+        feedback = read_feedback(port, parser, 0.3)
+
+        assert {'type': bp.RESP_CAPS, 'capabilities': fw.capabilities} in feedback
+        levels = [f['buffer_level'] for f in feedback if f['type'] == bp.RESP_STATUS]
+        assert max(levels) <= 20 and levels[-1] == 0
+        assert fw.stats['points'] == 30 and fw.stats['overflow'] > 0
+        assert fw.stats['consumed'] == 30 - fw.stats['overflow']
+        assert fw.stats['underruns'] == 1
+
+        port.write(bp.encode_pos_command())
+        feedback = read_feedback(port, parser, 0.05)
+        (q0, q1) = (float(np.float32(fw.q[0])), float(np.float32(fw.q[1]))) # sent as float32
+        assert {'type': bp.RESP_POS, 'q0': q0, 'q1': q1} in feedback
+    finally:
+        port.close()
+        fw.stop()
+
+def test_injected_faults():
+    fw = VirtualFirmware(Tc=0.002, latency=0.05, drop_rate=0.2, corrupt_rate=0.2, seed=1)
+    port = serial.Serial(fw.start(), timeout=0)
+    parser = FrameParser()
+    try:
+        start = time.time()
+        port.write(bp.encode_pos_command())
+        while not any(f and f['type'] == bp.RESP_POS for f in read_feedback(port, parser, 0.005)):
+            assert time.time() - start < 1.0
+        assert time.time() - start >= 0.05
+
+        read_feedback(port, parser, 0.3)
+        assert fw.stats['dropped'] > 0 and fw.stats['corrupted'] > 0
+        assert parser.crc_errors > 0
+    finally:
+        port.close()
+        fw.stop()
+
+def test_timed_setpoints_are_interpolated():
+    fw = VirtualFirmware(Tc=3600.0, buffer_size=100) # no consumption: the queue keeps every point
+    port = serial.Serial(fw.start(), timeout=0)
+    try:
+        port.write(bp.encode_trajectory_timed([0.1, 0.1, 0.5], [0.0, -0.4, -0.4], [1, 4, 2], [1, 0, 0]))
+        start = time.time()
+        while fw.stats['points'] < 7:
+            assert time.time() - start < 1.0
+            time.sleep(0.005)
+        (q0, q1, pen_up) = zip(*fw.queue)
+        assert np.allclose(q0, [0.1, 0.1, 0.1, 0.1, 0.1, 0.3, 0.5])
+        assert np.allclose(q1, [0.0, -0.1, -0.2, -0.3, -0.4, -0.4, -0.4])
+        assert pen_up == (True,) + (False,)*6
+    finally:
+        port.close()
+        fw.stop()
+
+if __name__ == "__main__":
+    test_firmware_consumes_at_Tc_and_reports_level()
+    test_injected_faults()
+    test_timed_setpoints_are_interpolated()
+    print("ALL CHECKS PASSED")
@@ -0,0 +1,50 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import struct
+from lib import binary_protocol as bp
+from lib.frame_parser import FrameParser
+
+def response(resp_type: int, payload: bytes) -> bytes:
+    body = bytes([resp_type]) + payload
+    return bytes([bp.START_BYTE_1, bp.START_BYTE_2]) + body + struct.pack('<I', bp.calculate_crc32(body))
+
+def pos(q0, q1):
+    return response(bp.RESP_POS, struct.pack('<ff', q0, q1))
+
+def status(level):
+    return response(bp.RESP_STATUS, bytes([level]))
+
+def decoded(parser):
+    return [bp.decode_feedback(bytes(frame)) for frame in parser.frames_ready()]
+
+def test_parser_extracts_frames_across_reads():
+    parser = FrameParser()
+    stream = b'\x00\x13' + pos(0.5, -1.25) + status(17) + pos(1.0, 2.0)
+    parser.feed(stream[:10])
+    assert decoded(parser) == []
+    parser.feed(stream[10:30])
+    assert decoded(parser) == [{'type': bp.RESP_POS, 'q0': 0.5, 'q1': -1.25}, {'type': bp.RESP_STATUS, 'buffer_level': 17}]
+    parser.feed(stream[30:])
+    assert decoded(parser) == [{'type': bp.RESP_POS, 'q0': 1.0, 'q1': 2.0}]
+    assert parser.stats() == {'frames': 3, 'crc_errors': 0, 'resync_bytes': 2}
+    assert parser.available() == 0
+
+def test_parser_wraps_around_the_ring():
+    parser = FrameParser(capacity=32)
+    for k in range(50): # 15 byte frames never align with the 32 byte ring
+        parser.feed(pos(k, -k))
+        assert decoded(parser) == [{'type': bp.RESP_POS, 'q0': float(k), 'q1': float(-k)}]
+    assert parser.frames == 50
+
+def test_parser_drops_corrupted_frames():
+    parser = FrameParser()
+    bad = bytearray(pos(0.1, 0.2))
+    bad[5] ^= 0x01
+    parser.feed(bytes(bad) + status(3))
+    assert decoded(parser) == [{'type': bp.RESP_STATUS, 'buffer_level': 3}]
+    assert parser.crc_errors == 1
+    assert parser.resync_bytes == len(bad) - 1
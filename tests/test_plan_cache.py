@@ -0,0 +1,62 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import numpy as np
+import planner
+from config import SETTINGS
+from lib import char_gen
+from lib.plan_cache import PlanCache
+from lib.trajectory import Trajectory
+
+def joint_samples(chunks):
+    chunks = list(chunks)
+    return (np.vstack([np.concatenate([c[0][k] for c in chunks]) for k in range(3)]),
+            np.vstack([np.concatenate([c[1][k] for c in chunks]) for k in range(2)]))
+
+def test_cached_job_replays_the_same_plan(tmp_path):
+    patches = char_gen.text_to_traj("HO", (0.1, 0.1), 0.03, 0.006)
+    start = [0.2, 0.05]
+    (q, dq) = joint_samples(planner.plan_stream(planner.order_strokes(patches, start)))
+    assert np.array_equal(joint_samples(planner.plan_job(patches, start))[0], q)
+
+    cache = PlanCache(str(tmp_path), 10**7)
+    stream = planner.plan_job(patches, start, cache)
+    next(stream)
+    assert not cache.entries() # stored only once the whole job has been planned
+    (miss, _) = joint_samples(stream)
+    assert (cache.misses, len(cache.entries())) == (1, 1)
+
+    (q_hit, dq_hit) = joint_samples(planner.plan_job(patches, start, cache))
+    assert cache.hits == 1
+    assert np.array_equal(q_hit, q) and np.allclose(dq_hit, dq, rtol=1e-6, atol=1e-5)
+
+    # another start: same job, only the pen-up travel in front of it changes
+    (q_far, _) = joint_samples(planner.plan_job(patches, [0.15, 0.2], cache))
+    assert cache.hits == 2 and q_far.shape[1] != q.shape[1]
+    body = q.shape[1] - np.flatnonzero(q[2] == 0)[0]
+    assert np.array_equal(q_far[:, -body:], q[:, -body:])
+
+def test_key_depends_on_settings(monkeypatch):
+    patches = char_gen.text_to_traj("A", (0.1, 0.1), 0.03, 0.006)
+    key = planner.job_key(patches)
+    assert planner.job_key(char_gen.text_to_traj("A", (0.1, 0.1), 0.03, 0.006)) == key
+    monkeypatch.setitem(planner.TIME_OPTIMAL, 'blend_tolerance', 1e-4)
+    assert planner.job_key(patches) != key
+
+def test_least_recently_used_plans_are_evicted(tmp_path):
+    patches = char_gen.text_to_traj("I", (0.1, 0.1), 0.03, 0.006)
+    trj = Trajectory.from_chunks(planner.stream_samples(patches), SETTINGS['Tc'],
+                                 int(planner.sample_counts(patches).sum()))
+    cache = PlanCache(str(tmp_path), int(2.5*trj.nbytes))
+    for key in ('a', 'b'):
+        cache.put(key, trj)
+        time.sleep(0.01)
+    assert cache.get('a', trj.Tc) is not None # 'a' is now more recent than 'b'
+    time.sleep(0.01)
+    cache.put('c', trj)
+    assert sorted(os.path.basename(path) for (_, _, path) in cache.entries()) == ['a.npy', 'c.npy']
+    assert np.array_equal(cache.get('c', trj.Tc).data, trj.data)
@@ -0,0 +1,131 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import planner
+from lib import char_gen
+
+def stitched_reference(patches):
+    parts = []
+    for stroke in planner.group_strokes(patches):
+        (q, dq, ddq, penups, _) = planner.slice_stroke(stroke)
+        parts.append(np.vstack((q, dq, ddq, penups))[:, (1 if parts else 0):])
+    return np.hstack(parts)
+
+def test_stream_matches_stitched_trajectory(monkeypatch):
+    monkeypatch.setattr(planner, 'limit_scale_factor', lambda dq, ddq: (0.0, 0.0, 1.0))
+    patches = char_gen.text_to_traj("HO", (0.1, 0.05), 0.03, 0.006)
+    reference = stitched_reference(patches)
+
+    chunks = list(planner.plan_stream(patches))
+    stream = np.vstack([np.hstack([c[0][k] for c in chunks]) for k in range(2)]
+                       + [np.hstack([c[i][k] for c in chunks]) for i in (1, 2) for k in range(2)]
+                       + [np.hstack([c[0][2] for c in chunks])])
+    assert np.array_equal(stream, reference)
+    assert sum(len(c[3]) for c in chunks) == reference.shape[1]*planner.bp.SETPOINT_SIZE
+
+def test_stream_has_no_spikes_at_seams():
+    # every stroke starts and ends at rest: the stitched velocity is continuous
+    patches = char_gen.text_to_traj("HI", (0.1, 0.05), 0.03, 0.006)
+    dq0 = np.concatenate([c[1][0] for c in planner.stream_samples(patches)])
+    assert np.abs(np.diff(dq0)).max() < 0.1*np.abs(dq0).max()
+
+def test_stream_slows_patches_over_limits(monkeypatch):
+    monkeypatch.setitem(planner.TIME_OPTIMAL, 'enabled', False)
+    monkeypatch.setattr(planner, 'MAX_ACC_TOLERANCE_FACTOR', 2.0) # limit below the cycloidal peak acceleration
+    patch = {'type': 'line', 'points': [[0.2, 0.0], [0.15, 0.1]], 'data': {'penup': False}}
+    ((q, dq, ddq),) = planner.stream_samples([patch])
+    assert len(q[0]) > planner.slice_patch(patch)[0].shape[1]
+    assert planner.limit_scale_factor(dq, ddq)[2] == 1.0
+
+def test_text_job_within_limits():
+    patches = char_gen.text_to_traj("HELLO 0123\nSQUID 8", (-0.1, 0.2), 0.025, 0.005)
+    chunks = list(planner.stream_samples(patches))
+    dq = [np.concatenate([c[1][k] for c in chunks]) for k in range(2)]
+    ddq = [np.concatenate([c[2][k] for c in chunks]) for k in range(2)]
+    (max_v, max_a, _) = planner.limit_scale_factor(dq, ddq)
+    assert max_v <= planner.MAX_SPEED_RAD
+    assert max_a <= planner.SETTINGS['max_acc']*planner.MAX_ACC_TOLERANCE_FACTOR
+
+def test_sample_counts_match_cycloidal_slicing(monkeypatch):
+    monkeypatch.setitem(planner.TIME_OPTIMAL, 'enabled', False)
+    patches = char_gen.text_to_traj("O", (0.1, 0.1), 0.03, 0.006)
+    assert planner.sample_counts(patches).tolist() == [len(planner.slice_patch(patch)[3]) for patch in patches]
+
+def test_retime_divides_the_derivatives():
+    patch = {'type': 'line', 'points': [[0.2, 0.0], [0.15, 0.1]], 'data': {'penup': False}}
+    (q, dq, ddq, penups, _) = planner.slice_patch(patch)
+    (rq, rdq, rddq, rpenups) = planner.retime(q, dq, ddq, penups, 2.0)
+    assert rq.shape[1] == len(rpenups) == 2*(q.shape[1] - 1) + 1
+    assert np.allclose(rq[:, [0, -1]], q[:, [0, -1]])
+    assert np.isclose(np.abs(rdq).max(), np.abs(dq).max()/2) and np.isclose(np.abs(rddq).max(), np.abs(ddq).max()/4)
+    # positions and velocities stay consistent on the new time base
+    assert np.allclose(np.gradient(rq, planner.SETTINGS['Tc'], axis=1)[:, 1:-1], rdq[:, 1:-1], atol=0.02*np.abs(rdq).max())
+
+def test_time_optimal_stream_is_faster_within_limits(monkeypatch):
+    patches = char_gen.text_to_traj("HI", (0.1, 0.05), 0.03, 0.006)
+    topp = list(planner.stream_samples(patches))
+    (_, _, scale) = planner.limit_scale_factor(
+        [np.concatenate([c[1][k] for c in topp]) for k in range(2)],
+        [np.concatenate([c[2][k] for c in topp]) for k in range(2)])
+    assert scale < 1.001
+    monkeypatch.setitem(planner.TIME_OPTIMAL, 'enabled', False)
+    cycloidal = list(planner.stream_samples(patches))
+    assert sum(len(c[0][0]) for c in topp) < 0.8*sum(len(c[0][0]) for c in cycloidal)
+
+def test_letter_is_drawn_without_stopping():
+    # the ellipse of the 'O' is sampled into short lines: they are blended into one stroke
+    patches = char_gen.text_to_traj("O", (0.1, 0.05), 0.03, 0.006)
+    strokes = list(planner.group_strokes(patches))
+    assert len(strokes) == 1 and len(strokes[0]) > len(patches)
+    ((q, dq, ddq),) = planner.stream_samples(patches)
+    speed = np.hypot(dq[0], dq[1])
+    assert (speed[5:-5] > 0.05*speed.max()).all() # at rest only at the two ends
+    assert planner.limit_scale_factor(dq, ddq)[2] < 1.001
+
+def test_order_strokes_reduces_travel_time():
+    patches = char_gen.text_to_traj("OH 8", (0.05, 0.1), 0.03, 0.006)
+    start = [0.1, 0.25]
+    ordered = planner.order_strokes(patches, start)
+    assert ordered[0]['data']['penup'] and ordered[0]['points'][0] == start
+    # same drawing, strokes possibly reversed
+    segments = lambda ps: sorted(sorted(map(tuple, p['points'])) for p in ps if not p['data']['penup'])
+    assert segments(ordered) == segments(patches)
+    for (a, b) in zip(ordered, ordered[1:]):
+        assert np.allclose(a['points'][1], b['points'][0])
+
+    def travel(ps):
+        ends = np.array([p['points'] for p in ps if p['data']['penup']], dtype=float)
+        (q0, _) = planner.tpy.ik_batch(ends[:, 0, 0], ends[:, 0, 1], planner.SIZES)
+        (q1, _) = planner.tpy.ik_batch(ends[:, 1, 0], ends[:, 1, 1], planner.SIZES)
+        return planner.travel_time(np.hstack((ends[:, 0].T, ends[:, 1].T)), np.hstack((q0, q1)),
+                                   np.arange(len(ends)), np.arange(len(ends), 2*len(ends))).sum()
+    original = [{'type': 'line', 'points': [start, patches[0]['points'][0]], 'data': {'penup': True}}] + patches
+    assert travel(ordered) < 0.9*travel(original)
+
+def test_order_strokes_reverses_strokes():
+    stroke = [{'type': 'line', 'points': [[0.10, 0.2], [0.12, 0.2]], 'data': {'penup': False}},
+              {'type': 'circle', 'points': [[0.12, 0.2], [0.14, 0.2]], 'data': {'penup': False, 'center': [0.13, 0.2]}}]
+    ordered = planner.order_strokes(stroke, [0.14, 0.2])
+    assert [p['points'] for p in ordered[1:]] == [[[0.14, 0.2], [0.12, 0.2]], [[0.12, 0.2], [0.10, 0.2]]]
+    assert ordered[1]['data']['center'] == [0.13, 0.2]
+
+def test_adaptive_keyframes_within_tolerance():
+    patches = char_gen.text_to_traj("OK", (0.1, 0.1), 0.03, 0.006)
+    chunks = list(planner.stream_samples(patches))
+    (q0, q1, pen) = (np.concatenate([c[0][k] for c in chunks]) for k in range(3))
+    tolerance = 5e-5
+
+    # the firmware interpolation of the keyframes, one point per control period
+    keyframes = list(planner.stream_keyframes(planner.stream_packets(chunks), tolerance, 20))
+    (k0, k1, kpen, ticks) = (np.concatenate([c[4][k] for c in keyframes]) for k in range(4))
+    assert ticks.sum() == len(q0) and ticks.max() <= 20 and len(ticks) < 0.6*len(q0)
+    t = np.cumsum(ticks) - 1 # control period reached by each keyframe
+    executed = np.array([np.interp(np.arange(len(q0)), t, k) for k in (k0, k1)])
+    xy = planner.tpy.dk_batch(q0, q1, planner.SIZES)[:2]
+    exy = planner.tpy.dk_batch(executed[0], executed[1], planner.SIZES)[:2]
+    assert np.hypot(*(xy - exy)).max() <= tolerance
+    assert np.array_equal(np.repeat(kpen, ticks), pen != 0) # the pen never changes inside a span
@@ -0,0 +1,28 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import subprocess
+import numpy as np
+import plotting
+
+def test_matplotlib_is_imported_lazily():
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    out = subprocess.run([sys.executable, '-c', "import sys, plotting; print('matplotlib' in sys.modules)"],
+                         cwd=root, capture_output=True, text=True)
+    assert out.stdout.strip() == 'False'
+
+def test_plots_are_rendered_by_a_worker_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('images')
+    try:
+        assert plotting.submit(os.getpid).result(timeout=60) != os.getpid()
+        t = np.linspace(0.0, 1.0, 200)
+        rec = {'t': 2.0 + t, 'q0': np.sin(t), 'q1': np.cos(t)}
+        future = plotting.submit(plotting.plot_recorded_data, np.sin(t), np.cos(t), 1/199, rec)
+        future.result(timeout=60)
+        assert os.path.getsize('images/recorded_trajectory.png') > 0 and os.path.getsize('images/recorded_xy.png') > 0
+    finally:
+        plotting.shutdown(wait=True)
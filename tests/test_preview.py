@@ -0,0 +1,65 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+import planner
+from config import SETTINGS, SIZES
+from lib import char_gen
+from lib import preview
+from lib import trajpy as tpy
+from lib.trajectory import Trajectory
+
+def distance_to_polyline(px, py, x, y):
+    """Distance of every point (px, py) from the polyline (x, y)"""
+    (ax, ay, bx, by) = (x[:-1, None], y[:-1, None], x[1:, None], y[1:, None])
+    (dx, dy) = (bx - ax, by - ay)
+    t = np.clip(((px - ax)*dx + (py - ay)*dy)/np.where(dx*dx + dy*dy > 0, dx*dx + dy*dy, 1.0), 0.0, 1.0)
+    return np.hypot(px - ax - t*dx, py - ay - t*dy).min(axis=0)
+
+def test_preview_is_within_tolerance():
+    patches = char_gen.text_to_traj("SO", (0.1, 0.1), 0.03, 0.006)
+    trj = Trajectory.from_chunks(planner.stream_samples(patches), SETTINGS['Tc'],
+                                 int(planner.sample_counts(patches).sum()))
+    (x, y, _) = tpy.dk_batch(trj.q[0], trj.q[1], SIZES)
+    pen = trj.q[2]
+    tolerance = 2e-4
+    keep = preview.decimate(x, y, pen, tolerance)
+    assert len(keep) < 0.3*len(x)
+    assert np.all(np.diff(keep) > 0) and keep[0] == 0 and keep[-1] == len(x) - 1
+
+    # pen changes survive, and every sample is within tolerance of the preview of its run
+    changes = np.flatnonzero(pen[1:] != pen[:-1]) + 1
+    assert np.isin(changes, keep).all() and np.isin(changes - 1, keep).all()
+    bounds = np.concatenate(([0], changes, [len(x)]))
+    for (a, b) in zip(bounds[:-1], bounds[1:]):
+        k = keep[(keep >= a) & (keep < b)]
+        if len(k) > 1:
+            assert distance_to_polyline(x[a:b], y[a:b], x[k], y[k]).max() <= tolerance
+
+    points = preview.unpack(preview.pack(x[keep], y[keep], pen[keep]))
+    assert points.shape == (len(keep), 3)
+    assert np.allclose(points[:, 0], x[keep], atol=1e-7) and np.array_equal(points[:, 2], pen[keep])
+
+def test_patch_preview_follows_geometry():
+    tolerance = 2e-4
+    patches = [
+        {'type': 'line', 'points': [[0.1, 0.0], [0.2, 0.0]], 'data': {'penup': True}},
+        {'type': 'line', 'points': [[0.2, 0.0], [0.2, 0.1]], 'data': {'penup': False}},
+        {'type': 'circle', 'points': [[0.2, 0.1], [0.1, 0.1]], 'data': {'penup': False, 'center': [0.15, 0.1]}},
+    ]
+    (x, y, pen) = preview.sample_patches(patches, tolerance)
+    # the pen-down stroke starts with a move and is not split at its junctions
+    assert pen[:3].all() and not pen[3:].any()
+    assert np.allclose([x[-1], y[-1]], [0.1, 0.1])
+    # chords stay within tolerance of the arc: their midpoints are close to the radius
+    (mx, my) = ((x[3:-1] + x[4:])/2, (y[3:-1] + y[4:])/2)
+    assert (0.05 - np.hypot(mx - 0.15, my - 0.1)).max() <= tolerance
+    assert len(x) < 0.1*np.pi*0.05/tolerance
+
+if __name__ == "__main__":
+    test_preview_is_within_tolerance()
+    test_patch_preview_follows_geometry()
+    print("ALL CHECKS PASSED")
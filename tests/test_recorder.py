@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import tracemalloc
+import numpy as np
+from lib.recorder import RingRecorder
+
+def test_ring_keeps_the_latest_samples():
+    rec = RingRecorder(('t', 'q0'), 8)
+    assert len(rec) == 0 and len(rec['t']) == 0
+    for k in range(5):
+        rec.record(float(k), -float(k))
+    assert rec['t'].tolist() == [0, 1, 2, 3, 4] and rec['q0'].tolist() == [0, -1, -2, -3, -4]
+    for k in range(5, 20):
+        rec.record(float(k), -float(k))
+    assert len(rec) == 8 and rec.dropped == 12
+    assert rec['t'].tolist() == list(range(12, 20))
+    rec.clear()
+    assert len(rec) == 0 and rec.dropped == 0
+
+def test_recording_does_not_allocate():
+    rec = RingRecorder(('t', 'q0', 'q1'), 1000)
+    values = [(float(k), 0.5, -0.5) for k in range(5000)]
+    tracemalloc.start()
+    try:
+        for v in values:
+            rec.record(*v)
+        assert tracemalloc.get_traced_memory()[1] < 4096 # a few temporaries, nothing per sample
+    finally:
+        tracemalloc.stop()
+
+def test_snapshots_are_consistent_while_recording():
+    rec = RingRecorder(('t', 'q0'), 64)
+    done = threading.Event()
+    def produce():
+        k = 0
+        while not done.is_set():
+            rec.record(float(k), 2.0*k)
+            k += 1
+    producer = threading.Thread(target=produce)
+    producer.start()
+    try:
+        for _ in range(2000):
+            snap = rec.snapshot()
+            assert len(snap['t']) <= 64
+            assert np.all(np.diff(snap['t']) == 1) and np.array_equal(snap['q0'], 2*snap['t'])
+    finally:
+        done.set()
+        producer.join()
+
+if __name__ == "__main__":
+    test_ring_keeps_the_latest_samples()
+    test_recording_does_not_allocate()
+    test_snapshots_are_consistent_while_recording()
+    print("ALL CHECKS PASSED")
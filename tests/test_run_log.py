@@ -0,0 +1,38 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from lib import run_log
+
+def test_run_is_read_back_zero_copy(tmp_path):
+    writer = run_log.new_run(str(tmp_path), {'mode': 'test'})
+    n = run_log.GROW_RECORDS + 1000 # the file has to grow once
+    t = 0.01*np.arange(n)
+    writer.extend(t, run_log.DESIRED, np.sin(t), np.cos(t), t > 1.0)
+    writer.append(0.5, run_log.ACTUAL, 0.1, 0.2, True)
+
+    # records are readable while the run is still being written
+    (meta, records) = run_log.open_run(writer.path)
+    assert meta['records'] == n + 1 and len(records) == n + 1
+    writer.close()
+    assert os.path.getsize(writer.path) == run_log.HEADER_SIZE + (n + 1)*run_log.RECORD_DTYPE.itemsize
+
+    (meta, records) = run_log.open_run(writer.path)
+    assert isinstance(records, np.memmap) and meta['mode'] == 'test'
+    desired = records[records['source'] == run_log.DESIRED]
+    assert np.array_equal(desired['q0'], np.sin(t)) and np.array_equal(desired['pen'], t > 1.0)
+    assert records[-1].tolist() == (0.5, run_log.ACTUAL, 1, 0.1, 0.2)
+    assert run_log.list_runs(str(tmp_path)) == [writer.path]
+
+def test_csv_export(tmp_path):
+    writer = run_log.new_run(str(tmp_path))
+    writer.extend([0.0, 0.01], run_log.DESIRED, [0.1, 0.2], [0.3, 0.4], [1, 0])
+    writer.close()
+    out = str(tmp_path / 'run.csv')
+    run_log.export_csv(writer.path, out, chunk=1)
+    with open(out) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == 't,source,pen,q0,q1' and lines[1:] == ['0.000000,0,1,0.1,0.3', '0.010000,0,0,0.2,0.4']
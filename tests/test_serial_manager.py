@@ -0,0 +1,29 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import time
+import numpy as np
+import plotting
+from config import SETTINGS, RUN_LOG
+from state import state
+from serial_manager import SerialManager
+
+def test_stop_execution_leaves_the_stop_position(monkeypatch):
+    monkeypatch.setitem(SETTINGS, 'ser_started', False) # simulation engine
+    monkeypatch.setitem(RUN_LOG, 'enabled', False)
+    monkeypatch.setattr(plotting, 'submit', lambda *args: None)
+    manager = SerialManager()
+    n = 2000 # 20 s at Tc = 0.01
+    q = (np.linspace(0.0, 1.0, n), np.linspace(0.0, -1.0, n), np.zeros(n))
+    manager.send_data('trj', q=q, dq=(np.zeros(n), np.zeros(n)), ddq=(np.zeros(n), np.zeros(n)))
+    time.sleep(0.2)
+
+    manager.stop_execution()
+    assert not manager.execution_thread.is_alive()
+    # the next job starts from where this one stopped, not from its planned end
+    (q0, q1, _) = state.firmware.get_position()
+    assert state.last_known_q == [q0, q1]
+    assert 0.0 < q0 < 0.5
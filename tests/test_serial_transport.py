@@ -0,0 +1,82 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import select
+import struct
+import threading
+import tty
+import serial
+from lib import serial_com as scm
+from lib import binary_protocol as bp
+from lib.frame_parser import FrameParser
+
+def status_frame(level):
+    body = bytes([bp.RESP_STATUS, level])
+    return bytes([bp.START_BYTE_1, bp.START_BYTE_2]) + body + struct.pack('<I', bp.calculate_crc32(body))
+
+def open_pty():
+    (master, slave) = os.openpty()
+    tty.setraw(slave)
+    port = serial.Serial(os.ttyname(slave), 115200, timeout=0)
+    return (master, slave, port)
+
+def read_master(master, size, timeout=1.0):
+    data = b''
+    while len(data) < size and select.select([master], [], [], timeout)[0]:
+        data += os.read(master, size - len(data))
+    return data
+
+def test_transport_dispatches_frames_and_writes():
+    (master, slave, port) = open_pty()
+    levels = []
+    received = threading.Event()
+    def on_frame(frame):
+        levels.append(bp.decode_feedback(frame)['buffer_level'])
+        if len(levels) == 3: received.set()
+
+    transport = scm.AsyncSerialTransport(FrameParser(), on_frame)
+    transport.start()
+    try:
+        transport.attach(port)
+        os.write(master, status_frame(7) + status_frame(8)[:5])
+        os.write(master, status_frame(8)[5:] + status_frame(9))
+        assert received.wait(1.0)
+        assert levels == [7, 8, 9]
+
+        packet = bp.encode_caps_command()
+        assert transport.write(packet * 3)
+        assert read_master(master, 3*len(packet)) == packet * 3
+    finally:
+        transport.stop()
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+def test_wait_frame_wakes_on_feedback():
+    (master, slave, port) = open_pty()
+    transport = scm.AsyncSerialTransport(FrameParser(), lambda frame: None)
+    transport.start()
+    try:
+        transport.attach(port)
+        assert transport.submit(transport.wait_frame(0.02)).result() is False
+
+        async def wait_then_report():
+            waiter = asyncio.ensure_future(transport.wait_frame(1.0))
+            await asyncio.sleep(0)
+            os.write(master, status_frame(3))
+            return await waiter
+        assert transport.submit(wait_then_report()).result() is True
+    finally:
+        transport.stop()
+        port.close()
+        os.close(master)
+        os.close(slave)
+
+if __name__ == "__main__":
+    test_transport_dispatches_frames_and_writes()
+    test_wait_frame_wakes_on_feedback()
+    print("ALL CHECKS PASSED")
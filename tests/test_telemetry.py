@@ -0,0 +1,66 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from state import state
+from config import TELEMETRY
+from telemetry import PosePublisher
+
+class FakeBrowser:
+    def __init__(self):
+        self.now = 0.0
+        self.received = []
+        self.pending = []
+
+    def send(self, pose, ack):
+        self.received.append(pose)
+        self.pending.append(ack)
+
+    def answer(self, delay: float):
+        self.now += delay
+        while self.pending:
+            self.pending.pop(0)()
+
+def test_only_the_latest_pose_is_sent():
+    browser = FakeBrowser()
+    publisher = PosePublisher(browser.send, lambda: browser.now)
+    for k in range(10):
+        state.firmware.update_position(0.1*k, 0.0, False)
+        publisher.tick() # the browser never answers: one update in flight, the others coalesced
+        browser.now += 0.01
+    assert browser.received == [[0.0, 0.0, False]] and publisher.skipped == 9
+
+    browser.answer(0.0)
+    browser.now += publisher.interval
+    publisher.tick()
+    assert browser.received[-1][0] == 0.9 # not the poses in between
+    publisher.tick()
+    assert publisher.sent == 2 # unchanged pose: nothing to send until the keepalive
+
+def test_interval_follows_the_round_trip():
+    browser = FakeBrowser()
+    publisher = PosePublisher(browser.send, lambda: browser.now)
+    for k in range(50):
+        state.firmware.update_position(0.01*k, 0.0, True)
+        publisher.tick()
+        browser.answer(0.1) # slow panel
+        browser.now += 0.01
+    assert publisher.interval >= 0.15 and publisher.sent <= 25 # every other pose is coalesced
+
+    # lost acknowledgement: given up after the timeout
+    sent = publisher.sent
+    publisher.tick()
+    state.firmware.update_position(1.0, 0.0, True)
+    browser.pending.clear()
+    for _ in range(2):
+        browser.now += TELEMETRY['ack_timeout']
+        state.firmware.update_position(browser.now, 0.0, True)
+        publisher.tick()
+    assert publisher.sent > sent + 1
+
+if __name__ == "__main__":
+    test_only_the_latest_pose_is_sent()
+    test_interval_follows_the_round_trip()
+    print("ALL CHECKS PASSED")
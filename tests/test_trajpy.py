@@ -0,0 +1,167 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from lib import trajpy as tpy
+from config import SETTINGS, SIZES
+
+KARGS = dict(Tc=0.01, max_acc=0.35, line=SETTINGS['line_tl'], circle=SETTINGS['circle_tl'], sizes=SIZES)
+KARGS_D = dict(KARGS, line_d=SETTINGS['line_tl_d'], circle_d=SETTINGS['circle_tl_d'])
+
+def test_arangef_matches_rangef():
+    for (start, step, end) in [(0, 0.01, 1.37), (0, 0.1, 0.3), (0.5, 0.003, 2.0), (0, 0.01, 0)]:
+        for limit in (False, True):
+            assert tpy.arangef(start, step, end, limit).tolist() == tpy.rangef(start, step, end, limit)
+
+def test_ik_dk_batch_round_trip():
+    x = np.array([0.2, 0.1, -0.15, 0.40, 0.0])
+    y = np.array([0.0, 0.15, 0.2, 0.0, 0.001])
+    (q, reachable) = tpy.ik_batch(x, y, SIZES)
+    assert reachable.tolist() == [True, True, True, False, False]
+    assert np.isnan(q[:, ~reachable]).all()
+    for k in np.flatnonzero(reachable):
+        assert np.allclose(q[:, k], tpy.ik(x[k], y[k], 0, None, SIZES)[:2, 0])
+    xy = tpy.dk_batch(q[0, reachable], q[1, reachable], SIZES)
+    assert np.allclose(xy[0], x[reachable]) and np.allclose(xy[1], y[reachable])
+
+def test_slice_trj_batch_matches_scalar_ik():
+    patches = [
+        {'type': 'line', 'points': [[0.2, 0.0], [0.1, 0.15]], 'data': {'penup': False}},
+        {'type': 'circle', 'points': [[0.2, 0.0], [0.0, 0.2]], 'data': {'penup': False, 'center': [0, 0]}},
+    ]
+    for patch in patches:
+        (q0s, q1s, penups, ts) = tpy.slice_trj_batch(patch, **KARGS)
+        assert q0s.flags['C_CONTIGUOUS'] and len(q0s) == len(ts)
+        sp = tpy.Point(*patch['points'][0])
+        ep = tpy.Point(*patch['points'][1])
+        length = (ep-sp).mag() if patch['type'] == 'line' else 0.2*np.pi/2
+        tf = np.sqrt(2*np.pi*length/KARGS['max_acc'])
+        for k in range(0, len(ts), 7):
+            s = SETTINGS['line_tl'](ts[k], tf)
+            if patch['type'] == 'line':
+                p = sp + (ep-sp)*s
+            else:
+                c = tpy.Point(*patch['data']['center'])
+                p = c + (sp-c).rotate(s*np.pi/2) # quarter circle, counter-clockwise
+            q = tpy.ik(p.x, p.y, 0, None, SIZES)
+            assert np.allclose([q0s[k], q1s[k]], q[:2, 0], atol=1e-12)
+        assert not penups.any()
+
+def test_slice_trj_batch_unreachable_holds_position():
+    patch = {'type': 'line', 'points': [[0.25, 0.0], [0.40, 0.0]], 'data': {'penup': False}}
+    (q0s, q1s, penups, ts) = tpy.slice_trj_batch(patch, **KARGS)
+    first_out = int(np.argmax(penups))
+    assert penups[first_out] == 1 and penups[first_out:].all()
+    assert np.all(q0s[first_out:] == q0s[first_out-1])
+
+def test_slice_trj_starting_out_of_reach_has_matching_lengths():
+    patch = {'type': 'line', 'points': [[0.40, 0.0], [0.25, 0.0]], 'data': {'penup': False}}
+    (q0s, q1s, penups, ts) = tpy.slice_trj_batch(patch, **KARGS)
+    assert len(q0s) == len(q1s) == len(penups) == len(ts)
+    # the dropped samples are the leading ones: the kept samples keep their times
+    assert ts[0] > 0 and np.allclose(np.diff(ts), KARGS['Tc'])
+    (q, dq, ddq, penups, ts) = tpy.slice_trj_analytic(patch, **KARGS_D)
+    assert q.shape[1] == dq.shape[1] == ddq.shape[1] == len(penups) == len(ts)
+
+def test_slice_trj_analytic_derivatives():
+    patches = [
+        {'type': 'line', 'points': [[0.2, 0.0], [0.1, 0.15]], 'data': {'penup': False}},
+        {'type': 'circle', 'points': [[0.15, 0.1], [0.1, 0.15]], 'data': {'penup': False, 'center': [0.1, 0.1]}},
+        {'type': 'line', 'points': [[0.2, 0.0], [0.1, 0.15]], 'data': {'penup': True}},
+    ]
+    for patch in patches:
+        (q, dq, ddq, penups, ts) = tpy.slice_trj_analytic(patch, **dict(KARGS_D, Tc=1e-3))
+        assert np.array_equal(q[0], tpy.slice_trj_batch(patch, **dict(KARGS, Tc=1e-3))[0])
+        # central differences on a fine grid agree with the closed form
+        assert np.allclose(np.gradient(q, ts, axis=1)[:, 1:-1], dq[:, 1:-1], atol=1e-4*np.abs(dq).max())
+        assert np.allclose(np.gradient(dq, ts, axis=1)[:, 1:-1], ddq[:, 1:-1], atol=1e-4*np.abs(ddq).max())
+        # the timing laws start at rest
+        assert np.allclose(dq[:, 0], 0) and np.allclose(ddq[:, 0], 0)
+
+def test_topp_profile_bang_bang():
+    # straight joint path (q'' = 0): accelerate at the limit, cruise at the velocity limit, brake
+    n = 1001
+    s = np.linspace(0, 1, n)
+    q_s = np.tile([[2.0], [-1.0]], n)
+    x = tpy.topp_profile(q_s, np.zeros((2, n)), s[1]-s[0], vmax=1.0, amax=0.5)
+    expected = np.minimum.reduce([2*0.25*s, 2*0.25*(1-s), np.full(n, 0.25)]) # joint 0 binds: dds <= 0.25, ds <= 0.5
+    assert np.allclose(x, expected, atol=1e-9)
+
+def test_slice_trj_topp():
+    vmax, amax = 10.0, 5.25
+    patches = [
+        {'type': 'line', 'points': [[0.2, 0.0], [0.1, 0.15]], 'data': {'penup': False}},
+        {'type': 'circle', 'points': [[0.15, 0.1], [0.1, 0.15]], 'data': {'penup': False, 'center': [0.1, 0.1]}},
+    ]
+    for patch in patches:
+        (q, dq, ddq, penups, ts) = tpy.slice_trj_topp(patch, vmax=vmax, amax=amax, path_step=5e-4, **KARGS_D)
+        assert np.allclose(np.diff(ts), KARGS['Tc'])
+        # starts and ends at rest, exactly on the end points of the patch
+        xy = tpy.dk_batch(q[0, [0, -1]], q[1, [0, -1]], SIZES)[:2]
+        assert np.allclose(xy.T, patch['points'])
+        assert np.allclose(dq[:, [0, -1]], 0)
+        assert np.abs(dq).max() <= vmax and np.abs(ddq).max() <= 1.05*amax
+        assert ts[-1] < tpy.slice_trj_analytic(patch, **KARGS_D)[4][-1]
+
+def test_blend_corners():
+    tolerance = 2e-4
+    # half a 12-gon (30 deg corners, blended) followed by a 90 deg corner (sharp: a new stroke)
+    polygon = [[0.15 + 0.02*np.cos(a), 0.1 + 0.02*np.sin(a)] for a in np.radians(np.arange(0, 181, 30))]
+    polygon.append([polygon[-1][0] + 0.02, polygon[-1][1]])
+    patches = [{'type': 'line', 'points': [a, b], 'data': {'penup': False}} for (a, b) in zip(polygon, polygon[1:])]
+    strokes = tpy.blend_corners(patches, tolerance, np.radians(60))
+    assert [len(stroke) for stroke in strokes] == [11, 1]
+    assert strokes[0][0]['points'][0] == polygon[0] and strokes[-1][-1]['points'][1] == polygon[-1]
+    for stroke in strokes:
+        for (a, b) in zip(stroke, stroke[1:]):
+            assert np.allclose(a['points'][1], b['points'][0])
+    for (arc, corner) in zip(strokes[0][1::2], polygon[1:-1]):
+        (c, p) = (np.array(arc['data']['center']), np.array(arc['points'][0]))
+        assert np.linalg.norm(c - corner) - np.linalg.norm(c - p) <= tolerance + 1e-12
+
+    # the stroke is sliced as one path: at rest only at its ends
+    (q, dq, ddq, penups, ts) = tpy.slice_path_topp(strokes[0], vmax=10.0, amax=5.25, path_step=5e-4, **KARGS_D)
+    xy = tpy.dk_batch(q[0, [0, -1]], q[1, [0, -1]], SIZES)[:2]
+    assert np.allclose(xy.T, [polygon[0], polygon[-2]])
+    speed = np.hypot(dq[0], dq[1])
+    assert speed[0] == 0 and speed[-1] == 0 and (speed[2:-2] > 0).all()
+    assert np.abs(ddq).max() <= 1.05*5.25
+
+def test_diff_ik_batch_holds_near_singular_configurations():
+    q = np.array([[0.3, 0.3, 0.3], [0.0, 5e-4, 0.2]]) # stretched, almost stretched, well conditioned
+    (dq, ddq) = tpy.diff_ik_batch(q, np.full((2, 3), 0.05), np.full((2, 3), 0.05), SIZES)
+    assert not dq[:, :2].any() and not ddq[:, :2].any()
+    assert np.isfinite(dq).all() and np.abs(dq[:, 2]).min() > 0
+
+def test_slice_path_topp_into_the_boundary_within_limits():
+    # the path leaves the workspace through the stretched arm singularity
+    patch = {'type': 'line', 'points': [[0.0, 0.30], [0.0, 0.34]], 'data': {'penup': False}}
+    (q, dq, ddq, penups, ts) = tpy.slice_path_topp([patch], vmax=10.0, amax=5.25, path_step=5e-4, **KARGS_D)
+    assert np.isfinite(ddq).all() and np.abs(ddq).max() <= 1.05*5.25
+    assert np.abs(dq).max() <= 10.0
+
+def test_slice_path_topp_unreachable_takes_finite_time():
+    patch = {'type': 'line', 'points': [[0.30, 0.0], [0.34, 0.0]], 'data': {'penup': False}}
+    with np.errstate(all='raise'):
+        (q, dq, ddq, penups, ts) = tpy.slice_path_topp([patch], vmax=10.0, amax=5.25, path_step=5e-4, **KARGS_D)
+    assert np.isfinite(q).all() and np.isfinite(dq).all() and np.isfinite(ddq).all()
+    # the held stretch is crossed in time, not in one sample
+    assert penups.sum() > 1 and penups[-1] == 1
+
+if __name__ == "__main__":
+    test_arangef_matches_rangef()
+    test_ik_dk_batch_round_trip()
+    test_slice_trj_batch_matches_scalar_ik()
+    test_slice_trj_batch_unreachable_holds_position()
+    test_slice_trj_starting_out_of_reach_has_matching_lengths()
+    test_slice_trj_analytic_derivatives()
+    test_topp_profile_bang_bang()
+    test_slice_trj_topp()
+    test_blend_corners()
+    test_diff_ik_batch_holds_near_singular_configurations()
+    test_slice_path_topp_into_the_boundary_within_limits()
+    test_slice_path_topp_unreachable_takes_finite_time()
+    print("ALL CHECKS PASSED")
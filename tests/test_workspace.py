@@ -0,0 +1,44 @@
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from lib import workspace
+from lib import trajpy as tpy
+from config import SIZES
+
+def test_points_match_ik_batch():
+    (x, y) = np.meshgrid(np.linspace(-0.35, 0.35, 141), np.linspace(-0.35, 0.35, 141))
+    (x, y) = (x.ravel(), y.ravel())
+    assert np.array_equal(workspace.reachable(x, y, SIZES), tpy.ik_batch(x, y, SIZES)[1])
+
+    nearest = workspace.nearest_reachable(x, y, SIZES)
+    assert tpy.ik_batch(*nearest, SIZES)[1].all()
+    inside = workspace.reachable(x, y, SIZES)
+    assert np.array_equal(nearest[:, inside], np.array([x, y])[:, inside])
+    assert np.allclose(np.hypot(*(nearest - [x, y]))[~inside], workspace.signed_distance(x, y, SIZES)[~inside])
+
+def test_check_patches_along_the_path():
+    patches = [
+        {'type': 'line', 'points': [[0.1, 0.1], [0.2, 0.1]], 'data': {'penup': False}}, # inside
+        {'type': 'line', 'points': [[-0.1, 0.005], [0.1, 0.005]], 'data': {'penup': False}}, # crosses the inner hole
+        {'type': 'circle', 'points': [[0.3, 0.0], [0.0, 0.3]], # bulges out of the workspace between its end points
+         'data': {'penup': False, 'center': [0.1, 0.1]}},
+        {'type': 'circle', 'points': [[0.2, -0.02], [0.2, 0.02]], 'data': {'penup': False, 'center': [0.2, 0.0]}},
+    ]
+    check = workspace.check_patches(patches, SIZES)
+    assert list(check['unreachable']) == [1, 2]
+
+    # same answer as sampling the patches
+    for (i, patch) in enumerate(patches):
+        geometry = tpy.patch_geometry(patch)
+        p = tpy.path_points(patch['type'], geometry, np.linspace(0, 1, 2001))[0]
+        assert tpy.ik_batch(p[0], p[1], SIZES)[1].all() == (i not in check['unreachable'])
+    assert np.allclose(check['points'][:, 0], [0.0, 0.005])
+
+if __name__ == "__main__":
+    test_points_match_ik_batch()
+    test_check_patches_along_the_path()
+    print("ALL CHECKS PASSED")